@@ -1,16 +1,123 @@
+import atexit
+import signal
 import socket
 import threading
 import json
 import queue
+import os
+import sys
+import argparse
+import time
+from collections import OrderedDict
 from datetime import datetime
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "commonFolder"))
+
 from gui import start_gui
+from protocol import Batch, ForwardDecoder
+from metrics import REGISTRY, SamplingProfiler, start_metrics_server
+from tsstore import TimeSeriesStore
+from fanin import DEFAULT_SHARDS, DroneConnection, ShardPool
+from capture import CaptureWriter
 
 host = "0.0.0.0"
 port = 6000  
+LISTEN_BACKLOG = 128  # many drones may connect at once
+
+# Parsed data and log lines are published to every subscriber in subscribers.
+# A subscriber provides on_data(data) and on_log(line); the GUI is just one optional subscriber.
+subscribers = []
+
+# subscriber that feeds the GUI through bounded queues, items that do not fit are dropped and counted
+class GuiSubscriber:
+    def __init__(self, maxsize):
+        self.data_queue = queue.Queue(maxsize=maxsize)
+        self.log_queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def on_data(self, data):
+        try:
+            self.data_queue.put_nowait(data)
+        except queue.Full:
+            self.dropped += 1
+
+    def on_log(self, line):
+        try:
+            self.log_queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+# subscriber used in headless mode, prints log lines and ignores the data
+class ConsoleSubscriber:
+    def on_data(self, data):
+        pass
+
+    def on_log(self, line):
+        print(line)
+
+def publish_data(data):
+    for subscriber in subscribers:
+        subscriber.on_data(data)
+
+def publish_log(line):
+    for subscriber in subscribers:
+        subscriber.on_log(line)
+
+# metrics, served in the Prometheus text format with --metrics_port (see commonFolder/metrics.py)
+CONNECTIONS = REGISTRY.counter("central_drone_connections_total", "Drone connections accepted")
+DISCONNECTIONS = REGISTRY.counter("central_drone_disconnections_total", "Drone connections closed")
+CONNECTION_ERRORS = REGISTRY.counter("central_connection_errors_total", "Drone connections closed because of an error")
+RECEIVED_BYTES = REGISTRY.counter("central_received_bytes_total", "Bytes received from drones")
+BATCHES = REGISTRY.counter("central_batches_total", "Batch frames received")
+DUPLICATE_BATCHES = REGISTRY.counter("central_duplicate_batches_total", "Batch frames dropped because they were already handled")
+MESSAGES = REGISTRY.counter("central_messages_total", "Messages published to the subscribers")
+DECODE_ERRORS = REGISTRY.counter("central_decode_errors_total", "Frames that were not valid JSON")
+CHUNK_SECONDS = REGISTRY.histogram("central_chunk_seconds", "Time to frame the data of one recv() and hand it to the workers")
+REGISTRY.gauge("central_drone_connections", "Open drone connections", lambda: CONNECTIONS.value - DISCONNECTIONS.value)
+REGISTRY.gauge("central_worker_queued", "Frames waiting for a worker", lambda: shard_pool.queued() if shard_pool else 0)
+
+# highest batch sequence number handed to the workers per drone session, used to drop batches a drone resends after a reconnect.
+# The entry has to outlive the connection for that, so the least recently used sessions are forgotten beyond MAX_DRONE_SESSIONS
+MAX_DRONE_SESSIONS = 10000
+acked_batches = OrderedDict()
+acked_batches_lock = threading.Lock()
 
-data_queue = queue.Queue()
-log_queue = queue.Queue()
+# workers parsing and publishing the data of the drones (see fanin.py), created by start_server() if not set before
+shard_pool = None
+
+# records the raw traffic of the drone connections with --capture (see commonFolder/capture.py)
+capture = None
+
+# function to publish one parsed message, called by the workers
+def publish_message(data):
+    publish_data(data)  # pass to subscribers (GUI)
+    MESSAGES.inc()
+
+# function to report a frame that is not valid JSON, called by the workers
+def report_decode_error(connection):
+    DECODE_ERRORS.inc()
+    publish_log(f"{now()} [error] failed to decode JSON from {connection.addr}")
+
+# function to log the fleet view and the view of every connected drone
+def log_fleet_status():
+    fleet = shard_pool.fleet()
+    publish_log(f"{now()} [fleet] {fleet['connected']}/{fleet['drones']} drones connected, {fleet['sensors']} sensors, "
+                f"{fleet['readings']} readings, {fleet['anomalies']} anomalies, {fleet['aggregates']} aggregates")
+    for drone in shard_pool.drones():
+        if drone["connected"]:
+            publish_log(f"{now()} [drone {drone['drone']}] {drone['address']}: {drone['sensors']} sensors, "
+                        f"{drone['readings']} readings, {drone['anomalies']} anomalies")
+
+# function to record a batch of a drone session, returns False if it is a resent batch that was already handled
+def new_batch(session, seq):
+    with acked_batches_lock:
+        if seq <= acked_batches.get(session, 0):
+            return False
+        acked_batches[session] = seq
+        acked_batches.move_to_end(session)
+        if len(acked_batches) > MAX_DRONE_SESSIONS:
+            acked_batches.popitem(last=False)
+        return True
 
 # function to return current time string
 def now():
@@ -18,35 +125,53 @@ def now():
 
 # function to handle incoming client connection from drone
 def handle_client_connection(conn, addr):
-    log_queue.put(f"{now()} [connected] drone connected from {addr}")
-    buffer = ""
+    publish_log(f"{now()} [connected] drone connected from {addr}")
+    CONNECTIONS.inc()
+    decoder = ForwardDecoder()  # reassembles legacy JSON lines and batch frames split or coalesced by TCP
+    connection = DroneConnection(conn, addr)
+    capture_id = capture.open(addr) if capture else None
     with conn:
         while True:
             try:
-                chunk = conn.recv(1024)  # receive data from drone
+                chunk = conn.recv(65536)  # receive data from drone
                 if not chunk:
                     break  # connection closed
-                buffer += chunk.decode()
-                while '\n' in buffer:
-                    line, buffer = buffer.split('\n', 1)
-                    try:
-                        data = json.loads(line)  # parse JSON data
-                        data_queue.put(data)  # pass to GUI
-                        log_queue.put(f"{now()} [data received] {data}")
-                    except json.JSONDecodeError:
-                        log_queue.put(f"{now()} [error] failed to decode JSON")
+                start = time.perf_counter()
+                RECEIVED_BYTES.inc(len(chunk))
+                if capture:
+                    capture.data(capture_id, chunk)
+                for frame in decoder.feed(chunk):
+                    if not isinstance(frame, Batch):  # legacy frame: a single JSON object
+                        shard_pool.submit(connection, frame)
+                        continue
+                    BATCHES.inc()
+                    if new_batch(frame.session, frame.seq):
+                        shard_pool.submit(connection, frame)  # the worker publishes it, then acknowledges it
+                    else:
+                        DUPLICATE_BATCHES.inc()
+                        connection.send_ack(frame.seq)
+                CHUNK_SECONDS.observe(time.perf_counter() - start)
             except Exception as e:
-                log_queue.put(f"{now()} [error] connection issue: {e}")
+                CONNECTION_ERRORS.inc()
+                publish_log(f"{now()} [error] connection issue: {e}")
                 break
-    log_queue.put(f"{now()} [disconnected] drone disconnected from {addr}") # Log disconnection event
+    if capture:
+        capture.close_connection(capture_id)
+    connection.open = False
+    shard_pool.close(connection)  # after its frames: the worker drops the view of a legacy drone
+    DISCONNECTIONS.inc()
+    publish_log(f"{now()} [disconnected] drone disconnected from {addr}") # Log disconnection event
 
 
 # function to start the TCP server
 def start_server():
+    global shard_pool
+    if shard_pool is None:
+        shard_pool = ShardPool(publish_message, report_decode_error)
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     server.bind((host, port))  # bind to specified host and port
-    server.listen(1)  # allow 1 connection (can be extended)
+    server.listen(LISTEN_BACKLOG)  # every drone gets its own connection thread
     print(f"central server listening on {host}:{port}")
     while True:
         conn, addr = server.accept()
@@ -54,5 +179,58 @@ def start_server():
 
 # main program entry point which starts the server and launches the GUI
 if __name__ == "__main__":
-    threading.Thread(target=start_server, daemon=True).start()
-    start_gui(data_queue, log_queue)  # launch GUI
+    parser = argparse.ArgumentParser(description="Central Server")
+    parser.add_argument("--headless", action="store_true", help="Run without the GUI, log lines are printed to stdout")
+    parser.add_argument("--gui_queue_size", type=int, default=10000, help="Maximum number of items waiting for the GUI before new ones are dropped")
+    parser.add_argument("--gui_max_lines", type=int, default=1000, help="Number of lines kept in each GUI panel")
+    parser.add_argument("--metrics_port", type=int, default=None, help="(Optional) Serve metrics and the profiler toggle on this local HTTP port")
+    parser.add_argument("--profile", action="store_true", help="Start the sampling profiler right away (see /profile on the metrics port)")
+    parser.add_argument("--store_dir", type=str, default=None, help="(Optional) Keep the history of the readings in a time-series store in this directory (query it with tsstore.py)")
+    parser.add_argument("--store_partition_minutes", type=int, default=60, help="Minutes of readings per store partition")
+    parser.add_argument("--store_retention_days", type=float, default=7, help="Days the raw readings are kept")
+    parser.add_argument("--store_rollup_retention_days", type=float, default=365, help="Days the per minute / per hour rollups are kept")
+    parser.add_argument("--workers", type=int, default=DEFAULT_SHARDS, help="Worker threads processing the drones' data, each drone is handled by one of them")
+    parser.add_argument("--parse_processes", type=int, default=0, help="(Optional) Parse large JSON batches in this many processes")
+    parser.add_argument("--capture", type=str, default=None, help="(Optional) Record the raw traffic of the drone connections to this new file (replay it with benchmarkFolder/replay_capture.py)")
+    parser.add_argument("--status_interval", type=float, default=60, help="Seconds between fleet status lines in the log (0 to disable)")
+    args = parser.parse_args()
+
+    shard_pool = ShardPool(publish_message, report_decode_error, args.workers, args.parse_processes)
+    if args.capture is not None:
+        capture = CaptureWriter(args.capture)
+        atexit.register(capture.close)  # Writes out the records still buffered
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # Exit normally, so the atexit handlers run
+        REGISTRY.counter("central_capture_bytes_total", "Bytes recorded to the capture file", lambda: capture.bytes)
+
+    if args.store_dir is not None:
+        store = TimeSeriesStore(args.store_dir, partition_seconds=args.store_partition_minutes * 60,
+                                retention=args.store_retention_days * 86400,
+                                rollup_retention=args.store_rollup_retention_days * 86400)
+        subscribers.append(store)
+        REGISTRY.counter("central_store_rows_total", "Readings written to the time-series store", lambda: store.stored)
+        REGISTRY.counter("central_store_rejected_total", "Readings the time-series store refused (bad or expired timestamp)", lambda: store.rejected)
+
+    if args.metrics_port is not None:
+        profiler = SamplingProfiler()
+        if args.profile:
+            profiler.start()
+        start_metrics_server(args.metrics_port, profiler=profiler,
+                             routes={"/drones": lambda: json.dumps({"fleet": shard_pool.fleet(), "drones": shard_pool.drones()})})
+        print(f"metrics are served on http://127.0.0.1:{args.metrics_port}/metrics")
+
+    if args.status_interval > 0:
+        def status_loop():
+            while True:
+                time.sleep(args.status_interval)
+                log_fleet_status()
+        threading.Thread(target=status_loop, daemon=True).start()
+
+    if args.headless:
+        subscribers.append(ConsoleSubscriber())
+        start_server()
+    else:
+        gui = GuiSubscriber(args.gui_queue_size)
+        subscribers.append(gui)
+        REGISTRY.counter("central_gui_dropped_total", "Items dropped because the GUI was behind", lambda: gui.dropped)
+        threading.Thread(target=start_server, daemon=True).start()
+        start_gui(gui.data_queue, gui.log_queue, lambda: gui.dropped, max_lines=args.gui_max_lines)  # launch GUI
@@ -0,0 +1,199 @@
+# fanin.py
+# Sharded processing of the data received from many drones at once.
+# Every drone connection has its own thread that only reads and frames the stream (see handle_client_connection).
+# The frames are handed to one of `shards` worker threads, chosen by the drone's session id (the connection for
+# legacy drones), which parses the JSON, updates the drone's view and publishes the data to the subscribers.
+# All frames of a drone go through the same worker in the order they arrived, so the readings of each sensor
+# keep their order, while different drones are processed in parallel.
+# With processes > 0 the JSON parsing of large batches is done in a process pool instead of the worker threads.
+# The drone and its worker are chosen once per connection, from its first frame, so a legacy frame sent before the
+# first batch frame does not end up on another worker than the batches.
+# Views: each worker owns the DroneView objects of its drones and is the only one writing them, so no lock is
+# shared between workers; fleet() merges the views when it is read. close() removes the view of a legacy drone
+# (keyed by its address, which a reconnect changes); a drone session's view is kept for DISCONNECTED_VIEW_TTL seconds
+# after its connection closed, so a drone reconnecting within that time keeps its counts.
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from protocol import Batch, encode_ack
+
+DEFAULT_SHARDS = 4
+DEFAULT_QUEUE_SIZE = 256     # Frames waiting per worker before the connection threads stop reading
+PROCESS_MIN_LINES = 64       # Smaller batches are parsed in the worker thread, shipping them costs more than parsing
+DISCONNECTED_VIEW_TTL = 3600  # Seconds the view of a disconnected drone session is kept
+
+
+def parse_lines(lines):
+    # Parsed JSON objects, None for a line that is not valid JSON (runs in the process pool too)
+    parsed = []
+    for line in lines:
+        try:
+            parsed.append(json.loads(line))
+        except ValueError:
+            parsed.append(None)
+    return parsed
+
+
+# One connection of a drone: acknowledgements are sent by the worker once a batch is published
+class DroneConnection:
+    def __init__(self, conn, addr):
+        self.conn = conn
+        self.addr = addr
+        self.drone = None  # Set by ShardPool.submit() from the first frame: the session id, or the address of a legacy drone
+        self.by_address = False
+        self.shard = None
+        self.open = True
+        self._send_lock = threading.Lock()  # The connection thread and the worker may both send acknowledgements
+
+    def send_ack(self, seq):
+        if not self.open:
+            return  # The drone resends the batch on its next connection and gets its acknowledgement there
+        try:
+            with self._send_lock:
+                self.conn.sendall(encode_ack(seq))
+        except OSError:
+            pass
+
+
+class DroneView:
+    def __init__(self, drone):
+        self.drone = drone
+        self.connection = None
+        self.batches = 0
+        self.readings = 0
+        self.anomalies = 0
+        self.aggregates = 0
+        self.errors = 0
+        self.sensors = set()
+        self.last_seen = None
+        self.last_aggregate = None
+        self.disconnected = None  # time.time() when its connection closed
+
+    def add(self, data):
+        if "meanTemperature" in data:
+            self.aggregates += 1
+            self.last_aggregate = data
+            return
+        self.readings += 1
+        if data.get("anomaly"):
+            self.anomalies += 1
+        self.sensors.add(data.get("sensor_id"))
+
+    def as_dict(self):
+        return {
+            "drone": self.drone,
+            "address": f"{self.connection.addr[0]}:{self.connection.addr[1]}" if self.connection else None,
+            "connected": bool(self.connection and self.connection.open),
+            "batches": self.batches,
+            "readings": self.readings,
+            "anomalies": self.anomalies,
+            "aggregates": self.aggregates,
+            "errors": self.errors,
+            "sensors": len(self.sensors),
+            "last_seen": self.last_seen,
+            "last_aggregate": self.last_aggregate,
+        }
+
+
+class ShardPool:
+    def __init__(self, publish_data, on_error, shards=DEFAULT_SHARDS, processes=0, queue_size=DEFAULT_QUEUE_SIZE):
+        self.publish_data = publish_data
+        self.on_error = on_error  # Called with the connection of a line that was not valid JSON
+        self.processes = ProcessPoolExecutor(max_workers=processes) if processes > 0 else None
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(max(1, shards))]
+        self._views = [{} for _ in self._queues]  # Per worker: drone -> DroneView
+        for index, shard_queue in enumerate(self._queues):
+            threading.Thread(target=self._work, args=(shard_queue, self._views[index]), name=f"shard-{index}",
+                             daemon=True).start()
+
+    # Hands a frame (a Batch or a legacy JSON line) of a connection to its drone's worker. Blocks while it is busy.
+    def submit(self, connection, frame):
+        if connection.shard is None:
+            if isinstance(frame, Batch):
+                connection.drone = f"{frame.session:08x}"
+            else:
+                connection.drone = f"{connection.addr[0]}:{connection.addr[1]}"
+                connection.by_address = True
+            connection.shard = hash(connection.drone) % len(self._queues)
+        self._queues[connection.shard].put((connection, frame))
+
+    # Called once a connection closed, after its last submit()
+    def close(self, connection):
+        if connection.shard is not None:
+            self._queues[connection.shard].put((connection, None))
+
+    def _work(self, shard_queue, views):
+        while True:
+            connection, frame = shard_queue.get()
+            if frame is None:
+                self._closed(views, connection)
+                continue
+            view = views.get(connection.drone)
+            if view is None:
+                view = views[connection.drone] = DroneView(connection.drone)
+            view.connection = connection
+            view.last_seen = time.time()
+            view.disconnected = None
+            if isinstance(frame, Batch):
+                view.batches += 1
+                messages = frame.readings + self._parse(frame.lines)
+            else:
+                messages = parse_lines([frame])
+            for data in messages:
+                if data is None:
+                    view.errors += 1
+                    self.on_error(connection)
+                    continue
+                try:
+                    view.add(data)
+                    self.publish_data(data)
+                except Exception:  # A subscriber failing must not stop the worker
+                    view.errors += 1
+            if isinstance(frame, Batch):
+                connection.send_ack(frame.seq)
+
+    @staticmethod
+    def _closed(views, connection):
+        view = views.get(connection.drone)
+        if view is not None and view.connection is connection:  # Otherwise the drone already reconnected
+            if connection.by_address:
+                del views[connection.drone]
+            else:
+                view.disconnected = time.time()
+        expired = time.time() - DISCONNECTED_VIEW_TTL
+        for drone, view in list(views.items()):
+            if view.disconnected is not None and view.disconnected < expired:
+                del views[drone]
+
+    def _parse(self, lines):
+        if self.processes is not None and len(lines) >= PROCESS_MIN_LINES:
+            return self.processes.submit(parse_lines, lines).result()
+        return parse_lines(lines)
+
+    # --- Views ---
+    def queued(self):
+        return sum(shard_queue.qsize() for shard_queue in self._queues)
+
+    def drones(self):
+        views = [view for shard_views in self._views for view in list(shard_views.values())]
+        return [view.as_dict() for view in sorted(views, key=lambda view: view.drone)]
+
+    def fleet(self):
+        drones = self.drones()
+        sensors = set()
+        for shard_views in self._views:
+            for view in list(shard_views.values()):
+                sensors.update(view.sensors)
+        return {
+            "drones": len(drones),
+            "connected": sum(drone["connected"] for drone in drones),
+            "readings": sum(drone["readings"] for drone in drones),
+            "anomalies": sum(drone["anomalies"] for drone in drones),
+            "aggregates": sum(drone["aggregates"] for drone in drones),
+            "errors": sum(drone["errors"] for drone in drones),
+            "sensors": len(sensors),
+            "queued": self.queued(),
+        }
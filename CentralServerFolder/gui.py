@@ -2,7 +2,11 @@ import tkinter as tk
 from tkinter import scrolledtext
 import queue
 
-def start_gui(data_queue, log_queue):
+# data_queue and log_queue are filled by the server threads. Each GUI tick drains at most batch_size items,
+# coalesces them into one insert per panel and trims each panel to its last max_lines lines.
+# Normal readings are not listed one by one: each tick adds a single summary line for them.
+# get_dropped returns how many items the server had to drop because the queues were full.
+def start_gui(data_queue, log_queue, get_dropped=lambda: 0, max_lines=1000, batch_size=2000, tick_ms=200):
     root = tk.Tk()
     root.title("Central Server – Environmental Monitor")
 
@@ -14,6 +18,7 @@ def start_gui(data_queue, log_queue):
     temp_var = tk.StringVar(value="-- °C")
     hum_var = tk.StringVar(value="-- %")
     ts_var = tk.StringVar(value="Last Update: --")
+    counters_var = tk.StringVar(value="Dropped: 0 | Summarized: 0")
 
     # Labels for displaying the latest average temperature and humidity
     tk.Label(latest_frame, text="Avg Temperature:").grid(row=0, column=0, sticky="e", padx=5)
@@ -23,6 +28,7 @@ def start_gui(data_queue, log_queue):
     tk.Label(latest_frame, textvariable=hum_var).grid(row=0, column=3, sticky="w")
 
     tk.Label(latest_frame, textvariable=ts_var).grid(row=1, column=0, columnspan=4, pady=3)
+    tk.Label(latest_frame, textvariable=counters_var).grid(row=2, column=0, columnspan=4, pady=3)
 
     # --- Anomalies Panel ---
     # Shows sensor readings flagged as anomalies by the drone
@@ -40,51 +46,96 @@ def start_gui(data_queue, log_queue):
     log_box = scrolledtext.ScrolledText(log_frame, height=10)
     log_box.pack(fill="both", expand=True)
 
+    summarized = 0  # Normal readings folded into summary lines instead of being listed
+
+    # Appends all lines with one insert and drops the oldest lines beyond max_lines
+    def append_lines(box, lines):
+        if not lines:
+            return
+        box.insert(tk.END, "\n".join(lines[-max_lines:]) + "\n")
+        line_count = int(box.index("end-1c").split(".")[0]) - 1
+        if line_count > max_lines:
+            box.delete("1.0", f"{line_count - max_lines + 1}.0")
+        box.see(tk.END)
+
     # --- GUI Update Function ---
-    # Periodically pulls new items from data_queue and log_queue
+    # Periodically pulls a bounded number of new items from data_queue and log_queue
     def update_gui():
-        while not data_queue.empty():
-            data = data_queue.get()
+        nonlocal summarized
+        anomaly_lines = []
+        log_lines = []
+        normal_count = 0
+        last_normal = None
+        latest_aggregate = None
+
+        for _ in range(batch_size):
+            try:
+                data = data_queue.get_nowait()
+            except queue.Empty:
+                break
 
             # Handle average data
             if "meanTemperature" in data and "meanHumidity" in data:
-                temp_var.set(f"{data['meanTemperature']} °C")
-                hum_var.set(f"{data['meanHumidity']} %")
-                ts_var.set("Last Update: Aggregated Reading")
-                log_box.insert(tk.END, f"[INFO] Received aggregated data: Temp = {data['meanTemperature']}°C, Hum = {data['meanHumidity']}%\n")
-                log_box.see(tk.END)
+                if "sensor_id" in data:  # per-sensor aggregate, only logged
+                    log_lines.append(f"[INFO] Received aggregated data for {data['sensor_id']}: Temp = {data['meanTemperature']}°C, Hum = {data['meanHumidity']}%")
+                else:
+                    latest_aggregate = data
+                    log_lines.append(f"[INFO] Received aggregated data: Temp = {data['meanTemperature']}°C, Hum = {data['meanHumidity']}%")
 
             # Handle anomaly or normal message
             elif "anomaly" in data:
-                
+
                 if data["anomaly"]: # if flagged as anomaly
                     anomaly_log = (
                         f"[{data.get('timestamp', '--')}] Anomaly from {data.get('sensor_id', 'unknown')} – "
                         f"Temp: {data.get('temperature', '--')}°C, Hum: {data.get('humidity', '--')}%"
                     )
-                    anomaly_box.insert(tk.END, anomaly_log + "\n")
-                    anomaly_box.see(tk.END)
-                    log_box.insert(tk.END, f"[ANOMALY] {anomaly_log}\n")
-                    log_box.see(tk.END)
-               
-                else:  # if normal data
-                    log_box.insert(tk.END, f"[INFO] Normal reading received: {data}\n")
-                    log_box.see(tk.END)
-
-           
+                    anomaly_lines.append(anomaly_log)
+                    log_lines.append(f"[ANOMALY] {anomaly_log}")
+
+                elif data.get("stat_reason"): # in range, but flagged as unusual by the drone's statistical detector
+                    anomaly_log = (
+                        f"[{data.get('timestamp', '--')}] Unusual reading from {data.get('sensor_id', 'unknown')} "
+                        f"({data['stat_reason']}, score {data.get('score', '--')}) – "
+                        f"Temp: {data.get('temperature', '--')}°C, Hum: {data.get('humidity', '--')}%"
+                    )
+                    anomaly_lines.append(anomaly_log)
+                    log_lines.append(f"[UNUSUAL] {anomaly_log}")
+
+                else:  # if normal data, only counted here and summarized below
+                    normal_count += 1
+                    last_normal = data
+
             # Fallback for unknown formats
             else:
-                log_box.insert(tk.END, f"[WARNING] Unrecognized data format: {data}\n")
-                log_box.see(tk.END)
-        
+                log_lines.append(f"[WARNING] Unrecognized data format: {data}")
+
+        if normal_count:
+            log_lines.append(
+                f"[INFO] {normal_count} normal reading(s) received, latest from {last_normal.get('sensor_id', 'unknown')}: "
+                f"Temp: {last_normal.get('temperature', '--')}°C, Hum: {last_normal.get('humidity', '--')}%"
+            )
+            summarized += normal_count - 1
+
+        if latest_aggregate is not None:  # Only the most recent aggregate is shown in the labels
+            temp_var.set(f"{latest_aggregate['meanTemperature']} °C")
+            hum_var.set(f"{latest_aggregate['meanHumidity']} %")
+            ts_var.set("Last Update: Aggregated Reading")
+
         # --- Handle system logs pushed via log_queue ---
-        while not log_queue.empty():
-            log_box.insert(tk.END, log_queue.get() + "\n")
-            log_box.see(tk.END)
+        for _ in range(batch_size):
+            try:
+                log_lines.append(log_queue.get_nowait())
+            except queue.Empty:
+                break
 
+        append_lines(anomaly_box, anomaly_lines)
+        append_lines(log_box, log_lines)
+        counters_var.set(f"Dropped: {get_dropped()} | Summarized: {summarized}")
 
-        # Schedule next GUI update
-        root.after(1000, update_gui)
+        # Schedule next GUI update, right away while a backlog remains
+        backlog = not data_queue.empty() or not log_queue.empty()
+        root.after(1 if backlog else tick_ms, update_gui)
 
-    root.after(1000, update_gui)
+    root.after(tick_ms, update_gui)
     root.mainloop()
@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "commonFolder"))
+
+import fanin
+from fanin import DroneConnection, ShardPool
+from protocol import Batch
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    def sendall(self, data):
+        self.sent.append(data)
+
+
+def reading(number):
+    return json.dumps({"sensor_id": "sensor1", "temperature": 20.0, "humidity": 50.0, "n": number}).encode()
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def make_pool(shards=8):
+    published = []
+    lock = threading.Lock()
+
+    def publish(data):
+        with lock:
+            published.append(data)
+
+    return ShardPool(publish, lambda connection: None, shards=shards), published
+
+
+def test_legacy_frames_before_the_first_batch_keep_their_order():
+    pool, published = make_pool()
+    connection = DroneConnection(FakeSocket(), ("10.0.0.2", 40000))
+    pool.submit(connection, reading(0))
+    shard = connection.shard
+    for n in range(1, 200):
+        pool.submit(connection, Batch(1234, n, [reading(n)], []) if n % 2 else reading(n))
+    assert connection.shard == shard and connection.drone == "10.0.0.2:40000"
+    wait_until(lambda: len(published) == 200)
+    assert [data["n"] for data in published] == list(range(200))
+    assert len(pool.drones()) == 1
+
+
+def test_views_of_closed_legacy_connections_are_removed():
+    pool, published = make_pool()
+    for port in range(41000, 41100):  # A legacy drone reconnecting from a new port every time
+        connection = DroneConnection(FakeSocket(), ("10.0.0.3", port))
+        pool.submit(connection, reading(port))
+        connection.open = False
+        pool.close(connection)
+    wait_until(lambda: len(published) == 100)
+    wait_until(lambda: pool.fleet()["drones"] == 0)
+
+
+def test_session_view_outlives_a_reconnect_until_it_expires(monkeypatch):
+    pool, published = make_pool()
+    first = DroneConnection(FakeSocket(), ("10.0.0.4", 42000))
+    pool.submit(first, Batch(0xABCD, 1, [reading(1)], []))
+    first.open = False
+    pool.close(first)
+    second = DroneConnection(FakeSocket(), ("10.0.0.4", 42001))
+    pool.submit(second, Batch(0xABCD, 2, [reading(2)], []))
+    wait_until(lambda: len(published) == 2)
+    wait_until(lambda: second.conn.sent)  # Acknowledged, so processed
+    drones = pool.drones()
+    assert len(drones) == 1 and drones[0]["readings"] == 2 and drones[0]["connected"]
+
+    monkeypatch.setattr(fanin, "DISCONNECTED_VIEW_TTL", -1)
+    second.open = False
+    pool.close(second)
+    wait_until(lambda: pool.fleet()["drones"] == 0)
@@ -0,0 +1,139 @@
+import array
+import os
+import random
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import tsstore
+from tsstore import TimeSeriesStore
+
+HOUR = 3600 * 1000
+
+
+def as_float32(value):
+    return array.array("f", [value])[0]
+
+
+# Brute-force answers from the list of appended readings: (sensor_id, time ms, temperature, humidity, anomaly)
+def reference_query(readings, sensor_id, start, end):
+    return sorted((t / 1000, round(as_float32(temperature), 2), round(as_float32(humidity), 2), anomaly)
+                  for sensor, t, temperature, humidity, anomaly in readings
+                  if sensor == sensor_id and start * 1000 <= t < end * 1000)
+
+
+def reference_aggregate(readings, start, end, step, sensor_id=None):
+    start_ms, end_ms, step_ms = int(start * 1000), int(end * 1000), int(step * 1000)
+    buckets = {}
+    for sensor, t, temperature, humidity, anomaly in readings:
+        if (sensor_id is not None and sensor != sensor_id) or not start_ms <= t < end_ms:
+            continue
+        bucket = buckets.setdefault(start_ms + (t - start_ms) // step_ms * step_ms, {"anomalies": 0, "t": [], "h": []})
+        if anomaly:
+            bucket["anomalies"] += 1
+        else:
+            bucket["t"].append(as_float32(temperature))
+            bucket["h"].append(as_float32(humidity))
+    result = []
+    for key in sorted(buckets):
+        temperatures, humidities = buckets[key]["t"], buckets[key]["h"]
+        bucket = {"start": key / 1000, "count": len(temperatures), "anomalies": buckets[key]["anomalies"]}
+        if temperatures:
+            bucket.update({"meanTemperature": sum(temperatures) / len(temperatures), "minTemperature": round(min(temperatures), 2),
+                           "maxTemperature": round(max(temperatures), 2), "meanHumidity": sum(humidities) / len(humidities),
+                           "minHumidity": round(min(humidities), 2), "maxHumidity": round(max(humidities), 2)})
+        result.append(bucket)
+    return result
+
+
+def assert_same_aggregates(result, expected):
+    assert len(result) == len(expected)
+    for bucket, reference in zip(result, expected):
+        assert bucket.keys() == reference.keys()
+        for key, value in reference.items():
+            if key.startswith("mean"):  # Summation order differs between the rollups and the raw rows
+                assert bucket[key] == pytest.approx(value, abs=0.0051)
+            else:
+                assert bucket[key] == value, key
+
+
+@pytest.fixture(params=["numpy", "python"])
+def store_module(request, monkeypatch):
+    if request.param == "numpy":
+        if tsstore.np is None:
+            pytest.skip("NumPy is not installed")
+    else:
+        monkeypatch.setattr(tsstore, "np", None)
+    return tsstore
+
+
+def append_random(store, readings, rng, count, first, last, sensors=8):
+    for _ in range(count):
+        reading = (f"sensor{rng.randrange(sensors)}", rng.randrange(first, last), rng.uniform(-20, 60),
+                   rng.uniform(0, 100), rng.random() < 0.1)
+        store.append(*reading)
+        readings.append(reading)
+
+
+def check(store, readings, now_ms):
+    start = (now_ms - 6 * HOUR) // HOUR * HOUR / 1000  # Whole hours: aggregate() can use the rollups
+    end = (now_ms // HOUR + 1) * HOUR / 1000
+    for sensor_id in ("sensor0", "sensor3", "sensor7", "sensor99"):
+        assert store.query(sensor_id, start, end) == reference_query(readings, sensor_id, start, end)
+        assert store.query(sensor_id, start + 1234.5, end - 987.6) == reference_query(readings, sensor_id, start + 1234.5, end - 987.6)
+    for step in (60, 3600, 600):
+        for sensor_id in (None, "sensor2"):
+            assert_same_aggregates(store.aggregate(start, end, step, sensor_id),
+                                   reference_aggregate(readings, start, end, step, sensor_id))
+    assert_same_aggregates(store.aggregate(start + 17, end - 3, 45), reference_aggregate(readings, start + 17, end - 3, 45))
+
+
+def test_store_matches_brute_force_reference(store_module, tmp_path):
+    rng = random.Random(408)
+    now_ms = int(time.time() * 1000)
+    store = TimeSeriesStore(str(tmp_path), partition_seconds=3600, seal_delay=1, flush_interval=3600)
+    readings = []
+    try:
+        append_random(store, readings, rng, 5000, now_ms - 5 * HOUR, now_ms)
+        check(store, readings, now_ms)  # Delta rows only
+        store.maintain(now=time.time() + 2 * 3600)  # Seal every partition that ended
+        check(store, readings, now_ms)
+        append_random(store, readings, rng, 1500, now_ms - 5 * HOUR, now_ms)  # Late rows next to the sealed rows
+        check(store, readings, now_ms)
+        store.maintain(now=time.time() + 2 * 3600)  # Merge them into the main rows
+        check(store, readings, now_ms)
+    finally:
+        store.close()
+
+    reader = TimeSeriesStore(str(tmp_path), read_only=True)
+    check(reader, readings, now_ms)
+
+
+def test_numpy_and_python_seal_the_same_files(tmp_path, monkeypatch):
+    if tsstore.np is None:
+        pytest.skip("NumPy is not installed")
+    now_ms = int(time.time() * 1000)
+    outputs = {}
+    for variant in ("numpy", "python"):
+        if variant == "python":
+            monkeypatch.setattr(tsstore, "np", None)
+        rng = random.Random(7)
+        directory = tmp_path / variant
+        store = TimeSeriesStore(str(directory), partition_seconds=3600, seal_delay=1, flush_interval=3600)
+        append_random(store, [], rng, 3000, now_ms - 3 * HOUR, now_ms - HOUR)
+        store.maintain(now=time.time() + 2 * 3600)
+        store.close()
+        files = {}
+        for root, _, names in os.walk(directory):
+            for name in names:
+                if name.startswith(("main.", "rollup_")):
+                    with open(os.path.join(root, name), "rb") as f:
+                        files[os.path.relpath(os.path.join(root, name), directory)] = f.read()
+        outputs[variant] = files
+    assert outputs["numpy"].keys() == outputs["python"].keys()
+    for name, data in outputs["python"].items():
+        if not name.endswith(".bin"):  # Rollup sums may differ in the last bits with the summation order
+            assert outputs["numpy"][name] == data, name
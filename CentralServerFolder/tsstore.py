@@ -0,0 +1,727 @@
+# tsstore.py
+# Embedded time-series store for the readings received by the central server, so their history can be queried.
+# It is a subscriber (on_data) fed by handle_client_connection, see central_server.py --store_dir.
+#
+# Layout: one directory per time partition (partition_seconds of reading time), holding a generation directory
+# with one append-only file per column (fixed-size values, memory-mapped for reading):
+#   delta.<column> - rows in arrival order, appended every flush_interval seconds
+#   main.<column>  - rows sorted by (sensor, time), written when the partition is sealed
+#   main.index     - per sensor: first row and number of rows in main.<column>
+#   rollup_1m.bin, rollup_1h.bin - ROLLUP records per sensor and minute / hour, sorted by (sensor, bucket)
+# A partition is sealed seal_delay seconds after its end (late rows reopen it): main and delta are merged into a new
+# generation, published by atomically rewriting the partition's CURRENT file. Raw rows are kept for `retention`
+# seconds and rollups for `rollup_retention` seconds.
+# Sensor IDs are stored as numbers, sensors.txt maps them back (line N is sensor number N).
+#
+# Queries (times in epoch seconds):
+#   store.query("sensor42", start, end)             -> [(time, temperature, humidity, anomaly), ...] sorted by time
+#   store.aggregate(start, end, 60, "sensor42")     -> one dict per 60 s bucket: count, anomalies, mean/min/max
+# aggregate() answers from the rollups when start, end and step are whole minutes / hours of a sealed partition,
+# and only reads raw rows for the rest. Anomalous readings are counted but left out of the statistics.
+#   python tsstore.py --dir data --sensor sensor42 --last 3600 --step 60
+import argparse
+import array
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, it speeds up sealing partitions and scanning rows
+    np = None
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "commonFolder"))
+
+from readings import timestamp_to_ms
+
+COLUMNS = (("sensor", "I"), ("time", "q"), ("temperature", "f"), ("humidity", "f"), ("anomaly", "B"))
+INDEX = struct.Struct("<IQQ")  # sensor, first row, rows
+ROLLUP = struct.Struct("<IqIIdffdff")  # sensor, bucket start ms, count, anomalies, temperature sum/min/max, humidity sum/min/max
+ROLLUPS = {"1m": 60 * 1000, "1h": 3600 * 1000}
+SENSORS_FILE = "sensors.txt"
+CURRENT_FILE = "CURRENT"
+FLUSH_ROWS = 65536  # Flush a partition early once this many rows are buffered
+
+
+def _map_column(path, typecode, rows=None):
+    # Returns a read-only memoryview of a column file (or its first `rows` values), empty if it does not exist
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return memoryview(array.array(typecode))
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return memoryview(array.array(typecode))
+        view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    itemsize = array.array(typecode).itemsize
+    count = size // itemsize if rows is None else min(rows, size // itemsize)
+    return view[:count * itemsize].cast(typecode)
+
+
+def _new_stats():
+    return [0, 0, 0.0, float("inf"), float("-inf"), 0.0, float("inf"), float("-inf")]
+
+
+def _add_reading(stats, temperature, humidity, anomaly):
+    if anomaly:
+        stats[1] += 1
+        return
+    stats[0] += 1
+    stats[2] += temperature
+    stats[3] = min(stats[3], temperature)
+    stats[4] = max(stats[4], temperature)
+    stats[5] += humidity
+    stats[6] = min(stats[6], humidity)
+    stats[7] = max(stats[7], humidity)
+
+
+def _add_stats(stats, count, anomalies, t_sum, t_min, t_max, h_sum, h_min, h_max):
+    stats[0] += count
+    stats[1] += anomalies
+    stats[2] += t_sum
+    stats[3] = min(stats[3], t_min)
+    stats[4] = max(stats[4], t_max)
+    stats[5] += h_sum
+    stats[6] = min(stats[6], h_min)
+    stats[7] = max(stats[7], h_max)
+
+
+def _compute_rollups(sensors, times, temperatures, humidities, anomalies, resolution):
+    # Rollup rows of columns sorted by (sensor, time)
+    if np is not None:
+        return _compute_rollups_numpy(_array(sensors, "I"), _array(times, "q"), _array(temperatures, "f"),
+                                      _array(humidities, "f"), _array(anomalies, "B"), resolution)
+    rows = []
+    key = None
+    stats = None
+    for sensor, t, temperature, humidity, anomaly in zip(sensors, times, temperatures, humidities, anomalies):
+        bucket = t - t % resolution
+        if (sensor, bucket) != key:
+            if stats is not None:
+                rows.append((*key, *stats))
+            key = (sensor, bucket)
+            stats = _new_stats()
+        _add_reading(stats, temperature, humidity, anomaly)
+    if stats is not None:
+        rows.append((*key, *stats))
+    return rows
+
+
+def _array(values, typecode):
+    return values if isinstance(values, np.ndarray) else np.frombuffer(values, dtype=np.dtype(typecode))
+
+
+def _compute_rollups_numpy(sensors, times, temperatures, humidities, anomalies, resolution):
+    if not len(times):
+        return []
+    buckets = times - times % resolution
+    starts = np.concatenate(([0], np.flatnonzero((sensors[1:] != sensors[:-1]) | (buckets[1:] != buckets[:-1])) + 1))
+    anomalous = anomalies != 0
+    valid = ~anomalous
+    temperatures = temperatures.astype(np.float64)
+    humidities = humidities.astype(np.float64)
+    columns = [sensors[starts], buckets[starts],
+               np.add.reduceat(valid.astype(np.int64), starts), np.add.reduceat(anomalous.astype(np.int64), starts)]
+    for values in (temperatures, humidities):  # Anomalous readings do not count in the statistics
+        columns += [np.add.reduceat(np.where(valid, values, 0.0), starts),
+                    np.minimum.reduceat(np.where(valid, values, np.inf), starts),
+                    np.maximum.reduceat(np.where(valid, values, -np.inf), starts)]
+    return list(zip(*(column.tolist() for column in columns)))
+
+
+def _coarsen_rollups(rows, resolution):
+    # Merges rollup rows sorted by (sensor, bucket) into buckets of a coarser resolution
+    merged = []
+    key = None
+    stats = None
+    for sensor, bucket, *values in rows:
+        bucket -= bucket % resolution
+        if (sensor, bucket) != key:
+            if stats is not None:
+                merged.append((*key, *stats))
+            key = (sensor, bucket)
+            stats = _new_stats()
+        _add_stats(stats, *values)
+    if stats is not None:
+        merged.append((*key, *stats))
+    return merged
+
+
+def _sorted_order(sensors, times):
+    return sorted(range(len(times)), key=lambda row: (sensors[row], times[row]))
+
+
+def _index(sensors):
+    # main.index records of a sorted sensor column
+    if np is None:
+        records = []
+        row = 0
+        while row < len(sensors):
+            end = row + 1
+            while end < len(sensors) and sensors[end] == sensors[row]:
+                end += 1
+            records.append(INDEX.pack(sensors[row], row, end - row))
+            row = end
+        return b"".join(records)
+    if not len(sensors):
+        return b""
+    firsts = np.concatenate(([0], np.flatnonzero(sensors[1:] != sensors[:-1]) + 1))
+    records = np.empty(len(firsts), dtype=[("sensor", "<u4"), ("first", "<u8"), ("rows", "<u8")])  # Packed like INDEX
+    records["sensor"] = sensors[firsts]
+    records["first"] = firsts
+    records["rows"] = np.diff(np.append(firsts, len(sensors)))
+    return records.tobytes()
+
+
+class _Partition:
+    def __init__(self, store_directory, start, length):
+        self.start = start  # ms
+        self.end = start + length
+        self.path = os.path.join(store_directory, f"{start // 1000:012d}")
+        self.pending = {name: array.array(typecode) for name, typecode in COLUMNS}
+        self.pending_rows = 0
+        self.delta_rows = 0
+        self.last_write = 0.0  # time.time() of the last appended row
+        self.gen = self._read_current()
+        self._cache_gen = None
+        self._main = None
+        self._rollups = {}
+        self._postings = {}  # sensor -> array of delta rows
+        self._indexed = 0    # delta rows already in _postings
+        self._cache_lock = threading.Lock()  # Queries and the sealing thread share the caches
+
+    def _read_current(self):
+        try:
+            with open(os.path.join(self.path, CURRENT_FILE)) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return 0
+
+    def gen_path(self, gen=None):
+        return os.path.join(self.path, f"gen-{self.gen if gen is None else gen:06d}")
+
+    def file(self, name, gen=None):
+        return os.path.join(self.gen_path(gen), name)
+
+    # --- Writing ---
+    def append(self, sensor, t, temperature, humidity, anomaly):
+        pending = self.pending
+        pending["sensor"].append(sensor)
+        pending["time"].append(t)
+        pending["temperature"].append(temperature)
+        pending["humidity"].append(humidity)
+        pending["anomaly"].append(anomaly)
+        self.pending_rows += 1
+
+    def flush(self):
+        if not self.pending_rows:
+            return
+        os.makedirs(self.gen_path(), exist_ok=True)
+        for name, typecode in COLUMNS:
+            with open(self.file(f"delta.{name}"), "ab") as f:
+                self.pending[name].tofile(f)
+            self.pending[name] = array.array(typecode)
+        self.delta_rows += self.pending_rows
+        self.pending_rows = 0
+
+    def recover(self):
+        # Writer startup: cut the delta columns to the rows written to all of them (a crash may have interrupted a flush)
+        for name in os.listdir(self.path) if os.path.isdir(self.path) else ():
+            if name.startswith("gen-") and name != os.path.basename(self.gen_path()):
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)  # Unfinished or replaced generation
+        rows = self.delta_count()
+        for name, typecode in COLUMNS:
+            path = self.file(f"delta.{name}")
+            if os.path.exists(path):
+                with open(path, "r+b") as f:
+                    f.truncate(rows * array.array(typecode).itemsize)
+        self.delta_rows = rows
+
+    def delta_count(self):
+        counts = []
+        for name, typecode in COLUMNS:
+            try:
+                counts.append(os.path.getsize(self.file(f"delta.{name}")) // array.array(typecode).itemsize)
+            except OSError:
+                counts.append(0)
+        return min(counts)
+
+    # --- Reading ---
+    def _check_gen(self):
+        if self._cache_gen != self.gen:
+            self._cache_gen = self.gen
+            self._main = None
+            self._rollups = {}
+            self._postings = {}
+            self._indexed = 0
+
+    def main(self):
+        # Returns (columns, index) of the sorted rows; columns is None once retention removed the raw rows
+        self._check_gen()
+        if self._main is None:
+            index = {}
+            try:
+                with open(self.file("main.index"), "rb") as f:
+                    for sensor, first, rows in INDEX.iter_unpack(f.read()):
+                        index[sensor] = (first, rows)
+            except FileNotFoundError:
+                pass
+            if os.path.exists(self.file("main.time")):
+                columns = {name: _map_column(self.file(f"main.{name}"), typecode) for name, typecode in COLUMNS}
+            else:
+                columns = None if index else {}
+            self._main = (columns, index)
+        return self._main
+
+    def rollups(self, name):
+        # Returns (rows, index) of a rollup file, or None if the partition has none
+        self._check_gen()
+        if name not in self._rollups:
+            try:
+                with open(self.file(f"rollup_{name}.bin"), "rb") as f:
+                    rows = list(ROLLUP.iter_unpack(f.read()))
+            except FileNotFoundError:
+                self._rollups[name] = None
+                return None
+            index = {}
+            for row, record in enumerate(rows):
+                first, count = index.get(record[0], (row, 0))
+                index[record[0]] = (first, count + 1)
+            self._rollups[name] = (rows, index)
+        return self._rollups[name]
+
+    def delta(self, rows):
+        # Returns (columns, postings) of the first `rows` delta rows
+        self._check_gen()
+        columns = {name: _map_column(self.file(f"delta.{name}"), typecode, rows) for name, typecode in COLUMNS}
+        sensors = columns["sensor"]
+        rows = len(sensors)
+        with self._cache_lock:
+            postings = self._postings
+            if np is not None and rows > self._indexed:
+                new = np.frombuffer(sensors, dtype=np.uint32)[self._indexed:rows]
+                order = np.argsort(new, kind="stable")  # Rows of a sensor stay in arrival order
+                numbers, firsts = np.unique(new[order], return_index=True)
+                order += self._indexed
+                for sensor, first, last in zip(numbers.tolist(), firsts.tolist(), firsts[1:].tolist() + [len(new)]):
+                    sensor_rows = postings.get(sensor)
+                    if sensor_rows is None:
+                        sensor_rows = postings[sensor] = array.array("Q")
+                    sensor_rows.frombytes(order[first:last].astype(np.uint64).tobytes())
+            else:
+                for row in range(self._indexed, rows):
+                    sensor_rows = postings.get(sensors[row])
+                    if sensor_rows is None:
+                        sensor_rows = postings[sensors[row]] = array.array("Q")
+                    sensor_rows.append(row)
+            self._indexed = max(self._indexed, rows)
+        return columns, postings
+
+    def raw_rows(self, sensor, start, end, delta_rows, include_main=True):
+        # (time ms, temperature, humidity, anomaly) of one sensor (or all sensors if sensor is None) in [start, end)
+        if np is not None:
+            return self._raw_rows_numpy(sensor, start, end, delta_rows, include_main)
+        rows = []
+        columns, index = self.main()
+        if columns and include_main:
+            if sensor is None:
+                ranges = [(0, len(columns["time"]))]
+            else:
+                ranges = [index[sensor]] if sensor in index else []
+            times = columns["time"]
+            for first, count in ranges:
+                if sensor is None:
+                    selected = (row for row in range(first, first + count) if start <= times[row] < end)
+                else:  # One sensor's rows are sorted by time
+                    selected = range(bisect_left(times, start, first, first + count), bisect_left(times, end, first, first + count))
+                rows.extend(self._row(columns, row) for row in selected)
+        if delta_rows:
+            columns, postings = self.delta(delta_rows)
+            times = columns["time"]
+            candidates = range(len(times)) if sensor is None else postings.get(sensor, ())
+            rows.extend(self._row(columns, row) for row in candidates if row < len(times) and start <= times[row] < end)
+        return rows
+
+    @staticmethod
+    def _row(columns, row):
+        return columns["time"][row], columns["temperature"][row], columns["humidity"][row], columns["anomaly"][row]
+
+    def _raw_rows_numpy(self, sensor, start, end, delta_rows, include_main):
+        return list(zip(*(column.tolist() for column in self.raw_columns(sensor, start, end, delta_rows, include_main))))
+
+    def raw_columns(self, sensor, start, end, delta_rows, include_main=True):
+        # NumPy only: the rows of raw_rows() as arrays of time, temperature, humidity and anomaly
+        parts = []
+        columns, index = self.main()
+        if columns and include_main:
+            times = np.frombuffer(columns["time"], dtype=np.int64)
+            if sensor is None:
+                parts.append((columns, np.flatnonzero((times >= start) & (times < end))))
+            elif sensor in index:  # One sensor's rows are sorted by time
+                first, count = index[sensor]
+                sensor_times = times[first:first + count]
+                parts.append((columns, np.arange(first + np.searchsorted(sensor_times, start),
+                                                 first + np.searchsorted(sensor_times, end))))
+        if delta_rows:
+            columns, postings = self.delta(delta_rows)
+            times = np.frombuffer(columns["time"], dtype=np.int64)
+            if sensor is None:
+                candidates = np.arange(len(times))
+            else:
+                candidates = np.frombuffer(postings.get(sensor, array.array("Q")), dtype=np.uint64).astype(np.intp)
+                candidates = candidates[candidates < len(times)]
+            candidate_times = times[candidates]
+            parts.append((columns, candidates[(candidate_times >= start) & (candidate_times < end)]))
+        return [np.concatenate([np.frombuffer(columns[name], dtype=np.dtype(typecode))[selected] for columns, selected in parts])
+                if parts else np.empty(0, dtype=np.dtype(typecode)) for name, typecode in COLUMNS[1:]]
+
+    # --- Sealing ---
+    def merge(self, delta_rows):
+        # Writes a new generation with the main rows and the first delta_rows delta rows sorted, and its rollups.
+        # Returns the new generation number; the caller publishes it with publish().
+        columns, _ = self.main()
+        if columns is None:
+            columns = {}  # Raw rows expired, only the late rows are left to merge
+        delta, _ = self.delta(delta_rows)
+        if np is not None:
+            merged = {name: np.concatenate((_array(columns.get(name, array.array(typecode)), typecode), _array(delta[name], typecode)))
+                      for name, typecode in COLUMNS}
+            order = np.lexsort((merged["time"], merged["sensor"]))
+            merged = {name: np.take(values, order) for name, values in merged.items()}
+        else:
+            merged = {}
+            for name, typecode in COLUMNS:
+                values = array.array(typecode, columns.get(name, ()))
+                values.extend(delta[name])
+                merged[name] = values
+            order = _sorted_order(merged["sensor"], merged["time"])
+            merged = {name: array.array(typecode, (merged[name][row] for row in order)) for name, typecode in COLUMNS}
+
+        gen = self.gen + 1
+        shutil.rmtree(self.gen_path(gen), ignore_errors=True)
+        os.makedirs(self.gen_path(gen))
+        for name, _ in COLUMNS:
+            with open(self.file(f"main.{name}", gen), "wb") as f:
+                merged[name].tofile(f)
+        with open(self.file("main.index", gen), "wb") as f:
+            f.write(_index(merged["sensor"]))
+        minutes = _compute_rollups(merged["sensor"], merged["time"], merged["temperature"], merged["humidity"],
+                                   merged["anomaly"], ROLLUPS["1m"])
+        old_minutes = self.rollups("1m")
+        if columns == {} and old_minutes is not None:  # Keep the statistics of the expired raw rows
+            minutes = _coarsen_rollups(sorted(old_minutes[0] + minutes), ROLLUPS["1m"])
+        for name, rows in (("1m", minutes), ("1h", _coarsen_rollups(minutes, ROLLUPS["1h"]))):
+            with open(self.file(f"rollup_{name}.bin", gen), "wb") as f:
+                f.write(b"".join(ROLLUP.pack(*row) for row in rows))
+        return gen
+
+    def publish(self, gen, merged_rows):
+        # Moves the delta rows that arrived during merge() to the new generation, then switches to it
+        old = self.gen
+        for name, typecode in COLUMNS:
+            itemsize = array.array(typecode).itemsize
+            try:
+                with open(self.file(f"delta.{name}", old), "rb") as f:
+                    f.seek(merged_rows * itemsize)
+                    late = f.read((self.delta_rows - merged_rows) * itemsize)
+            except FileNotFoundError:
+                late = b""
+            if late:
+                with open(self.file(f"delta.{name}", gen), "wb") as f:
+                    f.write(late)
+        with open(os.path.join(self.path, CURRENT_FILE + ".tmp"), "w") as f:
+            f.write(str(gen))
+        os.replace(os.path.join(self.path, CURRENT_FILE + ".tmp"), os.path.join(self.path, CURRENT_FILE))
+        self.gen = gen
+        self.delta_rows -= merged_rows
+        return self.gen_path(old)
+
+    def drop_raw(self):
+        # Retention: delete the raw rows, keeping the rollups
+        for name, _ in COLUMNS:
+            try:
+                os.remove(self.file(f"main.{name}"))
+            except FileNotFoundError:
+                pass
+        self._cache_gen = None
+
+
+class TimeSeriesStore:
+    def __init__(self, directory, partition_seconds=3600, retention=7 * 86400, rollup_retention=365 * 86400,
+                 seal_delay=300, flush_interval=1.0, read_only=False):
+        self.directory = directory
+        self.partition_ms = int(partition_seconds) * 1000  # Whole seconds, partitions are named by their start second
+        self.retention = retention
+        self.rollup_retention = max(rollup_retention, retention) if rollup_retention is not None else None
+        self.seal_delay = seal_delay
+        self.flush_interval = flush_interval
+        self.read_only = read_only
+        self.stored = 0
+        self.rejected = 0  # Readings without a valid timestamp, or older than the retention
+        self._lock = threading.RLock()
+        self._partitions = {}
+        self._sensor_ids = []     # sensor number -> sensor_id
+        self._sensor_numbers = {}
+        self._sensors_loaded = 0  # Bytes of sensors.txt already read
+        self._stopping = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+        if not read_only:
+            self._sensors_file = open(os.path.join(directory, SENSORS_FILE), "a")
+            threading.Thread(target=self._run, name="tsstore", daemon=True).start()
+
+    def _load(self):
+        for name in sorted(os.listdir(self.directory)):
+            if name.isdigit() and int(name) * 1000 not in self._partitions:
+                partition = _Partition(self.directory, int(name) * 1000, self.partition_ms)
+                if not self.read_only:
+                    partition.recover()
+                self._partitions[partition.start] = partition
+        self._load_sensors()
+
+    def _load_sensors(self):
+        path = os.path.join(self.directory, SENSORS_FILE)
+        try:
+            with open(path, "rb") as f:
+                f.seek(self._sensors_loaded)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].decode().splitlines():
+            self._sensor_numbers[line] = len(self._sensor_ids)
+            self._sensor_ids.append(line)
+        self._sensors_loaded += complete
+
+    # --- Subscriber interface ---
+    def on_data(self, data):
+        if "temperature" not in data or "meanTemperature" in data:
+            return  # Aggregates can be recomputed from the readings
+        try:
+            t = timestamp_to_ms(data.get("timestamp"))
+            if t is None:
+                self.rejected += 1
+                return
+            self.append(str(data.get("sensor_id")), t, float(data["temperature"]), float(data["humidity"]),
+                        bool(data.get("anomaly")))
+        except (TypeError, ValueError, KeyError):
+            self.rejected += 1
+
+    def on_log(self, line):
+        pass
+
+    # --- Writing ---
+    def append(self, sensor_id, t, temperature, humidity, anomaly=False):
+        # t in epoch milliseconds
+        with self._lock:
+            if self.retention is not None and t < (time.time() - self.retention) * 1000:
+                self.rejected += 1
+                return
+            sensor = self._sensor_numbers.get(sensor_id)
+            if sensor is None:
+                if "\n" in sensor_id:
+                    raise ValueError("sensor IDs cannot contain newlines")
+                sensor = self._sensor_numbers[sensor_id] = len(self._sensor_ids)
+                self._sensor_ids.append(sensor_id)
+                self._sensors_file.write(sensor_id + "\n")
+                self._sensors_file.flush()
+            start = t - t % self.partition_ms
+            partition = self._partitions.get(start)
+            if partition is None:
+                partition = self._partitions[start] = _Partition(self.directory, start, self.partition_ms)
+            partition.append(sensor, t, temperature, humidity, anomaly)
+            partition.last_write = time.time()
+            self.stored += 1
+            if partition.pending_rows >= FLUSH_ROWS:
+                partition.flush()
+
+    def flush(self):
+        if self.read_only:
+            return
+        with self._lock:
+            for partition in self._partitions.values():
+                partition.flush()
+
+    # Background thread: flushes the buffered rows, seals finished partitions and applies the retention
+    def _run(self):
+        while not self._stopping.wait(self.flush_interval):
+            try:
+                self.flush()
+                self.maintain()
+            except OSError as e:
+                print(f"time-series store: {e}")
+
+    def maintain(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            partitions = list(self._partitions.values())
+        for partition in partitions:
+            end = partition.end / 1000
+            if self.rollup_retention is not None and end < now - self.rollup_retention:
+                with self._lock:
+                    del self._partitions[partition.start]
+                shutil.rmtree(partition.path, ignore_errors=True)
+                continue
+            if partition.delta_rows and end + self.seal_delay < now and now - partition.last_write >= self.seal_delay:
+                self._seal(partition)
+            if self.retention is not None and end < now - self.retention and not partition.delta_rows:
+                if partition.main()[0]:
+                    partition.drop_raw()
+
+    def _seal(self, partition):
+        with self._lock:
+            partition.flush()
+            rows = partition.delta_rows
+        gen = partition.merge(rows)  # Slow part, appends continue meanwhile
+        with self._lock:
+            partition.flush()
+            old = partition.publish(gen, rows)
+        shutil.rmtree(old, ignore_errors=True)
+
+    def close(self):
+        self._stopping.set()
+        self.flush()
+        if not self.read_only:
+            self._sensors_file.close()
+
+    # --- Querying ---
+    def _snapshot(self, start_ms, end_ms):
+        # Partitions overlapping [start_ms, end_ms) with the number of delta rows visible to this query
+        with self._lock:
+            if self.read_only:
+                self._load()
+                for partition in self._partitions.values():
+                    partition.gen = partition._read_current()
+                    partition.delta_rows = partition.delta_count()
+            else:
+                self.flush()
+            return [(partition, partition.delta_rows) for start, partition in sorted(self._partitions.items())
+                    if start < end_ms and partition.end > start_ms]
+
+    def sensors(self):
+        with self._lock:
+            if self.read_only:
+                self._load_sensors()
+            return list(self._sensor_ids)
+
+    def _sensor_number(self, sensor_id):
+        with self._lock:
+            if sensor_id not in self._sensor_numbers and self.read_only:
+                self._load_sensors()
+            return self._sensor_numbers.get(sensor_id)
+
+    def query(self, sensor_id, start, end):
+        # Raw readings of one sensor with start <= time < end (epoch seconds)
+        sensor = self._sensor_number(sensor_id)
+        if sensor is None:
+            return []
+        start_ms, end_ms = int(start * 1000), int(end * 1000)
+        rows = []
+        for partition, delta_rows in self._snapshot(start_ms, end_ms):
+            rows.extend(partition.raw_rows(sensor, start_ms, end_ms, delta_rows))
+        rows.sort()
+        return [(t / 1000, round(temperature, 2), round(humidity, 2), bool(anomaly))
+                for t, temperature, humidity, anomaly in rows]
+
+    def aggregate(self, start, end, step, sensor_id=None):
+        # Statistics of one sensor (or of all sensors) per step seconds bucket with start <= time < end
+        sensor = None
+        if sensor_id is not None:
+            sensor = self._sensor_number(sensor_id)
+            if sensor is None:
+                return []
+        start_ms, end_ms, step_ms = int(start * 1000), int(end * 1000), int(step * 1000)
+        if step_ms <= 0:
+            raise ValueError("step must be positive")
+        rollup = None
+        for name, resolution in sorted(ROLLUPS.items(), key=lambda item: -item[1]):
+            if step_ms % resolution == 0 and start_ms % resolution == 0 and end_ms % resolution == 0:
+                rollup = name
+                break
+        buckets = {}
+
+        def bucket_stats(t):
+            key = start_ms + (t - start_ms) // step_ms * step_ms
+            stats = buckets.get(key)
+            if stats is None:
+                stats = buckets[key] = _new_stats()
+            return stats
+
+        for partition, delta_rows in self._snapshot(start_ms, end_ms):
+            rollups = partition.rollups(rollup) if rollup is not None else None
+            columns, _ = partition.main()
+            if rollups is not None:
+                rows, index = rollups
+                if sensor is None:
+                    selected = rows
+                else:
+                    first, count = index.get(sensor, (0, 0))
+                    selected = rows[first:first + count]
+                for _, t, *values in selected:
+                    if start_ms <= t < end_ms:
+                        _add_stats(bucket_stats(t), *values)
+                include_main = False
+            elif columns is None:
+                continue  # Raw rows expired and the query is not aligned to the rollups
+            else:
+                include_main = True
+            if np is not None:  # Same grouping as the rollups, on the time since start_ms
+                times, temperatures, humidities, anomalies = partition.raw_columns(sensor, start_ms, end_ms, delta_rows,
+                                                                                   include_main)
+                order = np.argsort(times, kind="stable")
+                for _, offset, *values in _compute_rollups_numpy(np.zeros(len(times), dtype=np.uint32), times[order] - start_ms,
+                                                                 temperatures[order], humidities[order], anomalies[order], step_ms):
+                    _add_stats(bucket_stats(start_ms + offset), *values)
+                continue
+            for t, temperature, humidity, anomaly in partition.raw_rows(sensor, start_ms, end_ms, delta_rows, include_main):
+                _add_reading(bucket_stats(t), temperature, humidity, anomaly)
+
+        result = []
+        for key in sorted(buckets):
+            count, anomalies, t_sum, t_min, t_max, h_sum, h_min, h_max = buckets[key]
+            bucket = {"start": key / 1000, "count": count, "anomalies": anomalies}
+            if count:
+                bucket.update({"meanTemperature": round(t_sum / count, 2), "minTemperature": round(t_min, 2),
+                               "maxTemperature": round(t_max, 2), "meanHumidity": round(h_sum / count, 2),
+                               "minHumidity": round(h_min, 2), "maxHumidity": round(h_max, 2)})
+            result.append(bucket)
+        return result
+
+
+# Command line queries against a store directory, also while the central server is writing to it
+def main():
+    parser = argparse.ArgumentParser(description="Query the central server's time-series store")
+    parser.add_argument("--dir", type=str, required=True, help="Store directory (central_server.py --store_dir)")
+    parser.add_argument("--sensor", type=str, default=None, help="Sensor ID (default: all sensors, aggregates only)")
+    parser.add_argument("--last", type=float, default=3600, help="Query the last this many seconds")
+    parser.add_argument("--start", type=float, default=None, help="(Optional) Start time in epoch seconds instead of --last")
+    parser.add_argument("--end", type=float, default=None, help="(Optional) End time in epoch seconds (default: now)")
+    parser.add_argument("--step", type=float, default=None, help="(Optional) Aggregate per this many seconds instead of listing readings")
+    parser.add_argument("--list_sensors", action="store_true", help="List the stored sensor IDs")
+    args = parser.parse_args()
+
+    store = TimeSeriesStore(args.dir, read_only=True)
+    if args.list_sensors:
+        print(json.dumps(store.sensors()))
+        return
+    end = args.end if args.end is not None else time.time()
+    start = args.start if args.start is not None else end - args.last
+    if args.step is not None:
+        for bucket in store.aggregate(start, end, args.step, args.sensor):
+            print(json.dumps(bucket))
+    elif args.sensor is None:
+        parser.error("--sensor is required to list readings")
+    else:
+        for t, temperature, humidity, anomaly in store.query(args.sensor, start, end):
+            print(json.dumps({"time": t, "temperature": temperature, "humidity": humidity, "anomaly": anomaly}))
+
+
+if __name__ == "__main__":
+    main()
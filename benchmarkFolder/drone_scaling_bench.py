@@ -0,0 +1,63 @@
+# drone_scaling_bench.py
+# Runs the end-to-end benchmark (e2e_bench.py) once per drone ingest worker count and prints one JSON line per run,
+# to see how the drone's throughput scales with --ingest_processes. 0 is the single-process drone (--engine).
+#   python drone_scaling_bench.py --workers 0,1,2,4 --sensors 400 --rate 100 --duration 10 --output scaling.jsonl
+# Offer more load than one drone process can take (sensors x rate): "speedup" is the central server's message rate
+# relative to the first run, "lost" what the drone could not keep up with by the end of the run.
+# The workers only take reading the sockets and decoding off the main process, which still validates, aggregates
+# and forwards every reading, so the gain levels off once that is the bottleneck. Each worker needs its own core:
+# on a machine with fewer cores than workers + 1 (plus the sensor and central server processes) expect no gain.
+import argparse
+import json
+import os
+import time
+
+from e2e_bench import git_version, run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drone throughput per number of ingest worker processes")
+    parser.add_argument("--workers", type=str, default="0,1,2,4", help="Comma separated ingest worker counts to run")
+    parser.add_argument("--sensors", type=int, default=400, help="Number of simulated sensors")
+    parser.add_argument("--rate", type=float, default=100.0, help="Readings per second sent by each sensor")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to keep sending after ramp-up")
+    parser.add_argument("--ramp_up", type=float, default=2.0, help="Seconds over which the sensors connect")
+    parser.add_argument("--drain", type=float, default=3.0, help="Seconds to wait for data in flight after the sensors stop")
+    parser.add_argument("--engine", choices=("threaded", "async"), default="async", help="Drone ingest engine of the 0 workers run")
+    parser.add_argument("--wire_format", choices=("json", "binary"), default="json", help="Sensor -> drone format")
+    parser.add_argument("--trace_ratio", type=float, default=0.0, help="Share of readings carrying a latency trace")
+    parser.add_argument("--output", type=str, default=None, help="(Optional) Also append the JSON results to this file")
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in [int(count) for count in args.workers.split(",")]:
+        e2e_args = argparse.Namespace(sensors=args.sensors, rate=args.rate, duration=args.duration, ramp_up=args.ramp_up,
+                                      drain=args.drain, engine=args.engine, wire_format=args.wire_format,
+                                      forward_format="batch", forward_compression="zlib", forward_binary=False,
+                                      trace_ratio=args.trace_ratio, sample_interval=0.5, ingest_processes=workers)
+        report = run(e2e_args)
+        rate = report["server_messages_per_sec"]
+        if baseline is None:
+            baseline = rate
+        result = json.dumps({
+            "benchmark": "drone_scaling",
+            "version": git_version(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "config": {**report["config"], "cpus": os.cpu_count()},
+            "ingest_processes": workers,
+            "sent": report["sent"],
+            "received": report["received"],
+            "lost": report["lost"],
+            "server_messages_per_sec": rate,
+            "speedup": round(rate / baseline, 2) if rate and baseline else None,
+            "latency": report["latency"],
+            "drone": report["processes"]["drone"],
+        })
+        print(result, flush=True)
+        if args.output:
+            with open(args.output, "a") as f:
+                f.write(result + "\n")
+
+
+if __name__ == "__main__":
+    main()
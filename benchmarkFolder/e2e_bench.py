@@ -0,0 +1,275 @@
+# e2e_bench.py
+# End-to-end benchmark of sensor -> drone -> central server. Runs the three tiers locally as separate headless
+# processes (sensor.py in load generation mode, drone.py, and the central server with a measuring subscriber),
+# then prints one JSON line with throughput, loss, latency percentiles per hop and CPU / RSS per process.
+# Append the output of several versions to a file with --output to track regressions.
+#   python e2e_bench.py --sensors 200 --rate 10 --duration 20 --output results.jsonl
+# Latency comes from the readings sampled by --trace_ratio (see sensorFolder/load_generator.py):
+#   sensor_to_drone - sent by the sensor until handled by the drone (ingest, queueing, validation)
+#   drone_to_server - handled by the drone until published by the central server (forwarding batches, network)
+#   end_to_end      - sent by the sensor until published by the central server
+# The drone and the central server use their fixed ports 5647 and 6000, which must be free. The simulated battery
+# makes the drone store data instead of forwarding it after about 80 seconds, so keep runs shorter than that.
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "commonFolder"))
+sys.path.append(os.path.join(ROOT, "sensorFolder"))
+
+from load_generator import percentiles
+
+DRONE_PORT = 5647
+SERVER_PORT = 6000
+
+
+# --- Central server side (runs in its own process, started with --role server) ---
+class MeasuringSubscriber:
+    def __init__(self):
+        self.readings = 0
+        self.aggregates = 0
+        self.first = None
+        self.last = None
+        self.hops = {"sensor_to_drone": [], "drone_to_server": [], "end_to_end": []}
+
+    def on_data(self, data):
+        now = time.time()
+        if "temperature" not in data:
+            self.aggregates += 1
+            return
+        self.readings += 1
+        if self.first is None:
+            self.first = now
+        self.last = now
+        trace = data.get("trace")
+        if isinstance(trace, dict) and "sent" in trace and "drone" in trace:
+            self.hops["sensor_to_drone"].append(trace["drone"] - trace["sent"])
+            self.hops["drone_to_server"].append(now - trace["drone"])
+            self.hops["end_to_end"].append(now - trace["sent"])
+
+    def on_log(self, line):
+        pass
+
+
+def run_server_role():
+    sys.path.append(os.path.join(ROOT, "CentralServerFolder"))
+    import central_server
+
+    subscriber = MeasuringSubscriber()
+    central_server.subscribers.append(subscriber)
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    threading.Thread(target=central_server.start_server, daemon=True).start()
+    while not stop.is_set():
+        stop.wait(0.2)
+    elapsed = (subscriber.last - subscriber.first) if subscriber.readings > 1 else 0.0
+    print(json.dumps({
+        "readings": subscriber.readings,
+        "aggregates": subscriber.aggregates,
+        "messages_per_sec": round(subscriber.readings / elapsed, 1) if elapsed > 0 else 0.0,
+        "traced": len(subscriber.hops["end_to_end"]),
+        "latency": {hop: percentiles(values) for hop, values in subscriber.hops.items()},
+    }), flush=True)
+
+
+# --- Orchestration ---
+class ProcessSampler:
+    # Samples CPU time and RSS of the benchmarked processes from /proc (Linux). Elsewhere the values stay None.
+    # The child processes of a process (e.g. the ingest workers of drone.py --ingest_processes) are added to it.
+    def __init__(self, processes, interval):
+        self.processes = processes  # name -> Popen
+        self.interval = interval
+        self.ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        self.cpu = {name: None for name in processes}
+        self.rss_peak = {name: None for name in processes}
+        self.rss_sum = {name: 0 for name in processes}
+        self.samples = {name: 0 for name in processes}
+        self.started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            for name, process in self.processes.items():
+                self._sample(name, process.pid)
+            self._stop.wait(self.interval)
+
+    def _read(self, pid):
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()  # The command name may contain spaces
+        with open(f"/proc/{pid}/status") as f:
+            rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        return (int(fields[11]) + int(fields[12])) / self.ticks, rss_kb  # utime + stime
+
+    def _sample(self, name, pid):
+        try:
+            cpu, rss_kb = self._read(pid)
+        except (OSError, StopIteration, IndexError, ValueError):
+            return  # Not Linux, or the process already exited
+        try:
+            with open(f"/proc/{pid}/task/{pid}/children") as f:
+                children = f.read().split()
+        except OSError:
+            children = ()
+        for child in children:
+            try:
+                child_cpu, child_rss_kb = self._read(child)
+            except (OSError, StopIteration, IndexError, ValueError):
+                continue
+            cpu += child_cpu
+            rss_kb += child_rss_kb
+        self.cpu[name] = max(self.cpu[name] or 0, cpu)  # A child that exited is no longer counted
+        self.rss_peak[name] = max(self.rss_peak[name] or 0, rss_kb)
+        self.rss_sum[name] += rss_kb
+        self.samples[name] += 1
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        report = {}
+        for name in self.processes:
+            cpu = self.cpu[name]
+            report[name] = {
+                "cpu_s": round(cpu, 2) if cpu is not None else None,
+                "cpu_pct": round(100 * cpu / elapsed, 1) if cpu is not None else None,
+                "rss_peak_mb": round(self.rss_peak[name] / 1024, 1) if self.rss_peak[name] else None,
+                "rss_avg_mb": round(self.rss_sum[name] / self.samples[name] / 1024, 1) if self.samples[name] else None,
+            }
+        return report
+
+
+def wait_for_port(port, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"nothing is listening on port {port}")
+
+
+def git_version():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def last_json_line(output):
+    for line in reversed(output.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    return None
+
+
+def run(args):
+    outbox_dir = tempfile.mkdtemp(prefix="e2e_outbox_")
+    processes = {}
+    try:
+        processes["central_server"] = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--role", "server"],
+                                                       stdout=subprocess.PIPE, text=True)
+        wait_for_port(SERVER_PORT)
+        drone_command = [sys.executable, os.path.join(ROOT, "droneFolder", "drone.py"), "--headless",
+                         "--engine", args.engine, "--outbox_dir", outbox_dir,
+                         "--forward_format", args.forward_format, "--forward_compression", args.forward_compression]
+        if args.forward_binary:
+            drone_command.append("--forward_binary")
+        if args.ingest_processes:
+            drone_command += ["--ingest_processes", str(args.ingest_processes)]
+        processes["drone"] = subprocess.Popen(drone_command, stdout=subprocess.DEVNULL)
+        wait_for_port(DRONE_PORT)
+        sensor_command = [sys.executable, os.path.join(ROOT, "sensorFolder", "sensor.py"),
+                          "--drone_ip", "127.0.0.1", "--drone_port", str(DRONE_PORT),
+                          "--load_sensors", str(args.sensors), "--rate", str(args.rate),
+                          "--duration", str(args.duration), "--ramp_up", str(args.ramp_up),
+                          "--wire_format", args.wire_format, "--trace_ratio", str(args.trace_ratio),
+                          "--report_interval", str(args.duration + args.ramp_up + 60)]
+        processes["sensor"] = subprocess.Popen(sensor_command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                               text=True)
+
+        sampler = ProcessSampler(processes, args.sample_interval)
+        sampler.start()
+        sensor_report = last_json_line(processes["sensor"].communicate()[0])
+        time.sleep(args.drain)  # Let the drone forward what it still holds
+        sampler.stop()
+        for name in ("drone", "central_server"):
+            processes[name].send_signal(signal.SIGTERM)
+        server_report = last_json_line(processes["central_server"].communicate(timeout=30)[0])
+    finally:
+        for process in processes.values():
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        shutil.rmtree(outbox_dir, ignore_errors=True)
+
+    sent = sensor_report["sent"] if sensor_report else None
+    received = server_report["readings"] if server_report else None
+    return {
+        "benchmark": "e2e",
+        "version": git_version(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {"sensors": args.sensors, "rate": args.rate, "duration": args.duration, "ramp_up": args.ramp_up,
+                   "engine": args.engine, "wire_format": args.wire_format, "forward_format": args.forward_format,
+                   "forward_compression": args.forward_compression, "forward_binary": args.forward_binary,
+                   "trace_ratio": args.trace_ratio, "ingest_processes": args.ingest_processes},
+        "sent": sent,
+        "received": received,
+        "lost": sent - received if sent is not None and received is not None else None,
+        "sensor_send_rate": sensor_report["achieved_rate"] if sensor_report else None,
+        "sensor_send_latency": sensor_report["latency"] if sensor_report else None,
+        "server_messages_per_sec": server_report["messages_per_sec"] if server_report else None,
+        "aggregates": server_report["aggregates"] if server_report else None,
+        "traced": server_report["traced"] if server_report else None,
+        "latency": server_report["latency"] if server_report else None,
+        "processes": sampler.report(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end sensor -> drone -> central server benchmark")
+    parser.add_argument("--sensors", type=int, default=100, help="Number of simulated sensors")
+    parser.add_argument("--rate", type=float, default=10.0, help="Readings per second sent by each sensor")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to keep sending after ramp-up")
+    parser.add_argument("--ramp_up", type=float, default=2.0, help="Seconds over which the sensors connect")
+    parser.add_argument("--drain", type=float, default=3.0, help="Seconds to wait for data in flight after the sensors stop")
+    parser.add_argument("--engine", choices=("threaded", "async"), default="async", help="Drone ingest engine")
+    parser.add_argument("--wire_format", choices=("json", "binary"), default="json", help="Sensor -> drone format (binary readings are not traced)")
+    parser.add_argument("--ingest_processes", type=int, default=0, help="Drone ingest worker processes (0: ingest in the drone process)")
+    parser.add_argument("--forward_format", choices=("batch", "lines"), default="batch", help="Drone -> central server format")
+    parser.add_argument("--forward_compression", default="zlib", help="Compression of the drone's batch frames")
+    parser.add_argument("--forward_binary", action="store_true", help="Forward readings as binary records")
+    parser.add_argument("--trace_ratio", type=float, default=0.1, help="Share of readings carrying a latency trace")
+    parser.add_argument("--sample_interval", type=float, default=0.5, help="Seconds between CPU / RSS samples")
+    parser.add_argument("--output", type=str, default=None, help="(Optional) Also append the JSON result to this file")
+    parser.add_argument("--role", choices=("server",), default=None, help=argparse.SUPPRESS)  # Used internally
+    args = parser.parse_args()
+
+    if args.role == "server":
+        run_server_role()
+        return
+    result = json.dumps(run(args))
+    print(result)
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(result + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# framing_bench.py
+# Micro-benchmark of newline frame decoding on MB-sized bursts: the str concatenation + split() loop the central
+# server used to run against commonFolder/framing.FrameDecoder, for small and large recv() chunk sizes.
+#   python framing_bench.py --burst_mb 4
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "commonFolder"))
+
+from framing import FrameDecoder
+
+
+def make_burst(size):
+    line = (json.dumps({"sensor_id": "sensor12", "temperature": 23.41, "humidity": 51.2,
+                        "timestamp": "2025-05-16T23:05:00Z", "anomaly": False}) + "\n").encode()
+    count = max(1, size // len(line))
+    return line * count, count
+
+
+def split_legacy(burst, chunk_size):
+    frames = 0
+    buffer = ""
+    for i in range(0, len(burst), chunk_size):
+        buffer += burst[i:i + chunk_size].decode()
+        while '\n' in buffer:
+            line, buffer = buffer.split('\n', 1)
+            frames += 1
+    return frames
+
+
+def split_decoder(burst, chunk_size):
+    frames = 0
+    decoder = FrameDecoder()
+    view = memoryview(burst)
+    for i in range(0, len(burst), chunk_size):
+        frames += len(decoder.feed(view[i:i + chunk_size]))
+    return frames
+
+
+def measure(fn, burst, chunk_size, expected, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        frames = fn(burst, chunk_size)
+        elapsed = time.perf_counter() - start
+        assert frames == expected, f"{fn.__name__} decoded {frames} frames, expected {expected}"
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame decoder micro-benchmark")
+    parser.add_argument("--burst_mb", type=float, default=2.0, help="Size of one burst in MB")
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1024, 65536, 1048576], help="recv() chunk sizes to test")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case, the best one is reported")
+    args = parser.parse_args()
+
+    burst, count = make_burst(int(args.burst_mb * 1024 * 1024))
+    for chunk_size in args.chunks:
+        for fn in (split_legacy, split_decoder):
+            elapsed = measure(fn, burst, chunk_size, count, args.repeat)
+            print(json.dumps({
+                "decoder": fn.__name__,
+                "burst_bytes": len(burst),
+                "chunk_size": chunk_size,
+                "frames": count,
+                "seconds": round(elapsed, 4),
+                "mb_per_sec": round(len(burst) / elapsed / 1e6, 1),
+                "frames_per_sec": round(count / elapsed),
+            }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# ingest_loadtest.py
+# Load test for the drone's sensor ingest engines. Starts an engine in-process with a counting session
+# (no GUI, no forwarding), opens many simulated sensor connections and reports connections held and messages/sec.
+#   python ingest_loadtest.py --engine async --connections 2000 --rate 5 --duration 10
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "droneFolder"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "commonFolder"))
+
+from fdlimit import raise_fd_limit
+from ingest import ENGINES, create_ingest_server
+
+
+class CountingSession:
+    handled = 0  # Only updated from the engine's processing threads, the GIL keeps the increment good enough for a benchmark
+
+    def __init__(self, addr):
+        pass
+
+    def handle(self, message):
+        CountingSession.handled += 1
+
+    def close(self):
+        pass
+
+
+async def sensor_client(port, index, rate, deadline, stats):
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    except OSError:
+        stats["failed"] += 1
+        return
+    stats["connected"] += 1
+    line = (json.dumps({"sensor_id": f"sensor{index}", "temperature": 21.5, "humidity": 40.0,
+                        "timestamp": "2025-05-16T23:05:00Z"}) + "\n").encode()
+    interval = 1.0 / rate
+    next_send = time.monotonic()
+    try:
+        while time.monotonic() < deadline:
+            writer.write(line)
+            await writer.drain()  # Blocks when the drone stops reading, i.e. under backpressure
+            stats["sent"] += 1
+            next_send += interval
+            await asyncio.sleep(max(0.0, next_send - time.monotonic()))
+    except OSError:
+        stats["dropped"] += 1
+    finally:
+        writer.close()
+
+
+async def run_clients(port, connections, rate, duration, ramp):
+    stats = {"connected": 0, "failed": 0, "dropped": 0, "sent": 0}
+    deadline = time.monotonic() + ramp + duration
+    tasks = []
+    for i in range(connections):
+        tasks.append(asyncio.create_task(sensor_client(port, i, rate, deadline, stats)))
+        if ramp:
+            await asyncio.sleep(ramp / connections)
+    await asyncio.gather(*tasks)
+    return stats
+
+
+def run(engine, connections, rate, duration, ramp):
+    CountingSession.handled = 0
+    server = create_ingest_server(engine, "127.0.0.1", 0, CountingSession, max_connections=connections)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.ready.wait()
+
+    peak = {"held": 0}
+    done = threading.Event()
+
+    def sample_connections():
+        while not done.is_set():
+            peak["held"] = max(peak["held"], server.active_connections)
+            time.sleep(0.1)
+
+    threading.Thread(target=sample_connections, daemon=True).start()
+    start = time.perf_counter()
+    stats = asyncio.run(run_clients(server.port, connections, rate, duration, ramp))
+    elapsed = time.perf_counter() - start
+    time.sleep(0.5)  # Let the engine finish the messages still in flight
+    done.set()
+    server.stop()
+    return {
+        "engine": engine,
+        "connections_requested": connections,
+        "connections_held_peak": peak["held"],
+        "connect_failures": stats["failed"],
+        "dropped_during_run": stats["dropped"],
+        "messages_sent": stats["sent"],
+        "messages_handled": CountingSession.handled,
+        "messages_per_sec": round(CountingSession.handled / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drone ingest engine load test")
+    parser.add_argument("--engine", choices=ENGINES + ("both",), default="both", help="Engine to test")
+    parser.add_argument("--connections", type=int, default=1000, help="Number of simulated sensors")
+    parser.add_argument("--rate", type=float, default=10.0, help="Messages per second sent by each sensor")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to keep sending after ramp-up")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Seconds over which the connections are opened")
+    args = parser.parse_args()
+
+    fd_limit = raise_fd_limit()
+    if args.connections * 2 + 64 > fd_limit:
+        print(f"[WARNING] file descriptor limit {fd_limit} is too low for {args.connections} connections")
+
+    engines = ENGINES if args.engine == "both" else (args.engine,)
+    for engine in engines:
+        print(json.dumps(run(engine, args.connections, args.rate, args.duration, args.ramp)))
+
+
+if __name__ == "__main__":
+    main()
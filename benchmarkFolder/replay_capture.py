@@ -0,0 +1,137 @@
+# replay_capture.py
+# Replays a capture recorded with --capture by drone.py (sensor traffic) or central_server.py (drone traffic) into a
+# running drone or central server, then prints one JSON line with what was sent and how closely the pace was kept.
+# Every captured connection is opened again and receives exactly the bytes recorded for it, in the same chunks.
+#   python replay_capture.py --capture sensors.cap --target drone                 original pace
+#   python replay_capture.py --capture sensors.cap --target drone --speed 10      10x faster
+#   python replay_capture.py --capture drones.cap --target server --speed 0       as fast as possible
+# Whatever the target sends back (binary handshake replies, batch acknowledgements) is read and discarded.
+# The central server drops batches of a drone session it already handled, so replay drone traffic into a freshly
+# started central server. Compare the target's metrics or the printed rates between versions.
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(os.path.join(ROOT, "commonFolder"))
+sys.path.append(os.path.join(ROOT, "sensorFolder"))
+
+from capture import KIND_CLOSE, KIND_DATA, KIND_OPEN, read_capture
+from load_generator import percentiles
+from e2e_bench import git_version
+
+TARGET_PORTS = {"drone": 5647, "server": 6000}
+
+
+def drain(sock, received):
+    # Reads and discards what the target sends back until it closes the connection, then closes the socket
+    try:
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            received[0] += len(data)
+    except OSError:
+        pass
+    sock.close()
+
+
+def end_stream(sock, how=socket.SHUT_WR):
+    # Ends the stream towards the target; it then closes its end, which ends the drain thread
+    try:
+        sock.shutdown(how)
+    except OSError:
+        pass
+
+
+def replay(path, host, port, speed):
+    capture_start, records = read_capture(path)
+    connections = {}  # capture connection id -> socket
+    received = [0]
+    drains = []
+    stats = {"connections": 0, "connect_failures": 0, "send_failures": 0, "records": 0, "sent_bytes": 0}
+    lateness = []  # Seconds each chunk was sent after it was due
+    last_time = 0.0
+    start = time.perf_counter()
+    for record_time, connection_id, kind, payload in records:
+        stats["records"] += 1
+        last_time = record_time
+        if speed > 0:
+            delay = start + record_time / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                lateness.append(-delay)
+        if kind == KIND_OPEN:
+            try:
+                sock = socket.create_connection((host, port))
+            except OSError:
+                stats["connect_failures"] += 1
+                continue
+            connections[connection_id] = sock
+            stats["connections"] += 1
+            thread = threading.Thread(target=drain, args=(sock, received), daemon=True)
+            thread.start()
+            drains.append(thread)
+        elif kind == KIND_DATA:
+            sock = connections.get(connection_id)
+            if sock is None:
+                continue  # The connection failed, or it was opened before the capture started
+            try:
+                sock.sendall(payload)
+                stats["sent_bytes"] += len(payload)
+            except OSError:
+                stats["send_failures"] += 1
+                end_stream(connections.pop(connection_id), socket.SHUT_RDWR)
+        elif kind == KIND_CLOSE:
+            sock = connections.pop(connection_id, None)
+            if sock is not None:
+                end_stream(sock)
+    elapsed = time.perf_counter() - start
+    for sock in connections.values():  # Still open when the capture ended
+        end_stream(sock)
+    for thread in drains:
+        thread.join(timeout=5)
+    stats.update({
+        "capture_start": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(capture_start)),
+        "capture_duration_s": round(last_time, 3),
+        "elapsed_s": round(elapsed, 3),
+        "bytes_per_sec": round(stats["sent_bytes"] / elapsed, 1) if elapsed > 0 else None,
+        "records_per_sec": round(stats["records"] / elapsed, 1) if elapsed > 0 else None,
+        "received_bytes": received[0],
+        "behind_schedule": percentiles(lateness),
+    })
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a captured traffic file into a drone or central server")
+    parser.add_argument("--capture", type=str, required=True, help="Capture file written with --capture")
+    parser.add_argument("--target", choices=tuple(TARGET_PORTS), default="drone", help="Tier the capture is replayed into")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Host of the target")
+    parser.add_argument("--port", type=int, default=None, help="(Optional) Port of the target (default: the target's fixed port)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed: 1 original pace, N for N times faster, 0 as fast as possible")
+    parser.add_argument("--output", type=str, default=None, help="(Optional) Also append the JSON result to this file")
+    args = parser.parse_args()
+
+    port = args.port if args.port is not None else TARGET_PORTS[args.target]
+    stats = replay(args.capture, args.host, port, args.speed)
+    result = json.dumps({
+        "benchmark": "replay",
+        "version": git_version(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {"capture": os.path.basename(args.capture), "target": args.target, "speed": args.speed},
+        **stats,
+    })
+    print(result)
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(result + "\n")
+
+
+if __name__ == "__main__":
+    main()
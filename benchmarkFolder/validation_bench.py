@@ -0,0 +1,95 @@
+# validation_bench.py
+# Compares the throughput of the drone's reading validation: the original per-message checks (strptime twice and an
+# uncompiled regex per reading) against droneFolder/validation.validate_batch, with and without NumPy.
+#   python validation_bench.py --messages 200000 --batch 256
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "droneFolder"))
+
+import validation
+from validation import validate_batch
+
+
+def legacy_process_data(message):
+    def is_valid_time(s):
+        try:
+            datetime.strptime(s, "%Y-%m-%dT%H:%M:%SZ")
+            return True
+        except ValueError:
+            return False
+
+    valid = (
+        isinstance(message.get("sensor_id"), str) and bool(re.fullmatch(r"sensor\d+", message["sensor_id"])) and
+        isinstance(message.get("temperature"), (int, float)) and -100 <= message["temperature"] <= 100 and
+        isinstance(message.get("humidity"), (int, float)) and 0 <= message["humidity"] <= 100 and
+        isinstance(message.get("timestamp"), str) and is_valid_time(message["timestamp"])
+    )
+    datetime.strptime(message["timestamp"], "%Y-%m-%dT%H:%M:%SZ")  # process_one_message parsed the timestamp again
+    return valid
+
+
+# Same distributions as sensor.generate_sensor_data, spread over a few hundred sensors and one timestamp per second
+def make_messages(count, sensors):
+    start = datetime(2025, 5, 16, 23, 0, 0)
+    messages = []
+    for i in range(count):
+        temperature = round(random.uniform(150.0, 1000.0), 2) if random.random() < 0.05 else round(random.uniform(-100.0, 100.0), 2)
+        humidity = round(random.uniform(-150.0, -1000.0), 2) if random.random() < 0.05 else round(random.uniform(0.0, 100.0), 2)
+        timestamp = (start + timedelta(seconds=i // sensors)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        messages.append({"sensor_id": f"sensor{i % sensors}", "temperature": temperature,
+                         "humidity": humidity, "timestamp": timestamp})
+    return messages
+
+
+def clear_caches():
+    validation.parse_timestamp.cache_clear()
+    validation.is_valid_sensor_id.cache_clear()
+
+
+def bench_legacy(messages, batch):
+    return [not legacy_process_data(m) for m in messages]
+
+
+def bench_batch(messages, batch, use_numpy):
+    anomalies = []
+    for i in range(0, len(messages), batch):
+        anomalies += validate_batch(messages[i:i + batch], use_numpy=use_numpy)[0]
+    return anomalies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reading validation benchmark")
+    parser.add_argument("--messages", type=int, default=200000, help="Number of readings to validate")
+    parser.add_argument("--sensors", type=int, default=500, help="Number of distinct sensor IDs")
+    parser.add_argument("--batch", type=int, default=256, help="Batch size for validate_batch")
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages, args.sensors)
+    cases = [("per_message_legacy", lambda: bench_legacy(messages, args.batch)),
+             ("batch_python", lambda: bench_batch(messages, args.batch, False))]
+    if validation.np is not None:
+        cases.append(("batch_numpy", lambda: bench_batch(messages, args.batch, True)))
+    else:
+        print(json.dumps({"note": "NumPy is not installed, skipping batch_numpy"}))
+
+    expected = None
+    for name, fn in cases:
+        clear_caches()
+        start = time.perf_counter()
+        anomalies = fn()
+        elapsed = time.perf_counter() - start
+        expected = expected or anomalies
+        assert anomalies == expected, f"{name} disagrees with the legacy validation"
+        print(json.dumps({"mode": name, "messages": len(messages), "batch": args.batch,
+                          "seconds": round(elapsed, 3), "messages_per_sec": round(len(messages) / elapsed)}))
+
+
+if __name__ == "__main__":
+    main()
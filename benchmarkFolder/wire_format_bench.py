@@ -0,0 +1,101 @@
+# wire_format_bench.py
+# Compares JSON text and the binary records of commonFolder/readings.py: bytes on the wire per reading and
+# decode throughput, for sensor -> drone readings and for drone -> central server batch frames.
+#   python wire_format_bench.py --readings 200000
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "commonFolder"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sensorFolder"))
+
+from framing import FrameDecoder
+from protocol import COMPRESSIONS, ForwardDecoder, encode_batch
+from readings import ReadingDecoder, encode_forwarded, encode_reading
+from sensor import generate_sensor_data
+
+
+def make_readings(count, sensors):
+    readings = [generate_sensor_data(f"sensor{i % sensors}") for i in range(count)]
+    forwarded = [dict(r, anomaly=not (-100 <= r["temperature"] <= 100 and 0 <= r["humidity"] <= 100)) for r in readings]
+    return readings, forwarded
+
+
+def chunked(data, size=65536):
+    view = memoryview(data)
+    return [view[i:i + size] for i in range(0, len(data), size)]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    count = fn()
+    return count, time.perf_counter() - start
+
+
+def bench_sensor_stream(readings):
+    json_stream = b"".join((json.dumps(r) + "\n").encode() for r in readings)
+    binary_stream = b"".join(encode_reading(r) for r in readings)
+
+    def decode_json():
+        decoder = FrameDecoder()
+        return sum(len([json.loads(f) for f in decoder.feed(c)]) for c in chunked(json_stream))
+
+    def decode_binary():
+        decoder = ReadingDecoder()
+        return sum(len(decoder.feed(c)) for c in chunked(binary_stream))
+
+    for name, stream, fn in (("sensor_json", json_stream, decode_json), ("sensor_binary", binary_stream, decode_binary)):
+        count, elapsed = timed(fn)
+        assert count == len(readings)
+        yield {"format": name, "bytes_per_reading": round(len(stream) / len(readings), 1),
+               "decode_messages_per_sec": round(count / elapsed)}
+
+
+def bench_forward_batches(forwarded, batch_size, compression):
+    batches = [forwarded[i:i + batch_size] for i in range(0, len(forwarded), batch_size)]
+    json_stream = b"".join(encode_batch(1, seq, [json.dumps(m).encode() for m in batch], compression)
+                           for seq, batch in enumerate(batches, 1))
+    binary_stream = b"".join(encode_batch(1, seq, [], compression, b"".join(encode_forwarded(m) for m in batch))
+                             for seq, batch in enumerate(batches, 1))
+
+    def decode(stream, parse_json):
+        def run():
+            decoder = ForwardDecoder()
+            count = 0
+            for chunk in chunked(stream):
+                for batch in decoder.feed(chunk):
+                    count += len(batch.readings)
+                    if parse_json:
+                        count += len([json.loads(line) for line in batch.lines])
+            return count
+        return run
+
+    name = [k for k, v in COMPRESSIONS.items() if v == compression][0]
+    for label, stream, parse_json in (("forward_json", json_stream, True), ("forward_binary", binary_stream, False)):
+        count, elapsed = timed(decode(stream, parse_json))
+        assert count == len(forwarded)
+        yield {"format": f"{label}_{name}", "bytes_per_reading": round(len(stream) / len(forwarded), 1),
+               "decode_messages_per_sec": round(count / elapsed)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON vs binary wire format benchmark")
+    parser.add_argument("--readings", type=int, default=200000, help="Number of readings")
+    parser.add_argument("--sensors", type=int, default=1000, help="Number of distinct sensor IDs")
+    parser.add_argument("--batch", type=int, default=200, help="Readings per forwarded batch")
+    args = parser.parse_args()
+
+    random.seed(1)
+    readings, forwarded = make_readings(args.readings, args.sensors)
+    for result in bench_sensor_stream(readings):
+        print(json.dumps(result))
+    for compression in (COMPRESSIONS["none"], COMPRESSIONS["zlib"]):
+        for result in bench_forward_batches(forwarded, args.batch, compression):
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
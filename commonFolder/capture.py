@@ -0,0 +1,108 @@
+# capture.py
+# Record of the raw bytes received on the connections of the drone (from sensors) or of the central server
+# (from drones), to replay real traffic later with benchmarkFolder/replay_capture.py.
+# File layout, little endian, append-only:
+#   FILE_HEADER  - magic b"CAPT", format version, capture start time (epoch seconds, float64)
+#   RECORD       - microseconds since the start, connection id, kind, payload length, followed by the payload:
+#                  KIND_OPEN  - a connection was accepted, payload: the peer address as "host:port"
+#                  KIND_DATA  - bytes received on the connection, exactly as one recv() returned them
+#                  KIND_CLOSE - the connection was closed, no payload
+# Records are buffered and flushed every flush_interval seconds by a background thread, when a connection closes and
+# on close(). A capture cut short by a crash ends with at most a partial record, which read_capture() ignores.
+import struct
+import threading
+import time
+
+MAGIC = b"CAPT"
+FORMAT_VERSION = 1
+FILE_HEADER = struct.Struct("<4sBd")
+RECORD = struct.Struct("<QIBI")
+
+KIND_DATA = 0
+KIND_OPEN = 1
+KIND_CLOSE = 2
+
+
+class CaptureWriter:
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.records = 0
+        self.bytes = 0
+        self._file = open(path, "xb")  # Never overwrite an earlier capture
+        self._lock = threading.Lock()  # Connections are served by several threads
+        self._next_id = 0
+        self._start = time.monotonic()
+        self._file.write(FILE_HEADER.pack(MAGIC, FORMAT_VERSION, time.time()))
+        threading.Thread(target=self._flush_loop, name="capture-flush", daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            with self._lock:
+                if self._file.closed:
+                    return
+                self._file.flush()
+
+    def _write(self, connection_id, kind, payload=b""):
+        with self._lock:  # Timestamps are taken under the lock, so the records of all connections stay in time order
+            if self._file.closed:
+                return
+            micros = int((time.monotonic() - self._start) * 1000000)
+            self._file.write(RECORD.pack(micros, connection_id, kind, len(payload)))
+            if payload:
+                self._file.write(payload)
+            self.records += 1
+            self.bytes += len(payload)
+            if kind == KIND_CLOSE:
+                self._file.flush()
+
+    # Returns the id to record the connection's data with
+    def open(self, addr):
+        with self._lock:
+            self._next_id += 1
+            connection_id = self._next_id
+        self._write(connection_id, KIND_OPEN, f"{addr[0]}:{addr[1]}".encode() if addr else b"")
+        return connection_id
+
+    def data(self, connection_id, data):
+        self._write(connection_id, KIND_DATA, bytes(data))
+
+    def close_connection(self, connection_id):
+        self._write(connection_id, KIND_CLOSE)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+class CaptureFormatError(ValueError):
+    pass
+
+
+# Returns the capture's start time and an iterator over its (seconds since the start, connection id, kind, payload)
+def read_capture(path):
+    f = open(path, "rb")
+    header = f.read(FILE_HEADER.size)
+    if len(header) < FILE_HEADER.size:
+        f.close()
+        raise CaptureFormatError(f"{path} is not a capture file")
+    magic, version, start = FILE_HEADER.unpack(header)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        f.close()
+        raise CaptureFormatError(f"{path} is not a capture file (or of an unsupported version)")
+    return start, _records(f)
+
+
+def _records(f):
+    with f:
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            micros, connection_id, kind, length = RECORD.unpack(header)
+            payload = f.read(length) if length else b""
+            if len(payload) < length:
+                return
+            yield micros / 1000000, connection_id, kind, payload
@@ -0,0 +1,11 @@
+# fdlimit.py
+# File descriptor limit of the load tools, which hold one socket per simulated sensor.
+import resource
+
+
+# Raises the soft limit on open files to the hard limit, returns the limit now in effect
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
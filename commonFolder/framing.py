@@ -0,0 +1,73 @@
+# framing.py
+# Incremental decoder for the newline-terminated frames exchanged between sensors, the drone and the central server.
+# TCP does not preserve message boundaries: one recv() can return half a frame or several frames at once.
+# The decoder keeps the unconsumed bytes in a single bytearray and only remembers offsets into it, so a burst
+# is scanned once and the buffer is compacted rarely instead of being re-copied for every frame.
+
+DELIMITER = b"\n"
+DEFAULT_MAX_FRAME_SIZE = 1024 * 1024
+RECV_SIZE = 64 * 1024
+
+
+class FrameTooLargeError(ValueError):
+    pass
+
+
+class FrameDecoder:
+    def __init__(self, max_frame_size=DEFAULT_MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+        self._start = 0  # Offset of the first byte that does not belong to an already returned frame
+        self._scan = 0   # Offset from which to look for the next delimiter, bytes before it are known to contain none
+        self._chunk = bytearray(RECV_SIZE)
+        self._chunk_view = memoryview(self._chunk)
+
+    def feed(self, data):
+        # Append received bytes and return the complete frames (without the delimiter) as a list of bytes.
+        # Empty frames are skipped.
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        start = self._start
+        last = buffer.rfind(DELIMITER, self._scan)
+        if last != -1:
+            # Every complete frame ends at or before the last delimiter: copy that region out once and split it in C
+            with memoryview(buffer) as view:
+                frames = bytes(view[start:last]).split(DELIMITER)
+            if b"" in frames:
+                frames = [frame for frame in frames if frame]
+            start = last + 1
+        self._scan = len(buffer)
+
+        if start == len(buffer):  # Everything consumed, reuse the allocation
+            buffer.clear()
+            start = self._scan = 0
+        elif start > RECV_SIZE and start * 2 > len(buffer):  # Compact only once the consumed prefix dominates the buffer
+            del buffer[:start]
+            self._scan -= start
+            start = 0
+        self._start = start
+
+        if len(buffer) - start > self.max_frame_size:
+            raise FrameTooLargeError(f"frame exceeds {self.max_frame_size} bytes without a delimiter")
+        return frames
+
+    def recv_frames(self, sock):
+        # Read once from a blocking socket into a reusable chunk and return the frames completed by it.
+        # Returns None once the peer has closed the connection.
+        n = sock.recv_into(self._chunk)
+        if not n:
+            return None
+        return self.feed(self._chunk_view[:n])
+
+    def take_pending(self):
+        # Returns the buffered bytes after the last complete frame and empties the decoder, e.g. to hand the rest of
+        # the stream over to a different decoder
+        rest = bytes(self._buffer[self._start:])
+        self._buffer.clear()
+        self._start = self._scan = 0
+        return rest
+
+    def pending(self):
+        # Number of buffered bytes that do not form a complete frame yet
+        return len(self._buffer) - self._start
@@ -0,0 +1,270 @@
+# metrics.py
+# Low-overhead counters, gauges and latency histograms, exposed in the Prometheus text format on a local HTTP
+# endpoint together with an on-demand sampling profiler.
+# Counters and histograms accumulate into one cell per thread, so the hot paths never take a lock: a thread only
+# touches its own cell, and a scrape sums the cells (cells of finished threads are folded into a retired cell).
+#   GET /metrics          - all metrics of REGISTRY
+#   GET /profile/start    - start sampling the stacks of all threads (optional ?interval_ms=5)
+#   GET /profile/stop     - stop sampling and return the folded stacks ("frame;frame;frame count", flamegraph input)
+#   GET /profile          - folded stacks sampled so far
+# Other paths can be added with start_metrics_server(routes={path: function returning the response text}).
+import sys
+import threading
+from bisect import bisect_left
+from collections import Counter as _StackCounter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _PerThreadCells:
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        self._lock = threading.Lock()  # Only taken the first time a thread touches the metric, and by collect()
+        self._cells = []               # (thread, cell)
+        self._retired = [0] * size
+
+    def cell(self):
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._local.cell = [0] * self._size
+            with self._lock:
+                self._retire()  # Keeps the list at the live threads even if nobody scrapes (e.g. a thread per connection)
+                self._cells.append((threading.current_thread(), cell))
+            return cell
+
+    # Folds the cells of finished threads into the retired cell, with the lock held
+    def _retire(self):
+        alive = []
+        for thread, cell in self._cells:
+            if thread.is_alive():
+                alive.append((thread, cell))
+            else:  # The thread is gone, its cell will not change any more
+                for i, value in enumerate(cell):
+                    self._retired[i] += value
+        self._cells = alive
+
+    def collect(self):
+        with self._lock:
+            self._retire()
+            total = list(self._retired)
+            for _, cell in self._cells:
+                for i, value in enumerate(cell):
+                    total[i] += value
+            return total
+
+
+class Counter:
+    # Either inc() from the code, or given a function returning a count kept elsewhere (e.g. in a stats() dict)
+    kind = "counter"
+
+    def __init__(self, name, help_text, func=None):
+        self.name = name
+        self.help = help_text
+        self.func = func
+        self._cells = _PerThreadCells(1)
+
+    def inc(self, amount=1):
+        self._cells.cell()[0] += amount
+
+    @property
+    def value(self):
+        return self.func() if self.func is not None else self._cells.collect()[0]
+
+    def samples(self):
+        yield self.name, "", self.value
+
+
+class Gauge:
+    # Either set() from the code, or given a function that is called when the gauge is read
+    kind = "gauge"
+
+    def __init__(self, name, help_text, func=None):
+        self.name = name
+        self.help = help_text
+        self.func = func
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        return self.func() if self.func is not None else self._value
+
+    def samples(self):
+        yield self.name, "", self.value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._cells = _PerThreadCells(len(self.buckets) + 3)  # Bucket counts, +Inf, sum, count
+
+    def observe(self, value):
+        cell = self._cells.cell()
+        cell[bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def samples(self):
+        values = self._cells.collect()
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), values):
+            cumulative += count
+            yield self.name + "_bucket", f'{{le="{bound}"}}', cumulative
+        yield self.name + "_sum", "", values[-2]
+        yield self.name + "_count", "", values[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:  # Registering the same name again returns the first metric
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text, func=None):
+        return self._register(Counter(name, help_text, func))
+
+    def gauge(self, name, help_text, func=None):
+        return self._register(Gauge(name, help_text, func))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, buckets))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                for name, labels, value in metric.samples():
+                    lines.append(f"{name}{labels} {value}")
+            except Exception as e:  # A gauge function failing must not break the whole scrape
+                lines.append(f"# {metric.name} unavailable: {e}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class SamplingProfiler:
+    # Samples the Python stacks of all other threads every interval seconds while it is running
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = 0
+        self._stacks = _StackCounter()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()  # The stacks are read by report() while the profiler thread adds to them
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        if self.running:
+            return False
+        if interval is not None:
+            self.interval = interval
+        self._stacks = _StackCounter()
+        self.samples = 0
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if not self.running:
+            return False
+        self._stopping.set()
+        self._thread.join()
+        return True
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stopping.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                stacks.append(";".join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
+
+    def report(self, limit=200):
+        with self._lock:
+            lines = [f"# {self.samples} samples every {self.interval * 1000:g} ms, running: {self.running}"]
+            lines += [f"{stack} {count}" for stack, count in self._stacks.most_common(limit)]
+        return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        registry, profiler = self.server.registry, self.server.profiler
+        if url.path == "/metrics":
+            body = registry.render()
+        elif url.path == "/profile/start":
+            interval_ms = parse_qs(url.query).get("interval_ms")
+            try:
+                interval = float(interval_ms[0]) / 1000 if interval_ms else None
+            except ValueError:
+                self.send_error(400, "interval_ms must be a number")
+                return
+            body = "started\n" if profiler.start(interval) else "already running\n"
+        elif url.path == "/profile/stop":
+            profiler.stop()
+            body = profiler.report()
+        elif url.path == "/profile":
+            body = profiler.report()
+        elif url.path in self.server.routes:
+            body = self.server.routes[url.path]()
+        else:
+            self.send_error(404)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes are not worth a log line
+
+
+# Serves REGISTRY (and a SamplingProfiler) on host:port from a daemon thread, returns the HTTP server
+def start_metrics_server(port, host="127.0.0.1", registry=REGISTRY, profiler=None, routes=None):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    server.profiler = profiler if profiler is not None else SamplingProfiler()
+    server.routes = routes or {}
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,159 @@
+# protocol.py
+# Drone -> central server forwarding protocol. A connection may carry two kinds of frames:
+#   - legacy frames: one JSON object followed by "\n" (what older drones send)
+#   - batch frames:  HEADER followed by `length` payload bytes, optionally compressed. The first header byte, MAGIC,
+#                    can never start a JSON text, which is how the decoder tells the two kinds apart.
+#                    Version 1 payload: the batch's JSON objects joined by "\n".
+#                    Version 2 payload: if FLAG_BINARY_READINGS is set, a little-endian uint32 byte count and that many
+#                    bytes of readings.FORWARDED_READING records come first, then the JSON objects as in version 1.
+#                    Version 3 payload: as version 2, but if FLAG_SCORED_READINGS is set a second uint32 byte count and
+#                    that many bytes of readings.SCORED_READING records follow the FORWARDED_READING records.
+#                    Batches without scored records are still sent as version 2, which older servers understand.
+# The server acknowledges every batch frame with an "ACK <seq>\n" line. Sequence numbers are per drone session
+# (a random id chosen when the drone starts), so the server can drop batches the drone resends after a reconnect.
+import struct
+import zlib
+from collections import namedtuple
+
+try:
+    import lz4.frame
+except ImportError:  # lz4 is optional, zlib is always available
+    lz4 = None
+
+from framing import DEFAULT_MAX_FRAME_SIZE, FrameTooLargeError
+from readings import decode_forwarded, decode_scored
+
+MAGIC = 0xB7
+VERSION = 2
+SCORED_VERSION = 3
+SUPPORTED_VERSIONS = (1, 2, 3)
+HEADER = struct.Struct(">BBBIQI")  # magic, version, flags, session, seq, payload length
+BINARY_LENGTH = struct.Struct("<I")
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_LZ4 = 2
+COMPRESSIONS = {"none": COMPRESSION_NONE, "zlib": COMPRESSION_ZLIB, "lz4": COMPRESSION_LZ4}
+COMPRESSION_MASK = 0x0F  # The low bits of the flags byte hold the compression
+FLAG_BINARY_READINGS = 0x10
+FLAG_SCORED_READINGS = 0x20
+
+ACK_PREFIX = b"ACK "
+
+# lines: JSON objects (bytes) still to be parsed, readings: dicts decoded from binary records
+Batch = namedtuple("Batch", ["session", "seq", "lines", "readings"])
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def available_compressions():
+    return [name for name, code in COMPRESSIONS.items() if code != COMPRESSION_LZ4 or lz4 is not None]
+
+
+def encode_batch(session, seq, lines, compression=COMPRESSION_NONE, binary_readings=b"", scored_readings=b""):
+    # lines are already encoded JSON objects (bytes) without their trailing newline, binary_readings and
+    # scored_readings the concatenated FORWARDED_READING and SCORED_READING records of the batch's other messages
+    payload = b"\n".join(lines)
+    flags = compression
+    version = VERSION
+    if scored_readings:
+        payload = BINARY_LENGTH.pack(len(scored_readings)) + scored_readings + payload
+        flags |= FLAG_SCORED_READINGS
+        version = SCORED_VERSION
+    if binary_readings:
+        payload = BINARY_LENGTH.pack(len(binary_readings)) + binary_readings + payload
+        flags |= FLAG_BINARY_READINGS
+    if compression == COMPRESSION_ZLIB:
+        payload = zlib.compress(payload, 1)  # Fastest level, batches of similar readings compress well anyway
+    elif compression == COMPRESSION_LZ4:
+        payload = lz4.frame.compress(payload)
+    return HEADER.pack(MAGIC, version, flags, session, seq, len(payload)) + payload
+
+
+def encode_ack(seq):
+    return ACK_PREFIX + str(seq).encode() + b"\n"
+
+
+def parse_ack(line):
+    # Returns the acknowledged sequence number, or None if line is not an ACK. Raises ProtocolError for a garbled ACK.
+    if line.startswith(ACK_PREFIX):
+        try:
+            return int(line[len(ACK_PREFIX):])
+        except ValueError:
+            raise ProtocolError(f"invalid acknowledgement {bytes(line[:32])!r}") from None
+    return None
+
+
+def _decompress(compression, payload):
+    if compression == COMPRESSION_NONE:
+        return payload
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(payload)
+    if compression == COMPRESSION_LZ4 and lz4 is not None:
+        return lz4.frame.decompress(payload)
+    raise ProtocolError(f"unsupported compression {compression}")
+
+
+class ForwardDecoder:
+    # Incremental decoder for a stream of legacy and batch frames, buffering like framing.FrameDecoder.
+    # feed() returns a list in which a legacy frame is its JSON bytes and a batch frame is a Batch.
+    def __init__(self, max_frame_size=DEFAULT_MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+        self._start = 0
+        self._scan = 0  # No newline before this offset in the current legacy frame
+
+    def feed(self, data):
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        pos = self._start
+        end = len(buffer)
+        while pos < end:
+            if buffer[pos] == MAGIC:
+                if end - pos < HEADER.size:
+                    break
+                _, version, flags, session, seq, length = HEADER.unpack_from(buffer, pos)
+                if version not in SUPPORTED_VERSIONS:
+                    raise ProtocolError(f"unsupported protocol version {version}")
+                if length > self.max_frame_size:
+                    raise FrameTooLargeError(f"batch of {length} bytes exceeds {self.max_frame_size} bytes")
+                frame_end = pos + HEADER.size + length
+                if frame_end > end:
+                    break
+                payload = _decompress(flags & COMPRESSION_MASK, bytes(buffer[pos + HEADER.size:frame_end]))
+                readings = []
+                if flags & FLAG_BINARY_READINGS:
+                    (binary_length,) = BINARY_LENGTH.unpack_from(payload)
+                    binary_end = BINARY_LENGTH.size + binary_length
+                    readings = decode_forwarded(memoryview(payload)[BINARY_LENGTH.size:binary_end])
+                    payload = payload[binary_end:]
+                if flags & FLAG_SCORED_READINGS:
+                    (binary_length,) = BINARY_LENGTH.unpack_from(payload)
+                    binary_end = BINARY_LENGTH.size + binary_length
+                    readings += decode_scored(memoryview(payload)[BINARY_LENGTH.size:binary_end])
+                    payload = payload[binary_end:]
+                frames.append(Batch(session, seq, [line for line in payload.split(b"\n") if line], readings))
+                pos = frame_end
+            else:
+                newline = buffer.find(b"\n", max(pos, self._scan))
+                if newline == -1:
+                    self._scan = end
+                    if end - pos > self.max_frame_size:
+                        raise FrameTooLargeError(f"frame exceeds {self.max_frame_size} bytes without a delimiter")
+                    break
+                if newline > pos:
+                    frames.append(bytes(buffer[pos:newline]))
+                pos = newline + 1
+
+        if pos == end:
+            buffer.clear()
+            pos = self._scan = 0
+        elif pos * 2 > end:
+            del buffer[:pos]
+            self._scan = max(0, self._scan - pos)
+            pos = 0
+        self._start = pos
+        return frames
@@ -0,0 +1,179 @@
+# readings.py
+# Compact binary encoding of sensor readings, an optional alternative to one JSON text per reading.
+#   READING           - sensor -> drone: sensor number (the digits of "sensor<N>"), float32 temperature,
+#                       float32 humidity, timestamp in epoch milliseconds (20 bytes, little endian)
+#   FORWARDED_READING - drone -> central server: READING followed by the drone's anomaly flag (21 bytes)
+#   SCORED_READING    - FORWARDED_READING followed by the drone's statistical anomaly score (float32) and the
+#                       STAT_* reasons (26 bytes), for readings carrying "score" and optionally "stat_reason"
+# The binary format is negotiated per connection: a sensor that wants it first sends the JSON line HELLO and switches
+# to binary records only after the drone answered HELLO_REPLY. Sensors that skip the handshake keep sending JSON.
+import calendar
+import json
+import struct
+import time
+from functools import lru_cache
+
+READING = struct.Struct("<Iffq")
+FORWARDED_READING = struct.Struct("<IffqB")
+SCORED_READING = struct.Struct("<IffqBfB")
+
+# Statistical anomaly reasons (droneFolder/detection.py). In JSON, "stat_reason" holds their names joined by ","
+STAT_SPIKE = 1
+STAT_RATE = 2
+STAT_STUCK = 4
+STAT_REASON_NAMES = {STAT_SPIKE: "spike", STAT_RATE: "rate", STAT_STUCK: "stuck"}
+_STAT_REASON_FLAGS = {name: flag for flag, name in STAT_REASON_NAMES.items()}
+
+WIRE_FORMATS = ("json", "binary")
+HELLO_KEY = "wire_format"
+HELLO = (json.dumps({HELLO_KEY: "binary", "version": 1}) + "\n").encode()
+HELLO_REPLY = b"FORMAT binary 1\n"
+
+SENSOR_PREFIX = "sensor"
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+READING_KEYS = {"sensor_id", "temperature", "humidity", "timestamp"}
+FORWARDED_KEYS = READING_KEYS | {"anomaly"}
+SCORED_KEYS = FORWARDED_KEYS | {"score"}
+FLAGGED_KEYS = SCORED_KEYS | {"stat_reason"}
+MAX_SENSOR_NUMBER = 2 ** 32 - 1
+
+
+def sensor_number(sensor_id):
+    # Returns N for "sensor<N>", or None if the ID cannot be encoded as a number
+    if not isinstance(sensor_id, str) or not sensor_id.startswith(SENSOR_PREFIX):
+        return None
+    digits = sensor_id[len(SENSOR_PREFIX):]
+    if not digits.isascii() or not digits.isdigit() or (len(digits) > 1 and digits[0] == "0"):
+        return None  # Leading zeros would not survive the round trip
+    number = int(digits)
+    return number if number <= MAX_SENSOR_NUMBER else None
+
+
+@lru_cache(maxsize=64)
+def stat_reason_text(reasons):
+    return ",".join(name for flag, name in STAT_REASON_NAMES.items() if reasons & flag)
+
+
+def stat_reason_flags(text):
+    # Returns the STAT_* bitmask of a "stat_reason" text, or None if it names an unknown reason
+    flags = 0
+    for name in text.split(","):
+        flag = _STAT_REASON_FLAGS.get(name)
+        if flag is None:
+            return None
+        flags |= flag
+    return flags
+
+
+@lru_cache(maxsize=4096)
+def timestamp_to_ms(timestamp):
+    # Returns the epoch milliseconds of a TIMESTAMP_FORMAT string, or None if it is not one
+    try:
+        return calendar.timegm(time.strptime(timestamp, TIMESTAMP_FORMAT)) * 1000
+    except (TypeError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _format_seconds(seconds):
+    return time.strftime(TIMESTAMP_FORMAT, time.gmtime(seconds))
+
+
+def ms_to_timestamp(ms):
+    return _format_seconds(ms // 1000)
+
+
+def encode_reading(reading):
+    # Returns the binary record of a reading dict, or None if it cannot be represented (then send it as JSON)
+    number = sensor_number(reading.get("sensor_id"))
+    ms = timestamp_to_ms(reading.get("timestamp"))
+    if number is None or ms is None or reading.keys() != READING_KEYS:
+        return None
+    try:
+        return READING.pack(number, reading["temperature"], reading["humidity"], ms)
+    except (struct.error, OverflowError):
+        return None
+
+
+def decode_readings(data):
+    # Decodes a bytes-like object made of whole READING records into reading dicts
+    return [
+        {"sensor_id": f"{SENSOR_PREFIX}{number}", "temperature": round(temperature, 2),
+         "humidity": round(humidity, 2), "timestamp": ms_to_timestamp(ms)}
+        for number, temperature, humidity, ms in READING.iter_unpack(data)
+    ]
+
+
+def encode_forwarded(message):
+    # Same as encode_reading for a reading the drone forwards with its anomaly flag
+    if message.keys() != FORWARDED_KEYS or not isinstance(message["anomaly"], bool):
+        return None
+    number = sensor_number(message["sensor_id"])
+    ms = timestamp_to_ms(message["timestamp"])
+    if number is None or ms is None:
+        return None
+    try:
+        return FORWARDED_READING.pack(number, message["temperature"], message["humidity"], ms, message["anomaly"])
+    except (struct.error, OverflowError):
+        return None
+
+
+def decode_forwarded(data):
+    return [
+        {"sensor_id": f"{SENSOR_PREFIX}{number}", "temperature": round(temperature, 2),
+         "humidity": round(humidity, 2), "timestamp": ms_to_timestamp(ms), "anomaly": bool(anomaly)}
+        for number, temperature, humidity, ms, anomaly in FORWARDED_READING.iter_unpack(data)
+    ]
+
+
+def encode_scored(message):
+    # Same as encode_forwarded for a reading the drone also scored (see SCORED_READING)
+    keys = message.keys()
+    if keys == SCORED_KEYS:
+        reasons = 0
+    elif keys == FLAGGED_KEYS and isinstance(message["stat_reason"], str):
+        reasons = stat_reason_flags(message["stat_reason"])
+        if not reasons:
+            return None
+    else:
+        return None
+    if not isinstance(message["anomaly"], bool):
+        return None
+    number = sensor_number(message["sensor_id"])
+    ms = timestamp_to_ms(message["timestamp"])
+    if number is None or ms is None:
+        return None
+    try:
+        return SCORED_READING.pack(number, message["temperature"], message["humidity"], ms, message["anomaly"],
+                                   message["score"], reasons)
+    except (struct.error, OverflowError, TypeError):
+        return None
+
+
+def decode_scored(data):
+    readings = []
+    for number, temperature, humidity, ms, anomaly, score, reasons in SCORED_READING.iter_unpack(data):
+        reading = {"sensor_id": f"{SENSOR_PREFIX}{number}", "temperature": round(temperature, 2),
+                   "humidity": round(humidity, 2), "timestamp": ms_to_timestamp(ms), "anomaly": bool(anomaly),
+                   "score": round(score, 2)}
+        if reasons:
+            reading["stat_reason"] = stat_reason_text(reasons)
+        readings.append(reading)
+    return readings
+
+
+class ReadingDecoder:
+    # Incremental decoder for a stream of READING records, keeping a partial record until the rest arrives
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        buffer = self._buffer
+        buffer += data
+        whole = len(buffer) - len(buffer) % READING.size
+        if not whole:
+            return []
+        with memoryview(buffer) as view:
+            readings = decode_readings(view[:whole])
+        del buffer[:whole]
+        return readings
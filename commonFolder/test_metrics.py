@@ -0,0 +1,28 @@
+import os
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from metrics import Counter, Histogram
+
+
+def run_threads(func, count):
+    for _ in range(count):
+        thread = threading.Thread(target=func)
+        thread.start()
+        thread.join()
+
+
+def test_cells_of_finished_threads_are_folded_without_a_scrape():
+    counter = Counter("test_total", "test")
+    run_threads(counter.inc, 500)
+    assert len(counter._cells._cells) <= 1
+    assert counter.value == 500
+
+
+def test_histogram_keeps_finished_threads_observations():
+    histogram = Histogram("test_seconds", "test")
+    run_threads(lambda: histogram.observe(0.001), 300)
+    assert len(histogram._cells._cells) <= 1
+    assert dict((name + labels, value) for name, labels, value in histogram.samples())["test_seconds_count"] == 300
@@ -0,0 +1,172 @@
+import threading
+import time
+
+# Admission control for the sensor connections of the drone (used by both ingest engines, see ingest.py):
+#   max_connections - connections above this limit are closed right after accept
+#   rate, burst     - per-sensor token bucket: a sensor may send `rate` readings per second on average and up to
+#                     `burst` at once; readings above that are dropped (None: no limit)
+#   duplicates      - what to do when a connection sends readings for a sensor_id that another open connection
+#                     already sends: "takeover" closes the older connection (a sensor that reconnects is not locked
+#                     out by its half-open previous connection), "reject" closes the newer one, "allow" lets both
+#                     through (sharing the sensor's bucket, whose count is then only approximate)
+# Every connection gets a SensorGate that filters its messages. A gate is only used by its own connection, and the
+# shared state (which connection owns which sensor, the sensors' buckets) is only touched the first time a
+# connection claims a sensor_id, so the per-message path takes no lock. A connection claims at most
+# MAX_SENSORS_PER_CONNECTION sensor IDs, the readings of any further ID are dropped like rate limited ones.
+# Buckets outlive connections: reconnecting does not refill a sensor's tokens. A bucket is forgotten once no
+# connection owns its sensor and it refilled, since a new bucket would then be the same.
+# Shed load is counted in rejected_connections, duplicate_connections and shed_rate_limited().
+
+DUPLICATE_POLICIES = ("takeover", "reject", "allow")
+DEFAULT_MAX_CONNECTIONS = 10000
+MAX_SENSORS_PER_CONNECTION = 16
+SWEEP_INTERVAL = 10.0  # Seconds between two passes over the buckets to forget the refilled ones
+_UNCLAIMED = object()
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "last")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+
+    def allow(self, now):
+        if now > self.last:  # now may predate the bucket: gates take the time once per batch
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def refilled(self, now):
+        return self.tokens + (now - self.last) * self.rate >= self.burst
+
+
+class AdmissionControl:
+    def __init__(self, max_connections=DEFAULT_MAX_CONNECTIONS, rate=None, burst=None, duplicates="takeover"):
+        if duplicates not in DUPLICATE_POLICIES:
+            raise ValueError(f"duplicates must be one of {DUPLICATE_POLICIES}")
+        self.max_connections = max_connections
+        self.rate = rate
+        self.burst = burst if burst is not None else (max(1.0, rate) if rate else None)
+        self.duplicates = duplicates
+        self.active_connections = 0
+        self.rejected_connections = 0
+        self.rate_limited = 0  # Of the closed gates, shed_rate_limited() adds the open gates' counts
+        self.duplicate_connections = 0
+        self._lock = threading.Lock()
+        self._owners = {}   # sensor_id -> gate currently sending for it
+        self._buckets = {}  # sensor_id -> TokenBucket
+        self._gates = set()
+        self._next_sweep = time.monotonic() + SWEEP_INTERVAL
+
+    # Returns a SensorGate for a new connection, or None if it has to be closed because of the connection limit.
+    # disconnect() is called, from any thread, when another connection takes over one of the connection's sensors.
+    def connect(self, disconnect=None):
+        with self._lock:
+            if self.active_connections >= self.max_connections:
+                self.rejected_connections += 1
+                return None
+            self.active_connections += 1
+            gate = SensorGate(self, disconnect)
+            self._gates.add(gate)
+            return gate
+
+    def _claim(self, gate, sensor_id):
+        # Returns the sensor's bucket (or True without rate limits), or None if another connection owns sensor_id.
+        # Messages without a sensor_id are limited per connection; validation drops them later anyway.
+        if sensor_id is None:
+            return TokenBucket(self.rate, self.burst) if self.rate is not None else True
+        with self._lock:
+            owner = self._owners.get(sensor_id)
+            if owner is not None and owner is not gate:
+                if self.duplicates == "reject":
+                    self.duplicate_connections += 1
+                    return None
+                if self.duplicates == "takeover":
+                    self.duplicate_connections += 1
+                    owner.rejected = True
+                    if owner.disconnect is not None:
+                        owner.disconnect()
+            self._owners[sensor_id] = gate
+            if self.rate is None:
+                return True
+            now = time.monotonic()
+            if now >= self._next_sweep:
+                self._next_sweep = now + SWEEP_INTERVAL
+                for expired in [sensor for sensor, bucket in self._buckets.items()
+                                if sensor not in self._owners and bucket.refilled(now)]:
+                    del self._buckets[expired]
+            bucket = self._buckets.get(sensor_id)
+            if bucket is None:
+                bucket = self._buckets[sensor_id] = TokenBucket(self.rate, self.burst)
+            return bucket
+
+    def _release(self, gate):
+        with self._lock:
+            self.active_connections -= 1
+            self._gates.discard(gate)
+            self.rate_limited += gate.rate_limited
+            for sensor_id in gate.sensor_ids:
+                if sensor_id is not None and self._owners.get(sensor_id) is gate:
+                    del self._owners[sensor_id]
+
+    def shed_rate_limited(self):
+        with self._lock:
+            return self.rate_limited + sum(gate.rate_limited for gate in self._gates)
+
+    def stats(self):
+        return {
+            "active_connections": self.active_connections,
+            "rejected_connections": self.rejected_connections,
+            "duplicate_connections": self.duplicate_connections,
+            "rate_limited": self.shed_rate_limited(),
+            "sensors": len(self._owners),
+            "buckets": len(self._buckets),
+        }
+
+
+class SensorGate:
+    def __init__(self, admission, disconnect=None):
+        self.admission = admission
+        self.disconnect = disconnect
+        self.sensor_ids = {}  # sensor_id -> bucket (None without rate limits) of the sensors claimed by the connection
+        self.rate_limited = 0
+        self.rejected = False  # Set once the connection lost a sensor to another connection or was refused one
+        self._sensor_id = _UNCLAIMED
+        self._bucket = None
+
+    # Returns the messages that may be processed. After it set rejected, the connection should be closed.
+    def filter(self, messages):
+        now = time.monotonic()
+        admitted = []
+        for message in messages:
+            sensor_id = message.get("sensor_id") if isinstance(message, dict) else None
+            if not isinstance(sensor_id, str):
+                sensor_id = None
+            if sensor_id != self._sensor_id:  # First reading, or the connection switched sensors
+                if sensor_id in self.sensor_ids:
+                    bucket = self.sensor_ids[sensor_id]
+                elif len(self.sensor_ids) >= MAX_SENSORS_PER_CONNECTION:
+                    self.rate_limited += 1
+                    continue
+                else:  # The only path taking the lock
+                    bucket = self.admission._claim(self, sensor_id)
+                    if bucket is None:
+                        self.rejected = True
+                        break
+                    bucket = self.sensor_ids[sensor_id] = bucket if bucket is not True else None
+                self._sensor_id = sensor_id
+                self._bucket = bucket
+            if self._bucket is not None and not self._bucket.allow(now):
+                self.rate_limited += 1
+                continue
+            admitted.append(message)
+        return admitted
+
+    def close(self):
+        self.admission._release(self)
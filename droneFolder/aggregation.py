@@ -0,0 +1,207 @@
+import threading
+import time
+from collections import deque
+
+# Incremental aggregation of sensor readings. Every window keeps running statistics (Welford mean/variance, min, max)
+# that are updated in O(1) per reading, so an emitted aggregate never rescans the samples of its window.
+#   kind  - "count": windows of `size` readings, "time": windows of `size` seconds (arrival time)
+#   slide - how far the window moves between two aggregates; slide == size gives tumbling windows,
+#           slide < size gives sliding (overlapping) windows
+#   scope - "global": one window over all sensors, "sensor": one window per sensor, "both": both of them
+
+WINDOW_KINDS = ("count", "time")
+SCOPES = ("global", "sensor", "both")
+
+
+class _FieldStats:
+    __slots__ = ("sliding", "count", "mean", "m2", "min", "max", "_min_q", "_max_q")
+
+    def __init__(self, sliding):
+        self.sliding = sliding
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        # Sliding windows drop their oldest values, so min/max come from monotonic deques of (seq, value) pairs
+        self._min_q = deque() if self.sliding else None
+        self._max_q = deque() if self.sliding else None
+
+    def add(self, seq, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if self.sliding:
+            while self._min_q and self._min_q[-1][1] >= x:
+                self._min_q.pop()
+            self._min_q.append((seq, x))
+            while self._max_q and self._max_q[-1][1] <= x:
+                self._max_q.pop()
+            self._max_q.append((seq, x))
+            self.min = self._min_q[0][1]
+            self.max = self._max_q[0][1]
+        else:
+            self.min = x if self.min is None or x < self.min else self.min
+            self.max = x if self.max is None or x > self.max else self.max
+
+    # Removes the oldest value of a sliding window, seq being the sequence number it was added with
+    def remove(self, seq, x):
+        if self.count <= 1:
+            self.reset()
+            return
+        delta = x - self.mean
+        self.mean -= delta / (self.count - 1)
+        self.m2 = max(0.0, self.m2 - delta * (x - self.mean))
+        self.count -= 1
+        if self._min_q[0][0] == seq:
+            self._min_q.popleft()
+        if self._max_q[0][0] == seq:
+            self._max_q.popleft()
+        self.min = self._min_q[0][1]
+        self.max = self._max_q[0][1]
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+class Window:
+    def __init__(self, kind, size, slide):
+        self.kind = kind
+        self.size = size
+        self.slide = slide
+        sliding = slide < size
+        self.samples = deque() if sliding else None  # (seq, arrival time, temperature, humidity), sliding windows only
+        self.temperature = _FieldStats(sliding)
+        self.humidity = _FieldStats(sliding)
+        self.seq = 0
+        self.since_emit = 0    # Readings added since the last aggregate (count windows)
+        self.next_emit = None  # Arrival time at which the next aggregate is due (time windows)
+
+    def add(self, now, temperature, humidity):
+        result = None
+        if self.kind == "time":
+            result = self.poll(now)  # Close the previous window first if its time is up
+            if self.next_emit is None:
+                self.next_emit = now + self.slide
+        self.seq += 1
+        self.temperature.add(self.seq, temperature)
+        self.humidity.add(self.seq, humidity)
+        if self.samples is not None:
+            self.samples.append((self.seq, now, temperature, humidity))
+            if self.kind == "count" and len(self.samples) > self.size:
+                self._evict_oldest()
+        if self.kind == "count":
+            self.since_emit += 1
+            if self.temperature.count >= self.size and self.since_emit >= self.slide:
+                result = self._emit()
+                self.since_emit = 0
+                if self.samples is None:  # Tumbling window: start over
+                    self._reset()
+        return result
+
+    # Emits the aggregate of a time window whose end has passed, if any. Also called without new readings.
+    def poll(self, now):
+        if self.kind != "time" or self.next_emit is None or now < self.next_emit:
+            return None
+        if self.samples is not None:
+            while self.samples and self.samples[0][1] <= now - self.size:
+                self._evict_oldest()
+        result = self._emit() if self.temperature.count else None
+        if self.samples is None:
+            self._reset()
+        while self.next_emit <= now:
+            self.next_emit += self.slide
+        return result
+
+    def _evict_oldest(self):
+        seq, _, temperature, humidity = self.samples.popleft()
+        self.temperature.remove(seq, temperature)
+        self.humidity.remove(seq, humidity)
+
+    def _reset(self):
+        self.temperature.reset()
+        self.humidity.reset()
+
+    def _emit(self):
+        t = self.temperature
+        h = self.humidity
+        return {
+            "meanTemperature": t.mean,
+            "meanHumidity": h.mean,
+            "minTemperature": t.min,
+            "maxTemperature": t.max,
+            "varTemperature": t.variance(),
+            "minHumidity": h.min,
+            "maxHumidity": h.max,
+            "varHumidity": h.variance(),
+            "count": t.count,
+        }
+
+
+class AggregationEngine:
+    def __init__(self, kind="count", size=5, slide=None, scope="global", clock=time.monotonic):
+        self.clock = clock
+        self._lock = threading.Lock()  # Readings may arrive from several ingest threads
+        self.configure(kind, size, slide, scope)
+
+    # Changes the window configuration at runtime. Windows in progress are discarded.
+    def configure(self, kind, size, slide=None, scope="global"):
+        if kind not in WINDOW_KINDS:
+            raise ValueError(f"unknown window kind: {kind}")
+        if scope not in SCOPES:
+            raise ValueError(f"unknown aggregation scope: {scope}")
+        slide = size if slide is None else slide
+        if kind == "count":
+            size, slide = int(size), int(slide)
+        if size <= 0 or slide <= 0 or slide > size:
+            raise ValueError("window size and slide must be positive and slide must not exceed size")
+        with self._lock:
+            self.kind = kind
+            self.size = size
+            self.slide = slide
+            self.scope = scope
+            self._global = Window(kind, size, slide) if scope in ("global", "both") else None
+            self._per_sensor = {} if scope in ("sensor", "both") else None
+
+    # Adds one valid reading and returns the list of aggregates it completed.
+    # Per-sensor aggregates carry the sensor_id, global ones do not.
+    def add(self, sensor_id, temperature, humidity):
+        now = self.clock()
+        results = []
+        with self._lock:
+            if self._global is not None:
+                result = self._global.add(now, temperature, humidity)
+                if result is not None:
+                    results.append(result)
+            if self._per_sensor is not None:
+                window = self._per_sensor.get(sensor_id)
+                if window is None:
+                    window = self._per_sensor[sensor_id] = Window(self.kind, self.size, self.slide)
+                result = window.add(now, temperature, humidity)
+                if result is not None:
+                    result["sensor_id"] = sensor_id
+                    results.append(result)
+        return results
+
+    # Returns the aggregates of time windows that ended without a new reading arriving
+    def poll(self):
+        if self.kind != "time":
+            return []
+        now = self.clock()
+        results = []
+        with self._lock:
+            if self._global is not None:
+                result = self._global.poll(now)
+                if result is not None:
+                    results.append(result)
+            if self._per_sensor is not None:
+                for sensor_id, window in self._per_sensor.items():
+                    result = window.poll(now)
+                    if result is not None:
+                        result["sensor_id"] = sensor_id
+                        results.append(result)
+        return results
@@ -0,0 +1,77 @@
+import threading
+
+# Battery and status of the drone as a state machine driven by a Scheduler (see scheduler.py):
+#   active          - the battery drains by 1% every tick until it reaches the threshold
+#   returningToBase - the drone flies back for return_time seconds
+#   charging        - the battery charges by 1% every tick until it is full, then the drone is active again
+# Ticks and the return flight are in simulated time, so they follow the scheduler's speed.
+# Transitions happen under a lock; readers (e.g. the ingest threads checking status per message) just read the
+# attributes, which always hold a consistent value. on_transition(old, new) is called after every transition,
+# outside of the lock, from the scheduler thread.
+
+ACTIVE = "active"
+RETURNING = "returningToBase"
+CHARGING = "charging"
+TRANSITIONS = {ACTIVE: (RETURNING,), RETURNING: (CHARGING,), CHARGING: (ACTIVE,)}
+DEFAULT_THRESHOLD = 20
+
+
+class BatteryStateMachine:
+    def __init__(self, scheduler, threshold=DEFAULT_THRESHOLD, tick=1.0, return_time=10.0, on_transition=None):
+        self.scheduler = scheduler
+        self.threshold = threshold
+        self.tick = tick
+        self.return_time = return_time
+        self.on_transition = on_transition
+        self.battery = 100
+        self.status = ACTIVE
+        self.transitions = 0
+        self._lock = threading.Lock()
+        self._job = None
+
+    def start(self):
+        self._job = self.scheduler.every(self.tick, self._on_tick)
+
+    def stop(self):
+        if self._job is not None:
+            self._job.cancel()
+
+    def set_threshold(self, value):
+        with self._lock:
+            self.threshold = value
+
+    def _on_tick(self):
+        with self._lock:
+            if self.status == ACTIVE:
+                if self.battery > self.threshold:
+                    self.battery -= 1
+                    return
+                new = RETURNING
+                self.scheduler.call_later(self.return_time, self._arrived)
+            elif self.status == CHARGING:
+                if self.battery < 100:
+                    self.battery += 1
+                    return
+                new = ACTIVE
+            else:
+                return  # Still flying back, the battery neither drains nor charges
+            old = self._transition(new)
+        self._notify(old, new)
+
+    def _arrived(self):
+        with self._lock:
+            old = self._transition(CHARGING)
+        self._notify(old, CHARGING)
+
+    def _transition(self, new):
+        # Called with the lock held, returns the previous status
+        old = self.status
+        if new not in TRANSITIONS[old]:
+            raise ValueError(f"invalid transition {old} -> {new}")
+        self.status = new
+        self.transitions += 1
+        return old
+
+    def _notify(self, old, new):
+        if self.on_transition is not None:
+            self.on_transition(old, new)
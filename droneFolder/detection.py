@@ -0,0 +1,142 @@
+import threading
+import time
+from array import array
+from math import sqrt
+
+from readings import STAT_RATE, STAT_SPIKE, STAT_STUCK
+
+# Streaming per-sensor anomaly detection for readings that passed the fixed range checks of validation.py.
+# For every sensor it keeps exponentially weighted (EWMA) means and variances of temperature, humidity and of their
+# rate of change, and how many times in a row the sensor reported exactly the same values. score() returns
+#   score   - the largest |z| of the reading's temperature and humidity against the sensor's EWMA statistics
+#   reasons - bitmask of STAT_* flags (readings.py): STAT_SPIKE when the score reaches z_threshold, STAT_RATE when
+#             the change per second is z_threshold deviations above its usual size, STAT_STUCK when the same values
+#             were reported stuck_count times in a row
+# Nothing but STAT_STUCK is flagged during the first `warmup` readings of a sensor.
+# The state lives in flat arrays with one slot per sensor (a few dozen bytes each) instead of an object per sensor.
+# There are at most max_sensors slots: once they are all taken, the slots of sensors that sent nothing for idle_after
+# seconds are reused (those sensors start over with a new warmup). While none is idle, new sensors are not scored.
+# A sensor's readings are expected from one thread at a time (its connection); only adding a sensor takes a lock.
+
+MIN_INTERVAL = 1.0  # Timestamps have a resolution of one second, readings within the same second count as 1 s apart
+DEFAULT_MAX_SENSORS = 100000
+DEFAULT_IDLE_AFTER = 3600.0
+SWEEP_INTERVAL = 10.0  # Seconds between two searches for idle sensors while every slot is taken
+
+
+class AnomalyDetector:
+    FIELDS = ("mean_t", "var_t", "mean_h", "var_h", "mean_rate_t", "var_rate_t", "mean_rate_h", "var_rate_h",
+              "last_t", "last_h", "last_time")
+
+    def __init__(self, alpha=0.05, z_threshold=4.0, warmup=20, stuck_count=30, max_sensors=DEFAULT_MAX_SENSORS,
+                 idle_after=DEFAULT_IDLE_AFTER):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.warmup = warmup
+        self.stuck_count = stuck_count
+        self.max_sensors = max_sensors
+        self.idle_after = idle_after
+        self.unscored = 0  # Readings of new sensors not scored because every slot was taken
+        self._slots = {}  # sensor_id -> slot
+        self._free = []   # Slots of evicted sensors
+        self._next_sweep = 0.0
+        self._lock = threading.Lock()
+        for name in self.FIELDS:
+            setattr(self, name, array("d"))
+        self.count = array("q")
+        self.stuck = array("q")
+        self.seen = array("d")  # time.monotonic() of the sensor's last reading
+
+    def __len__(self):
+        return len(self._slots)
+
+    # Returns the sensor's slot, adding it if needed, or None if every slot is taken
+    def _slot(self, sensor_id):
+        with self._lock:
+            slot = self._slots.get(sensor_id)
+            if slot is not None:
+                return slot
+            if not self._free and len(self._slots) >= self.max_sensors and time.monotonic() >= self._next_sweep:
+                self._evict_idle()
+            if self._free:
+                slot = self._free.pop()
+                for name in self.FIELDS:
+                    getattr(self, name)[slot] = 0.0
+                self.count[slot] = self.stuck[slot] = 0
+            elif len(self._slots) < self.max_sensors:
+                for name in self.FIELDS:
+                    getattr(self, name).append(0.0)
+                self.count.append(0)
+                self.stuck.append(0)
+                self.seen.append(0.0)
+                slot = len(self.count) - 1
+            else:
+                return None
+            self._slots[sensor_id] = slot
+            return slot
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        self._next_sweep = now + SWEEP_INTERVAL
+        oldest = now - self.idle_after
+        for sensor_id, slot in list(self._slots.items()):
+            if self.seen[slot] < oldest:
+                del self._slots[sensor_id]
+                self._free.append(slot)
+
+    # timestamp in seconds (any epoch, only differences are used)
+    def score(self, sensor_id, temperature, humidity, timestamp):
+        slot = self._slots.get(sensor_id)
+        if slot is None:
+            slot = self._slot(sensor_id)
+            if slot is None:
+                self.unscored += 1
+                return 0.0, 0
+        self.seen[slot] = time.monotonic()
+        count = self.count[slot]
+        self.count[slot] = count + 1
+        if count == 0:
+            self.mean_t[slot], self.mean_h[slot] = temperature, humidity
+            self.last_t[slot], self.last_h[slot], self.last_time[slot] = temperature, humidity, timestamp
+            return 0.0, 0
+
+        reasons = 0
+        alpha = self.alpha
+        threshold = self.z_threshold
+        warm = count >= self.warmup
+
+        if temperature == self.last_t[slot] and humidity == self.last_h[slot]:
+            self.stuck[slot] += 1
+            if self.stuck[slot] + 1 >= self.stuck_count:
+                reasons |= STAT_STUCK
+        else:
+            self.stuck[slot] = 0
+
+        # Level: z-score against the EWMA before this reading updates it
+        z_t = _update(self.mean_t, self.var_t, slot, temperature, alpha)
+        z_h = _update(self.mean_h, self.var_h, slot, humidity, alpha)
+        score = max(abs(z_t), abs(z_h))
+        if warm and score >= threshold:
+            reasons |= STAT_SPIKE
+
+        # Rate of change: size of the change per second against its own EWMA
+        interval = max(timestamp - self.last_time[slot], MIN_INTERVAL)
+        rate_z_t = _update(self.mean_rate_t, self.var_rate_t, slot, abs(temperature - self.last_t[slot]) / interval, alpha)
+        rate_z_h = _update(self.mean_rate_h, self.var_rate_h, slot, abs(humidity - self.last_h[slot]) / interval, alpha)
+        if warm and max(rate_z_t, rate_z_h) >= threshold:
+            reasons |= STAT_RATE
+
+        self.last_t[slot], self.last_h[slot], self.last_time[slot] = temperature, humidity, timestamp
+        return (round(score, 2) if warm else 0.0), reasons
+
+
+# Updates the EWMA mean / variance of one slot with value, returns value's z-score before the update
+def _update(means, variances, slot, value, alpha):
+    mean = means[slot]
+    variance = variances[slot]
+    diff = value - mean
+    z = diff / sqrt(variance) if variance > 0 else 0.0
+    increment = alpha * diff
+    means[slot] = mean + increment
+    variances[slot] = (1 - alpha) * (variance + diff * increment)
+    return z
@@ -1,247 +1,409 @@
-import socket
+import atexit
 import threading
-import tkinter as tk
-from tkinter import scrolledtext
-from tkinter import ttk
-import json
-from datetime import datetime
-import re
-from collections import deque
-import statistics
+import multiprocessing
+import queue
+import signal
 import time
+import argparse
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "commonFolder"))
+
+from gui import run_gui_process, start_gui
+from aggregation import WINDOW_KINDS, SCOPES, AggregationEngine
+from forwarder import FORMATS as FORWARD_FORMATS, ForwardPipeline
+from protocol import available_compressions
+from outbox import POLICIES as OUTBOX_POLICIES, Outbox
+from ingest import ENGINES, create_ingest_server
+from ingest_workers import IngestWorkers
+from admission import DEFAULT_MAX_CONNECTIONS, DUPLICATE_POLICIES, AdmissionControl
+from validation import REASON_TEMPERATURE, REASON_HUMIDITY, validate_batch
+from metrics import REGISTRY, SamplingProfiler, start_metrics_server
+from capture import CaptureWriter
+from detection import AnomalyDetector
+from readings import stat_reason_text
+from scheduler import Scheduler
+from battery import ACTIVE, RETURNING, CHARGING, DEFAULT_THRESHOLD, BatteryStateMachine
 
 HOST = "0.0.0.0"
 PORT = 5647
 FORWARD_HOST = "0.0.0.0"
 FORWARD_PORT = 6000
 
-N = 5
 T = 1
-agg_queue = deque()
-forward_queue = deque()
-remainingBattery = 100
-status = "active"
-battery_threshold = 20
-
-# Global persistent socket
-forward_socket = None
-
-# Below are code for the GUI Setup
-root = tk.Tk()
-root.title("Drone")
-
-top_frame = tk.Frame(root)
-top_frame.pack(side="top", fill="x")
-
-slider_label = tk.Label(top_frame, text="Battery Threshold:")
-slider_label.pack(side="left", padx=(10, 2), pady=5)
-
-
-slider_container = tk.Frame(top_frame)
-slider_container.pack(side="left", padx=(0, 10))
-
-threshold_var = tk.IntVar(value=battery_threshold)
-threshold_slider = ttk.Scale(slider_container, from_=10, to=50, orient="horizontal", length=200,
-                             command=lambda val: threshold_var.set(round(float(val))))
-threshold_slider.pack()
-
-
-slider_label_frame = tk.Frame(slider_container)
-slider_label_frame.pack(fill="x")
-
-for i, val in enumerate(range(10, 51, 10)):
-    label = tk.Label(slider_label_frame, text=str(val), anchor="center")
-    label.grid(row=0, column=i, sticky="nsew")
-    slider_label_frame.grid_columnconfigure(i, weight=1)
-
-battery_label_var = tk.StringVar()
-status_label_var = tk.StringVar()
-battery_label = tk.Label(top_frame, textvariable=battery_label_var)
-status_label = tk.Label(top_frame, textvariable=status_label_var)
-battery_label.pack(side="right", padx=10)
-status_label.pack(side="right", padx=10)
-
-frame1 = tk.LabelFrame(root, text="Real-Time Data View")
-frame1.pack(fill="both", expand=True, padx=10, pady=5)
-
-frame2 = tk.LabelFrame(root, text="Logging Panel")
-frame2.pack(fill="both", expand=True, padx=10, pady=5)
-
-frame3 = tk.LabelFrame(root, text="Aggregated Results and Anomalies")
-frame3.pack(fill="both", expand=True, padx=10, pady=5)
-
-real_time_text = scrolledtext.ScrolledText(frame1, height=15)
-real_time_text.pack(fill="both", expand=True)
-
-log_text = scrolledtext.ScrolledText(frame2, height=10)
-log_text.pack(fill="both", expand=True)
-
-agg_text = scrolledtext.ScrolledText(frame3, height=8)
-agg_text.pack(fill="both", expand=True)
+agg_engine = AggregationEngine("count", 5)  # Reconfigured from the command line arguments at startup
+forward_queue = None  # Outbox for the data collected while the drone is not active, created at startup
+
+# Battery and status of the drone (see battery.py), driven by the scheduler and created at startup.
+# The outbox is replayed by a job on its own scheduler, so a large backlog never delays the battery clock.
+drone_state = None
+scheduler = None
+replay_scheduler = None
+REPLAY_TICK = 0.1  # Seconds between two replay steps
+replay_started = None  # perf_counter() when the replay of the current backlog started
+replay_count = 0
+
+# Forwarding pipeline to the central server, created at startup
+forwarder = None
+
+# Per-sensor statistical anomaly detection on the readings that passed validation (see detection.py), None if disabled
+detector = None
+EPOCH = datetime(1970, 1, 1)
+
+# Lines for the GUI panels are posted to ui_queue and drained by the GUI thread (see gui.py).
+# ui_queue is bounded so a slow GUI never slows down ingest, lines that do not fit are counted in ui_dropped.
+# In headless mode ui_queue stays None: panel lines are not produced and log panel lines are printed instead.
+ui_queue = None
+ui_dropped = 0
+# With --ingest_processes the GUI runs in its own process (gui_process): ui_queue is then a multiprocessing queue,
+# the labels read gui_state, which publish_gui_state() updates, and threshold changes come back on threshold_queue
+gui_process = None
+gui_state = None
+threshold_queue = None
+GUI_STATE_INTERVAL = 0.25  # Seconds between two updates of gui_state
+
+# Sensor ingest server, created by server_thread
+ingest_server = None
+ingest_workers = None  # Ingest worker processes with --ingest_processes (see ingest_workers.py), forked at startup
+capture = None  # Records the traffic of the sensor connections with --capture (see commonFolder/capture.py)
+
+# Metrics, served in the Prometheus text format with --metrics_port (see commonFolder/metrics.py)
+STATUS_CODES = {ACTIVE: 0, RETURNING: 1, CHARGING: 2}
+PROCESS_SECONDS = REGISTRY.histogram("drone_process_seconds", "Time to process one validated message")
+VALIDATE_SECONDS = REGISTRY.histogram("drone_validate_seconds", "Time to validate one batch of messages")
+PROCESSED = REGISTRY.counter("drone_processed_messages_total", "Messages processed")
+ANOMALIES = REGISTRY.counter("drone_anomalies_total", "Messages with an anomaly")
+STAT_ANOMALIES = REGISTRY.counter("drone_stat_anomalies_total", "Valid messages flagged as unusual by the statistical detector")
+MESSAGE_ERRORS = REGISTRY.counter("drone_message_errors_total", "Messages dropped because processing them raised")
+INVALID_TIMESTAMPS = REGISTRY.counter("drone_invalid_timestamp_total", "Messages dropped because of an invalid timestamp")
+AGGREGATES = REGISTRY.counter("drone_aggregates_total", "Aggregates emitted")
+FORWARDED = REGISTRY.counter("drone_forwarded_total", "Messages handed to the forwarding pipeline")
+FORWARD_FALLBACKS = REGISTRY.counter("drone_forward_fallback_total", "Messages stored in the outbox because the forwarding pipeline was full")
+STORED = REGISTRY.counter("drone_stored_total", "Messages stored in the outbox while the drone was not active")
+REPLAY_SECONDS = REGISTRY.histogram("drone_replay_seconds", "Time to replay a backlog from the outbox", (0.01, 0.1, 1.0, 10.0, 60.0, 600.0))
+REGISTRY.gauge("drone_battery_percent", "Remaining battery", lambda: drone_state.battery)
+REGISTRY.gauge("drone_battery_threshold_percent", "Battery level at which the drone returns to base", lambda: drone_state.threshold)
+REGISTRY.gauge("drone_status", "0 active, 1 returning to base, 2 charging", lambda: STATUS_CODES.get(drone_state.status, -1))
+REGISTRY.counter("drone_status_transitions_total", "Status changes of the drone", lambda: drone_state.transitions)
+REGISTRY.counter("drone_scheduler_errors_total", "Scheduled jobs that raised an exception", lambda: scheduler.errors + replay_scheduler.errors)
+REGISTRY.gauge("drone_sensor_connections", "Open sensor connections", lambda: ingest_server.active_connections if ingest_server else 0)
+REGISTRY.counter("drone_rate_limited_total", "Readings dropped because their sensor exceeded its rate limit", lambda: ingest_server.admission.shed_rate_limited() if ingest_server else 0)
+REGISTRY.gauge("drone_detector_sensors", "Sensors tracked by the statistical detector", lambda: len(detector) if detector is not None else 0)
+REGISTRY.counter("drone_detector_unscored_total", "Readings not scored because the detector tracks too many sensors", lambda: detector.unscored if detector is not None else 0)
+REGISTRY.gauge("drone_outbox_depth", "Messages waiting in the outbox", lambda: forward_queue.depth)
+REGISTRY.counter("drone_outbox_dropped_total", "Messages lost to the outbox limits", lambda: forward_queue.dropped)
+REGISTRY.gauge("drone_forward_queued", "Messages waiting in the forwarding pipeline", lambda: forwarder.pending())
+REGISTRY.gauge("drone_forward_connected", "1 while connected to the central server", lambda: int(forwarder.connected))
+REGISTRY.counter("drone_forward_sent_total", "Messages sent to the central server", lambda: forwarder.sent_messages)
+REGISTRY.counter("drone_forward_resent_batches_total", "Batches sent again after a reconnect", lambda: forwarder.resent_batches)
+REGISTRY.counter("drone_forward_reconnects_total", "Connections to the central server lost", lambda: forwarder.reconnects)
+REGISTRY.counter("drone_gui_dropped_total", "Panel lines dropped because the GUI was behind", lambda: ui_dropped)
+
+def post_to_gui(panel, msg):
+    global ui_dropped
+    try:
+        ui_queue.put_nowait((panel, msg))
+    except queue.Full:
+        ui_dropped += 1
 
 def log_to_real_time(msg):
-    real_time_text.insert(tk.END, msg + "\n")
-    real_time_text.see(tk.END)
+    if ui_queue is not None:
+        post_to_gui("real_time", msg)
 
 def log_to_log_panel(msg):
-    log_text.insert(tk.END, msg + "\n")
-    log_text.see(tk.END)
+    if ui_queue is not None:
+        post_to_gui("log", msg)
+    else:
+        print(msg)
 
 def log_to_agg_panel(msg):
-    agg_text.insert(tk.END, msg + "\n")
-    agg_text.see(tk.END)
-
-def update_labels():
-    battery_label_var.set(f"Battery Level: {remainingBattery}%")
-    display_status = {
-        "active": "Active",
-        "returningToBase": "Returning to Base",
-        "charging": "Charging"
-    }
-    status_label_var.set(f"Status: {display_status.get(status, status)}")
-    root.after(500, update_labels)
-
-# Helper functions for processData
-def is_valid_time(s):
-    try:
-        datetime.strptime(s, "%Y-%m-%dT%H:%M:%SZ")
-        return True
-    except ValueError:
-        return False
-
-def is_valid_humidity(n): return 0 <= n <= 100
-def is_valid_temperature(n): return -100 <= n <= 100
-def is_valid_sensor_id(s): return bool(re.fullmatch(r"sensor\d+", s))
-
-# This function returns true if there are no anomalies in the sensor data, and false otherwise.
-def processData(message):
-    return (
-        isinstance(message.get("sensor_id"), str) and is_valid_sensor_id(message["sensor_id"]) and
-        isinstance(message.get("temperature"), (int, float)) and is_valid_temperature(message["temperature"]) and
-        isinstance(message.get("humidity"), (int, float)) and is_valid_humidity(message["humidity"]) and
-        isinstance(message.get("timestamp"), str) and is_valid_time(message["timestamp"])
-    )
-
-# This function creates a socket for communication between the drone and the central server
-def setup_forward_socket():
-    global forward_socket
+    if ui_queue is not None:
+        post_to_gui("agg", msg)
+
+def get_gui_state():
+    return drone_state.battery, drone_state.status, ui_dropped, forward_queue.depth
+
+def set_battery_threshold(value):
+    drone_state.set_threshold(value)
+
+# Scheduler job of a multi-process drone: shares the state shown by the GUI process and applies its threshold changes
+def publish_gui_state():
+    battery, status, dropped, depth = get_gui_state()
+    gui_state[:] = [battery, STATUS_CODES.get(status, -1), dropped, depth]
     while True:
         try:
-            forward_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            forward_socket.connect((FORWARD_HOST, FORWARD_PORT))
-            log_to_log_panel("Connected to forwarding server at 0.0.0.0:6000.")
+            set_battery_threshold(threshold_queue.get_nowait())
+        except queue.Empty:
             break
-        except Exception as e:
-            log_to_log_panel(f"Retrying connection to forwarding server... ({e})")
-            time.sleep(2)
 
-# This function sends the input data to the central server
+# This function is called by drone_state after every status change
+def on_status_change(old, new):
+    if new == RETURNING:
+        log_to_log_panel("Battery has fallen below the threshold, returning to base..")
+    elif new == ACTIVE:
+        log_to_log_panel("Battery full. Returning to active mode.")
+
+# This function hands the input data to the forwarding pipeline, which sends it to the central server in batches.
+# If the pipeline is backed up, the data is stored in forward_queue and replayed later instead of being lost.
 def forward_data_to_host(data_dict):
-    global forward_socket
-    try:
-        forward_socket.sendall((json.dumps(data_dict) + "\n").encode())
-    except Exception as e:
-        log_to_log_panel(f"Failed to send data: {e}")
-
-# This function completes processing the data received from the sensor nodes
-def process_one_message(message, sensor_id):
-    global status
-    anomalyOccurred = not processData(message)
+    if forwarder.send(data_dict):
+        FORWARDED.inc()
+    else:
+        FORWARD_FALLBACKS.inc()
+        forward_queue.put(data_dict)
+
+# This function sends a batch of data replayed from forward_queue, returns True once all of it is queued for sending
+def forward_batch_to_host(batch):
+    return forwarder.send_many(batch, timeout=5)
+
+# This function replays the data that was collected while the drone was not active (also left over from before a restart).
+# It runs every REPLAY_TICK seconds on replay_scheduler and replays at most --outbox_replay_rate messages per second.
+def replay_forward_queue():
+    global replay_started, replay_count
+    if drone_state.status != ACTIVE or not forward_queue.depth:
+        return
+    limit = max(1, int(args.outbox_replay_rate * REPLAY_TICK)) if args.outbox_replay_rate > 0 else None
+    if replay_started is None:
+        replay_started = time.perf_counter()
+    replay_count += forward_queue.replay(forward_batch_to_host, args.outbox_replay_batch, limit)
+    stats = forward_queue.stats()
+    if stats["depth"] == 0:  # Backlog drained, log it once instead of after every step
+        elapsed = time.perf_counter() - replay_started
+        REPLAY_SECONDS.observe(elapsed)
+        log_to_log_panel(f"Replayed {replay_count} stored messages in {elapsed:.1f} s, {stats['dropped']} dropped.")
+        replay_started, replay_count = None, 0
+
+# This function describes an aggregate produced by agg_engine for the aggregate panel
+def describe_aggregate(agg):
+    if agg_engine.kind == "count":
+        text = f"At the last {agg['count']} readings"
+    else:
+        text = f"In the last {agg_engine.size} seconds ({agg['count']} readings)"
+    if "sensor_id" in agg:
+        text += f" of sensor {agg['sensor_id']}"
+    return (f"{text}: Average humidity is {agg['meanHumidity']:.1f}%, Average temperature is {agg['meanTemperature']:.1f}°C "
+            f"(temperature {agg['minTemperature']:.1f}..{agg['maxTemperature']:.1f}, humidity {agg['minHumidity']:.1f}..{agg['maxHumidity']:.1f}).")
+
+# This function logs and forwards the aggregates completed by agg_engine
+def emit_aggregates(aggregates):
+    for agg in aggregates:
+        AGGREGATES.inc()
+        if ui_queue is not None:
+            log_to_agg_panel(describe_aggregate(agg))    # Log the mean values to the aggregate panel
+        if drone_state.status == ACTIVE:  # If the status is active, forward the data to the central server
+            forward_data_to_host(agg)
+        else:  # Otherwise, enqueue it to forward_queue. Once the status is set back to active, the data in the queue will be immediately sent to the central server.
+            STORED.inc()
+            forward_queue.put(agg)
+
+# This function validates a drained batch of (message, sensor_id) pairs at once and processes each message
+def process_messages(batch):
+    start = time.perf_counter()
+    anomalies, reasons, timestamps = validate_batch([message for message, _ in batch])
+    VALIDATE_SECONDS.observe(time.perf_counter() - start)
+    for (message, sensor_id), anomalyOccurred, reason, ts in zip(batch, anomalies, reasons, timestamps):
+        start = time.perf_counter()
+        # Once the first message is processed nothing may raise: the ingest engines would process the batch again
+        try:
+            score = stat_reasons = None
+            if detector is not None and not anomalyOccurred:  # Only readings within the fixed ranges are scored
+                score, stat_reasons = detector.score(message["sensor_id"], message["temperature"], message["humidity"],
+                                                     (ts - EPOCH).total_seconds())
+            process_one_message(message, sensor_id, anomalyOccurred, reason, ts, score, stat_reasons)
+        except Exception:
+            MESSAGE_ERRORS.inc()
+        PROCESS_SECONDS.observe(time.perf_counter() - start)
+
+# This function completes processing the data received from the sensor nodes.
+# anomalyOccurred, reason and ts are the validation results for the message, ts being its already parsed timestamp.
+# score and stat_reasons are the results of the statistical detector (STAT_* flags of readings.py), None if it did not run.
+def process_one_message(message, sensor_id, anomalyOccurred, reason, ts, score=None, stat_reasons=None):
     message["anomaly"] = anomalyOccurred # Add an additional field to the data received from a sensor node, indicating whether there is an anomaly in the data
+    if score is not None:
+        message["score"] = score  # Largest z-score of the reading against the sensor's recent readings
+        if stat_reasons:
+            message["stat_reason"] = stat_reason_text(stat_reasons)  # e.g. "spike" or "rate,stuck"
+            STAT_ANOMALIES.inc()
+    trace = message.get("trace")
+    if isinstance(trace, dict):  # Latency probe sent by benchmarkFolder/e2e_bench.py, stamp the time the drone handled it
+        trace["drone"] = time.time()
+    PROCESSED.inc()
+    if anomalyOccurred:
+        ANOMALIES.inc()
+    if ts is None:  # Messages without a valid timestamp cannot be displayed and are not forwarded
+        INVALID_TIMESTAMPS.inc()
+        return
     try:
-        ts = datetime.strptime(message["timestamp"], "%Y-%m-%dT%H:%M:%SZ") # Convert the string formatted timestamp to a datetime object
-        formatted = f"{message['sensor_id']} reporting: {message['temperature']}°C, {message['humidity']}%, {ts.time()}, {ts.date()}" # Format the data in a readable way
+        show = ui_queue is not None  # Skip building panel lines nobody will see in headless mode
+        if show:
+            formatted = f"{message['sensor_id']} reporting: {message['temperature']}°C, {message['humidity']}%, {ts.time()}, {ts.date()}" # Format the data in a readable way
         if anomalyOccurred: # If an anomaly is present in the data, log it to the real time and log panels, then specify the type of anomaly in the aggregate panel
-            log_to_real_time(formatted + ", Anomaly detected")
-            log_to_log_panel("Anomaly occurred")
+            if show:
+                log_to_real_time(formatted + ", Anomaly detected")
+                log_to_log_panel("Anomaly occurred")
             time_str = ts.time()
-            if not is_valid_temperature(message["temperature"]):
+            if reason & REASON_TEMPERATURE:
                 log_to_agg_panel(f"Anomaly occurred. The sensor with ID {sensor_id} reported an out of range temperature value at {time_str}.")
-            if not is_valid_humidity(message["humidity"]):
+            if reason & REASON_HUMIDITY:
                 log_to_agg_panel(f"Anomaly occurred. The sensor with ID {sensor_id} reported an out of range humidity value at {time_str}.")
         else: # If no anomaly is present;
-            log_to_real_time(formatted) # Log it to the real time panel
-            agg_queue.append(message)  # Add the data to the queue for mean temperature and humidity calculations
-            if len(agg_queue) >= N:   # If the queue reached N elements;
-                samples = [agg_queue.popleft() for _ in range(N)]  # Pop N elements
-                mean_temp = statistics.mean([d["temperature"] for d in samples])  # Calculate mean temperature
-                mean_hum = statistics.mean([d["humidity"] for d in samples])  # Calculate mean humidity
-                agg_message = f"At the last {N} readings: Average humidity is {mean_hum:.1f}%, Average temperature is {mean_temp:.1f}°C."
-                log_to_agg_panel(agg_message)    # Log the mean values to the aggregate panel
-                if status == "active":  # If the status is active, forward the data to the central server
-                    forward_data_to_host({"meanTemperature": mean_temp, "meanHumidity": mean_hum}) 
-                else:  # Otherwise, enqueue it to forward_queue. Once the status is set back to active, the data in the queue will be immediately sent to the central server.
-                    forward_queue.append({"meanTemperature": mean_temp, "meanHumidity": mean_hum})
-                    
-        if status == "active":  # If the status is active, forward the data to the central server
+            if show and stat_reasons: # In range, but unusual for this sensor: also note it in the aggregate panel
+                log_to_real_time(formatted + f", Unusual reading ({message['stat_reason']})")
+                log_to_agg_panel(f"Unusual reading. The sensor with ID {sensor_id} reported {message['temperature']}°C, {message['humidity']}% "
+                                 f"at {ts.time()} ({message['stat_reason']}, score {score}).")
+            elif show:
+                log_to_real_time(formatted) # Log it to the real time panel
+            # Add the data to the aggregation windows, which return the mean temperature and humidity of every completed window
+            emit_aggregates(agg_engine.add(message["sensor_id"], message["temperature"], message["humidity"]))
+
+        if drone_state.status == ACTIVE:  # If the status is active, forward the data to the central server
             forward_data_to_host(message)
         else:  # Otherwise, enqueue it to forward_queue. Once the status is set back to active, the data in the queue will be immediately sent to the central server.
-            forward_queue.append(message)
+            STORED.inc()
+            forward_queue.put(message)
 
     except Exception:
         pass
 
-# This function handles the connection between a sensor node and the drone
-def client_connection(conn, addr):
-    sensor_id = None
-    with conn:
-        try:  # The "Sensor with ID {sensor_id} connected." message is logged once the sensor node sends its first data. So we handle the first data and the rest separately
-            first_data = conn.recv(1024)   # Wait for the sensor node to send data
-            if not first_data:
-                return
-            message = json.loads(first_data.decode())  # Parse the data
-            sensor_id = message.get("sensor_id", "unknown")
-            log_to_log_panel(f"Sensor with ID {sensor_id} connected.")
-            process_one_message(message, sensor_id)
-        except Exception:
-            return
-
-        while True:  # Once the first data part is handled, keep on listening for data from the sensor node in an infinite loop
-            try:
-                data = conn.recv(1024)
-                if not data:
-                    break
-                message = json.loads(data.decode())
-                process_one_message(message, sensor_id)
-            except Exception:
-                break
-
-    if sensor_id:
-        log_to_log_panel(f"Sensor with ID {sensor_id} disconnected.")
-
-def batterySimulation():
-    global remainingBattery, status, battery_threshold
-    while True:
-        battery_threshold = threshold_var.get()  ## Fetch the threshold value set by the user
-        if status == "active":    ## While the status active, decrease the battery level by 1%
-            if remainingBattery > battery_threshold:
-                remainingBattery -= 1
-            else:    ## Once the threshold is reached
-                status = "returningToBase"    ## Set the status to Returning To Base
-                log_to_log_panel("Battery has fallen below the threshold, returning to base..")
-                time.sleep(10)  ## Simulate the time it takes for the drone to return to the base
-                status = "charging"  ## Once this time is over, set the status to Charging
-        elif status == "charging":  ## While the status is charging;
-            if remainingBattery < 100:  ## Increase the battery by 1% until it reaches 100%
-                remainingBattery += 1
-            else:  ## Once battery is restored;
-                status = "active"   # Set the status to Active
-                log_to_log_panel("Battery full. Returning to active mode.")  # Log the necessary message
-                while forward_queue:  # Forward the data that was collected while the drone was not active
-                    forward_data_to_host(forward_queue.popleft())
-        time.sleep(T)
+# A SensorSession is created by the ingest engine for every sensor connection and remembers which sensor it belongs to
+class SensorSession:
+    def __init__(self, addr):
+        self.addr = addr
+        self.sensor_id = None
+
+    def register(self, message):
+        if self.sensor_id is None:  # The "Sensor with ID {sensor_id} connected." message is logged once the sensor node sends its first data
+            self.sensor_id = message.get("sensor_id", "unknown")
+            log_to_log_panel(f"Sensor with ID {self.sensor_id} connected.")
+        return self.sensor_id
+
+    def close(self):
+        if self.sensor_id:
+            log_to_log_panel(f"Sensor with ID {self.sensor_id} disconnected.")
+
+# Batch handler for the ingest engines: batch is a list of (session, message) pairs, message None meaning the session closed.
+# All-or-nothing as the engines expect: only validate_batch() may raise, before anything was processed.
+def process_session_batch(batch):
+    readings = []
+    closed = []
+    for session, message in batch:
+        if message is None:
+            closed.append(session)
+        else:
+            readings.append((message, session.register(message)))
+    if readings:
+        process_messages(readings)
+    for session in closed:
+        session.close()
 
 def server_thread():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind((HOST, PORT))
-        s.listen()  # Listen for connections
-        print(f"Server is running on {HOST}:{PORT}")
-        while True:  # Accept client connections (sensor nodes) and start a client_connection thread for each sensor node
-            conn, addr = s.accept()
-            threading.Thread(target=client_connection, args=(conn, addr), daemon=True).start()
-
-setup_forward_socket()
-threading.Thread(target=server_thread, daemon=True).start()
-threading.Thread(target=batterySimulation, daemon=True).start()
-update_labels()
-root.mainloop()
+    global ingest_server
+    if ingest_workers is not None:
+        ingest_server = ingest_workers
+        print(f"Server is running on {HOST}:{PORT} ({len(ingest_workers.processes)} ingest processes)")
+        ingest_workers.serve_forever()
+        return
+    admission = AdmissionControl(args.max_connections, args.sensor_rate, args.sensor_burst, args.duplicate_sensors)
+    ingest_server = create_ingest_server(args.engine, HOST, PORT, SensorSession, process_session_batch,
+                                         capture=capture, admission=admission)
+    print(f"Server is running on {HOST}:{PORT} ({args.engine} engine)")
+    ingest_server.serve_forever()
+
+parser = argparse.ArgumentParser(description="Drone")
+parser.add_argument("--engine", choices=ENGINES, default="threaded", help="Sensor ingest engine: one thread per sensor or a single asyncio event loop")
+parser.add_argument("--max_connections", type=int, default=DEFAULT_MAX_CONNECTIONS, help="Maximum number of concurrent sensor connections (per ingest process with --ingest_processes)")
+parser.add_argument("--sensor_rate", type=float, default=None, help="(Optional) Readings per second a sensor may send on average, the rest are dropped (with --ingest_processes, a sensor reconnecting to another ingest process gets a new budget)")
+parser.add_argument("--sensor_burst", type=float, default=None, help="(Optional) Readings a sensor may send at once above --sensor_rate (default: one second's worth)")
+parser.add_argument("--duplicate_sensors", choices=DUPLICATE_POLICIES, default="takeover", help="When a connection sends the sensor_id of another open connection: close the older one, close the newer one, or allow both (with --ingest_processes, only connections of the same ingest process are compared)")
+parser.add_argument("--ingest_processes", type=int, default=0, help="(Optional) Read and decode the sensor connections in this many worker processes (asyncio engine each), handing the readings over in shared memory. The admission limits then apply per process")
+parser.add_argument("--headless", action="store_true", help="Run without the GUI, log panel messages are printed to stdout")
+parser.add_argument("--gui_queue_size", type=int, default=10000, help="Maximum number of lines waiting for the GUI before new ones are dropped")
+parser.add_argument("--gui_max_lines", type=int, default=1000, help="Number of lines kept in each GUI panel")
+parser.add_argument("--agg_window", choices=WINDOW_KINDS, default="count", help="Aggregate over a number of readings or a number of seconds")
+parser.add_argument("--agg_size", type=float, default=5, help="Window size in readings or seconds")
+parser.add_argument("--agg_slide", type=float, default=None, help="Readings or seconds between two aggregates (default: agg_size, i.e. tumbling windows)")
+parser.add_argument("--agg_scope", choices=SCOPES, default="global", help="Aggregate over all sensors, per sensor, or both")
+parser.add_argument("--outbox_dir", type=str, default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "outbox"), help="Directory where data is stored while the drone is not active")
+parser.add_argument("--outbox_max_mb", type=float, default=64, help="Maximum size of the stored data in MB")
+parser.add_argument("--outbox_max_age", type=float, default=None, help="(Optional) Seconds after which stored data is dropped instead of forwarded")
+parser.add_argument("--outbox_policy", choices=OUTBOX_POLICIES, default="drop_oldest", help="What to do when the outbox is full")
+parser.add_argument("--outbox_replay_batch", type=int, default=500, help="Number of stored messages read per replay batch")
+parser.add_argument("--outbox_replay_rate", type=float, default=5000, help="Maximum number of stored messages replayed per second (0 for no limit)")
+parser.add_argument("--sim_speed", type=float, default=1.0, help="Simulated seconds per real second for the battery, e.g. 100 to test charge cycles quickly")
+parser.add_argument("--return_time", type=float, default=10, help="Simulated seconds the drone needs to return to base")
+parser.add_argument("--forward_format", choices=FORWARD_FORMATS, default="batch", help="Batch frames with acknowledgements, or legacy JSON lines for older central servers")
+parser.add_argument("--forward_batch", type=int, default=200, help="Maximum number of messages per forwarded batch")
+parser.add_argument("--forward_delay_ms", type=float, default=50, help="Maximum time a message waits for its batch to fill up")
+parser.add_argument("--forward_compression", choices=available_compressions(), default="zlib", help="Compression of batch frames")
+parser.add_argument("--forward_binary", action="store_true", help="Forward sensor readings as binary records inside batch frames")
+parser.add_argument("--no_detection", action="store_true", help="Disable the per-sensor statistical anomaly detection")
+parser.add_argument("--detect_alpha", type=float, default=0.05, help="Weight of a new reading in the per-sensor moving averages")
+parser.add_argument("--detect_threshold", type=float, default=4.0, help="Score (z-score) at which a valid reading is flagged as unusual")
+parser.add_argument("--detect_warmup", type=int, default=20, help="Readings of a sensor before its readings can be flagged as spikes")
+parser.add_argument("--detect_stuck", type=int, default=30, help="Identical readings in a row after which a sensor is flagged as stuck")
+parser.add_argument("--capture", type=str, default=None, help="(Optional) Record the raw traffic of the sensor connections to this new file (replay it with benchmarkFolder/replay_capture.py)")
+parser.add_argument("--metrics_port", type=int, default=None, help="(Optional) Serve metrics and the profiler toggle on this local HTTP port")
+parser.add_argument("--profile", action="store_true", help="Start the sampling profiler right away (see /profile on the metrics port)")
+args = parser.parse_args()
+if args.ingest_processes > 0:
+    if not hasattr(os, "fork"):
+        parser.error("--ingest_processes needs a platform with fork()")
+    if args.capture is not None:
+        parser.error("--capture is not supported with --ingest_processes")
+    # The worker and GUI processes are forked before this process starts any thread
+    ingest_workers = IngestWorkers(args.ingest_processes, HOST, PORT, SensorSession, process_session_batch,
+                                   (args.max_connections, args.sensor_rate, args.sensor_burst, args.duplicate_sensors))
+    ingest_workers.start()
+    if not args.headless:
+        context = multiprocessing.get_context("fork")
+        ui_queue = context.Queue(maxsize=args.gui_queue_size)
+        gui_state = context.Array("q", 4, lock=False)
+        threshold_queue = context.Queue()
+        gui_process = context.Process(target=run_gui_process, name="drone-gui", daemon=True,
+                                      args=(ui_queue, gui_state, {code: status for status, code in STATUS_CODES.items()},
+                                            threshold_queue, DEFAULT_THRESHOLD, args.gui_max_lines))
+        gui_process.start()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # Exit normally, so the shared memory is released
+
+forward_queue = Outbox(args.outbox_dir, int(args.outbox_max_mb * 1024 * 1024), args.outbox_max_age, args.outbox_policy)
+agg_engine.configure(args.agg_window, args.agg_size, args.agg_slide, args.agg_scope)
+if not args.no_detection:
+    detector = AnomalyDetector(args.detect_alpha, args.detect_threshold, args.detect_warmup, args.detect_stuck)
+if not args.headless and ui_queue is None:
+    ui_queue = queue.Queue(maxsize=args.gui_queue_size)
+if args.capture is not None:
+    capture = CaptureWriter(args.capture)
+    atexit.register(capture.close)  # Writes out the records still buffered
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # Exit normally, so the atexit handlers run
+    REGISTRY.counter("drone_capture_bytes_total", "Bytes recorded to the capture file", lambda: capture.bytes)
+
+forwarder = ForwardPipeline(FORWARD_HOST, FORWARD_PORT, args.forward_format, args.forward_batch,
+                            args.forward_delay_ms / 1000, args.forward_compression,
+                            binary_readings=args.forward_binary, log=log_to_log_panel)
+forwarder.start()
+if args.metrics_port is not None:
+    profiler = SamplingProfiler()
+    if args.profile:
+        profiler.start()
+    start_metrics_server(args.metrics_port, profiler=profiler)
+    print(f"Metrics are served on http://127.0.0.1:{args.metrics_port}/metrics")
+scheduler = Scheduler(args.sim_speed, name="drone-scheduler")
+drone_state = BatteryStateMachine(scheduler, tick=T, return_time=args.return_time, on_transition=on_status_change)
+drone_state.start()
+scheduler.every(T, lambda: emit_aggregates(agg_engine.poll()), simulated=False)  # Close time windows that ended without new readings
+if gui_process is not None:
+    scheduler.every(GUI_STATE_INTERVAL, publish_gui_state, simulated=False)
+scheduler.start()
+replay_scheduler = Scheduler(name="drone-replay")
+replay_scheduler.every(REPLAY_TICK, replay_forward_queue)
+replay_scheduler.start()
+if args.headless:
+    server_thread()
+elif gui_process is not None:
+    threading.Thread(target=server_thread, daemon=True).start()
+    gui_process.join()  # Closing the window stops the drone, as with the GUI in this process
+else:
+    threading.Thread(target=server_thread, daemon=True).start()
+    start_gui(ui_queue, get_gui_state, set_battery_threshold, drone_state.threshold, max_lines=args.gui_max_lines)
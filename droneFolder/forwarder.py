@@ -0,0 +1,187 @@
+import json
+import queue
+import random
+import select
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from framing import FrameDecoder
+from protocol import COMPRESSIONS, encode_batch, parse_ack
+from readings import encode_forwarded, encode_scored
+
+# Forwarding pipeline from the drone to the central server. send() only enqueues a message; a dedicated sender thread
+# encodes the queued messages, groups them into one write per batch (up to batch_size messages or max_delay seconds
+# after the first one) and keeps the connection alive, reconnecting with exponential backoff.
+#   fmt="batch": versioned batch frames (see commonFolder/protocol.py), optionally compressed. Batches stay in
+#                memory until the server acknowledges them and are sent again after a reconnect.
+#                With binary_readings, plain (and scored) sensor readings travel as fixed-size binary records instead of JSON.
+#   fmt="lines": the legacy newline-terminated JSON frames, still written in batches, without acknowledgements.
+
+FORMATS = ("batch", "lines")
+BACKOFF_INITIAL = 0.5
+BACKOFF_MAX = 30.0
+ACK_TIMEOUT = 10.0  # Reconnect if the server acknowledges nothing for this long while the window is full
+
+
+class ForwardPipeline:
+    def __init__(self, host, port, fmt="batch", batch_size=200, max_delay=0.05, compression="zlib",
+                 queue_size=10000, max_unacked=64, binary_readings=False, log=print):
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown forwarding format: {fmt}")
+        self.host = host
+        self.port = port
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.compression = COMPRESSIONS[compression]
+        self.max_unacked = max_unacked
+        self.binary_readings = binary_readings and fmt == "batch"
+        self.log = log
+        self.session = random.getrandbits(32)  # Lets the server recognise batches resent after a reconnect
+        self.connected = False
+        self.sent_messages = 0
+        self.sent_batches = 0
+        self.resent_batches = 0
+        self.reconnects = 0
+        self.dropped = 0  # Messages refused by send() because the queue was full
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._unacked = OrderedDict()  # seq -> (encoded frame, message count), oldest first
+        self._unsent = None  # (frame, message count) of a "lines" batch whose write failed, written first after a reconnect
+        self._seq = 0
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    # Enqueues one message without blocking. Returns False if the queue is full.
+    def send(self, message):
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    # Enqueues several messages, waiting up to timeout seconds for each one. Returns False if the queue stayed full.
+    def send_many(self, messages, timeout=None):
+        try:
+            for message in messages:
+                self._queue.put(message, timeout=timeout)
+            return True
+        except queue.Full:
+            return False
+
+    def pending(self):
+        unsent = self._unsent[1] if self._unsent else 0
+        return self._queue.qsize() + unsent + sum(count for _, count in self._unacked.values())
+
+    # --- Sender thread ---
+    def _run(self):
+        backoff = BACKOFF_INITIAL
+        while True:
+            try:
+                sock = socket.create_connection((self.host, self.port))
+            except OSError as e:
+                self.log(f"Retrying connection to forwarding server in {backoff:.1f}s... ({e})")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, BACKOFF_MAX)
+                continue
+            backoff = BACKOFF_INITIAL
+            self.connected = True
+            self.log(f"Connected to forwarding server at {self.host}:{self.port}.")
+            try:
+                with sock:
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Batching already fills the packets
+                    self._pump(sock)
+            except (OSError, ValueError) as e:  # ValueError: garbled acknowledgement or frame, start over
+                self.log(f"Lost connection to forwarding server: {e}")
+            self.connected = False
+            self.reconnects += 1
+
+    def _pump(self, sock):
+        acks = FrameDecoder()
+        for frame, _ in self._unacked.values():  # Replay what the previous connection did not get acknowledged
+            sock.sendall(frame)
+            self.resent_batches += 1
+        if self._unsent:
+            sock.sendall(self._unsent[0])
+            self._unsent = None
+            self.resent_batches += 1
+        while True:
+            # Acknowledgements and the window are handled before taking messages off the queue: a connection lost
+            # here must not lose messages that are neither queued nor in _unacked
+            self._read_acks(sock, acks, 0)
+            waited = 0.0
+            while len(self._unacked) >= self.max_unacked:  # Window full: wait for the server to catch up
+                if waited >= ACK_TIMEOUT:
+                    raise TimeoutError("no acknowledgement from the forwarding server")
+                self._read_acks(sock, acks, 0.5)
+                waited += 0.5
+            messages = self._collect()
+            if not messages:
+                continue
+            binary = []
+            scored = []
+            lines = []
+            for message in messages:
+                if self.binary_readings:
+                    record = encode_forwarded(message)
+                    if record is not None:
+                        binary.append(record)
+                        continue
+                    record = encode_scored(message)
+                    if record is not None:
+                        scored.append(record)
+                        continue
+                lines.append(json.dumps(message).encode())
+            if self.fmt == "batch":
+                self._seq += 1
+                frame = encode_batch(self.session, self._seq, lines, self.compression, b"".join(binary), b"".join(scored))
+                self._unacked[self._seq] = (frame, len(messages))
+            else:
+                frame = b"\n".join(lines) + b"\n"
+                self._unsent = (frame, len(messages))  # Kept until the write succeeded
+            sock.sendall(frame)
+            self._unsent = None
+            self.sent_batches += 1
+            self.sent_messages += len(messages)
+
+    # Waits for the first message, then gathers more until batch_size messages or max_delay seconds
+    def _collect(self):
+        try:
+            messages = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_delay
+        while len(messages) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                messages.append(self._queue.get_nowait() if remaining <= 0 else self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return messages
+
+    def _read_acks(self, sock, decoder, timeout):
+        readable, _, _ = select.select([sock], [], [], timeout)
+        if not readable:
+            return
+        frames = decoder.recv_frames(sock)
+        if frames is None:
+            raise ConnectionResetError("forwarding server closed the connection")
+        for frame in frames:
+            seq = parse_ack(frame)
+            while seq is not None and self._unacked and next(iter(self._unacked)) <= seq:  # Acknowledgements are cumulative
+                self._unacked.popitem(last=False)
+
+    def stats(self):
+        return {
+            "connected": self.connected,
+            "queued": self._queue.qsize(),
+            "unacked_batches": len(self._unacked),
+            "sent_messages": self.sent_messages,
+            "sent_batches": self.sent_batches,
+            "resent_batches": self.resent_batches,
+            "reconnects": self.reconnects,
+            "dropped": self.dropped,
+        }
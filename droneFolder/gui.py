@@ -0,0 +1,125 @@
+import tkinter as tk
+from tkinter import scrolledtext
+from tkinter import ttk
+import queue
+
+DISPLAY_STATUS = {
+    "active": "Active",
+    "returningToBase": "Returning to Base",
+    "charging": "Charging"
+}
+
+# ui_queue holds (panel, line) pairs posted by the network threads, panel being "real_time", "log" or "agg".
+# Only this GUI thread touches the Tk widgets: every tick it drains up to batch_size lines from the queue,
+# inserts each panel's lines with a single insert, and trims the panels to max_lines.
+def start_gui(ui_queue, get_state, on_threshold_change, threshold, max_lines=1000, batch_size=2000, tick_ms=100):
+    root = tk.Tk()
+    root.title("Drone")
+
+    top_frame = tk.Frame(root)
+    top_frame.pack(side="top", fill="x")
+
+    slider_label = tk.Label(top_frame, text="Battery Threshold:")
+    slider_label.pack(side="left", padx=(10, 2), pady=5)
+
+    slider_container = tk.Frame(top_frame)
+    slider_container.pack(side="left", padx=(0, 10))
+
+    threshold_var = tk.IntVar(value=threshold)
+
+    def on_slider(val):
+        threshold_var.set(round(float(val)))
+        on_threshold_change(threshold_var.get())  # Hand the new value to the battery simulation, which never reads Tk variables
+
+    threshold_slider = ttk.Scale(slider_container, from_=10, to=50, orient="horizontal", length=200, command=on_slider)
+    threshold_slider.set(threshold)
+    threshold_slider.pack()
+
+    slider_label_frame = tk.Frame(slider_container)
+    slider_label_frame.pack(fill="x")
+
+    for i, val in enumerate(range(10, 51, 10)):
+        label = tk.Label(slider_label_frame, text=str(val), anchor="center")
+        label.grid(row=0, column=i, sticky="nsew")
+        slider_label_frame.grid_columnconfigure(i, weight=1)
+
+    battery_label_var = tk.StringVar()
+    status_label_var = tk.StringVar()
+    dropped_label_var = tk.StringVar()
+    outbox_label_var = tk.StringVar()
+    battery_label = tk.Label(top_frame, textvariable=battery_label_var)
+    status_label = tk.Label(top_frame, textvariable=status_label_var)
+    dropped_label = tk.Label(top_frame, textvariable=dropped_label_var)
+    outbox_label = tk.Label(top_frame, textvariable=outbox_label_var)
+    battery_label.pack(side="right", padx=10)
+    status_label.pack(side="right", padx=10)
+    outbox_label.pack(side="right", padx=10)
+    dropped_label.pack(side="right", padx=10)
+
+    frame1 = tk.LabelFrame(root, text="Real-Time Data View")
+    frame1.pack(fill="both", expand=True, padx=10, pady=5)
+
+    frame2 = tk.LabelFrame(root, text="Logging Panel")
+    frame2.pack(fill="both", expand=True, padx=10, pady=5)
+
+    frame3 = tk.LabelFrame(root, text="Aggregated Results and Anomalies")
+    frame3.pack(fill="both", expand=True, padx=10, pady=5)
+
+    real_time_text = scrolledtext.ScrolledText(frame1, height=15)
+    real_time_text.pack(fill="both", expand=True)
+
+    log_text = scrolledtext.ScrolledText(frame2, height=10)
+    log_text.pack(fill="both", expand=True)
+
+    agg_text = scrolledtext.ScrolledText(frame3, height=8)
+    agg_text.pack(fill="both", expand=True)
+
+    panels = {"real_time": real_time_text, "log": log_text, "agg": agg_text}
+
+    def update_labels():
+        remaining_battery, status, dropped, outbox_depth = get_state()
+        battery_label_var.set(f"Battery Level: {remaining_battery}%")
+        status_label_var.set(f"Status: {DISPLAY_STATUS.get(status, status)}")
+        dropped_label_var.set(f"Dropped lines: {dropped}" if dropped else "")
+        outbox_label_var.set(f"Stored messages: {outbox_depth}")
+        root.after(500, update_labels)
+
+    # --- Panel Update Function ---
+    # Drains a bounded number of queued lines per tick so a burst of messages never freezes the window
+    def update_panels():
+        pending = {name: [] for name in panels}
+        for _ in range(batch_size):
+            try:
+                panel, line = ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            pending[panel].append(line)
+
+        for name, lines in pending.items():
+            if not lines:
+                continue
+            widget = panels[name]
+            widget.insert(tk.END, "\n".join(lines[-max_lines:]) + "\n")  # Lines beyond max_lines would be trimmed right away
+            line_count = int(widget.index("end-1c").split(".")[0]) - 1
+            if line_count > max_lines:
+                widget.delete("1.0", f"{line_count - max_lines + 1}.0")
+            widget.see(tk.END)
+
+        # Come back immediately while a backlog remains, otherwise wait for the next tick
+        root.after(1 if not ui_queue.empty() else tick_ms, update_panels)
+
+    update_labels()
+    root.after(tick_ms, update_panels)
+    root.mainloop()
+
+
+# Runs the GUI as a separate process of a multi-process drone (--ingest_processes). It only consumes: lines arrive on
+# ui_queue (a multiprocessing queue) and the labels read state, a shared array of (battery, status code, dropped
+# lines, outbox depth) the drone keeps up to date, statuses mapping the codes back to names. Threshold changes are
+# sent back to the drone over threshold_queue.
+def run_gui_process(ui_queue, state, statuses, threshold_queue, threshold, max_lines=1000):
+    def get_state():
+        battery, status, dropped, outbox_depth = state[:]
+        return battery, statuses.get(status, "unknown"), dropped, outbox_depth
+
+    start_gui(ui_queue, get_state, threshold_queue.put, threshold, max_lines=max_lines)
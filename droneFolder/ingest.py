@@ -0,0 +1,330 @@
+import asyncio
+import json
+import socket
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from admission import DEFAULT_MAX_CONNECTIONS, AdmissionControl
+from framing import FrameDecoder, RECV_SIZE
+from metrics import REGISTRY
+from readings import HELLO_KEY, HELLO_REPLY, ReadingDecoder
+
+# Ingest engines that accept sensor connections and hand the decoded messages over in batches.
+# A session is created per connection by session_factory(addr). Messages reach batch_handler(batch) as a list of
+# (session, message) pairs, a message of None meaning that the session's connection was closed.
+# The default batch handler, dispatch_batch, calls session.handle(message) and session.close().
+# A batch handler is all-or-nothing: it either processes the whole batch or raises before any side effect, since
+# the engines then hand the messages over again one by one (see dispatch_or_split).
+# With a capture (commonFolder/capture.py CaptureWriter), the raw bytes of every connection are recorded as received.
+# Connections and their messages pass the admission control of admission.py (connection limit, per-sensor rate
+# limits, duplicate sensor IDs) before they reach the batch handler.
+#   - ThreadedIngestServer: one thread per sensor connection (the original drone behaviour)
+#   - AsyncIngestServer: a single asyncio event loop serving all sensor connections. Every connection queues its
+#     messages separately and batches take one message per connection in turn, so a sensor sending a lot only
+#     gets its share of the processing thread instead of delaying everyone behind its messages. Readers stop once
+#     their connection queued queue_size messages or all connections together queued max_queued.
+
+ENGINES = ("threaded", "async")
+
+DEFAULT_QUEUE_SIZE = 256   # Messages waiting per connection before its reader stops reading from the socket
+DEFAULT_MAX_QUEUED = 10000  # Messages waiting over all connections before every reader stops
+DEFAULT_BATCH_SIZE = 256   # Maximum number of messages handed to the processing thread at once
+LISTEN_BACKLOG = 1024
+
+CONNECTIONS = REGISTRY.counter("drone_sensor_connections_total", "Sensor connections accepted")
+REJECTED = REGISTRY.counter("drone_sensor_rejected_total", "Sensor connections closed because of the connection limit")
+DUPLICATES = REGISTRY.counter("drone_sensor_duplicates_total", "Sensor connections closed because another connection sends the same sensor_id")
+CONNECTION_ERRORS = REGISTRY.counter("drone_sensor_errors_total", "Sensor connections dropped because of invalid data or a socket error")
+RECEIVED_BYTES = REGISTRY.counter("drone_received_bytes_total", "Bytes received from sensors")
+RECEIVED_MESSAGES = REGISTRY.counter("drone_received_messages_total", "Messages decoded from sensor connections")
+HANDLER_ERRORS = REGISTRY.counter("drone_handler_errors_total", "Messages dropped because the batch handler raised on them")
+
+
+# Decodes what a sensor sends: newline-terminated JSON readings, or binary READING records once the sensor
+# negotiated the binary format with the HELLO line (see commonFolder/readings.py)
+class SensorStreamDecoder:
+    def __init__(self):
+        self._frames = FrameDecoder()
+        self._binary = None
+
+    # Returns (messages, reply), reply being bytes to send back to the sensor or None
+    def feed(self, data):
+        if self._binary is not None:
+            return self._binary.feed(data), None
+        messages = []
+        for frame in self._frames.feed(data):
+            message = json.loads(frame)
+            if isinstance(message, dict) and HELLO_KEY in message:
+                if message[HELLO_KEY] != "binary":
+                    continue  # Asking for JSON, which is what the sensor already sends
+                self._binary = ReadingDecoder()
+                # The sensor waits for the reply before sending records, but hand over anything already buffered
+                messages += self._binary.feed(self._frames.take_pending())
+                return messages, HELLO_REPLY
+            messages.append(message)
+        return messages, None
+
+
+def dispatch_batch(batch):
+    for session, message in batch:
+        if message is None:
+            session.close()
+        else:
+            session.handle(message)
+
+
+# Hands the batch to batch_handler. If it raises, the batch mixes many sensors: hand the messages over one by one,
+# so a bad message only loses itself
+def dispatch_or_split(batch_handler, batch):
+    try:
+        batch_handler(batch)
+        return
+    except Exception:
+        if len(batch) == 1:
+            HANDLER_ERRORS.inc()
+            return
+    for item in batch:
+        try:
+            batch_handler([item])
+        except Exception:
+            HANDLER_ERRORS.inc()
+
+
+class ThreadedIngestServer:
+    def __init__(self, host, port, session_factory, batch_handler=dispatch_batch, capture=None, admission=None):
+        self.host = host
+        self.port = port
+        self.session_factory = session_factory
+        self.batch_handler = batch_handler
+        self.capture = capture
+        self.admission = admission if admission is not None else AdmissionControl()
+        self.ready = threading.Event()  # Set once the listening socket is bound, self.port then holds the real port
+        self._sock = None
+
+    @property
+    def active_connections(self):
+        return self.admission.active_connections
+
+    def serve_forever(self):
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            s.bind((self.host, self.port))
+            s.listen(LISTEN_BACKLOG)  # Listen for connections
+            self.port = s.getsockname()[1]
+            self._sock = s
+            self.ready.set()
+            while True:  # Accept client connections (sensor nodes) and start a client_connection thread for each sensor node
+                try:
+                    conn, addr = s.accept()
+                except OSError:
+                    break  # Listening socket was shut down by stop()
+                threading.Thread(target=self.client_connection, args=(conn, addr), daemon=True).start()
+
+    def stop(self):
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    # This function handles the connection between a sensor node and the drone
+    def client_connection(self, conn, addr):
+        gate = self.admission.connect(lambda: _shutdown(conn))
+        if gate is None:
+            REJECTED.inc()
+            conn.close()
+            return
+        session = self.session_factory(addr)
+        CONNECTIONS.inc()
+        decoder = SensorStreamDecoder()
+        capture = self.capture
+        capture_id = capture.open(addr) if capture else None
+        chunk = bytearray(RECV_SIZE)
+        with conn, memoryview(chunk) as view:
+            try:  # Keep on listening for data from the sensor node until it disconnects or sends invalid data
+                while True:
+                    n = conn.recv_into(chunk)
+                    if not n:
+                        break
+                    RECEIVED_BYTES.inc(n)
+                    if capture:
+                        capture.data(capture_id, view[:n])
+                    messages, reply = decoder.feed(view[:n])
+                    if reply:
+                        conn.sendall(reply)
+                    if messages:  # Everything completed by one recv() is processed as one batch
+                        RECEIVED_MESSAGES.inc(len(messages))
+                        messages = gate.filter(messages)
+                        if messages:
+                            self.batch_handler([(session, message) for message in messages])
+                        if gate.rejected:
+                            break
+            except Exception:
+                CONNECTION_ERRORS.inc()
+        if gate.rejected:
+            DUPLICATES.inc()
+        if capture:
+            capture.close_connection(capture_id)
+        gate.close()
+        self.batch_handler([(session, None)])
+
+
+# Closes a connection whose thread is blocked in recv(), from another thread
+def _shutdown(conn):
+    try:
+        conn.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+# Messages of one connection waiting for the processing thread
+class _ConnectionQueue:
+    __slots__ = ("session", "messages", "scheduled", "space")
+
+    def __init__(self, session):
+        self.session = session
+        self.messages = deque()
+        self.scheduled = False       # Whether the queue is in the round-robin ring
+        self.space = asyncio.Event()  # Set while the queue has room for more messages
+        self.space.set()
+
+
+class AsyncIngestServer:
+    def __init__(self, host, port, session_factory, batch_handler=dispatch_batch, queue_size=DEFAULT_QUEUE_SIZE,
+                 batch_size=DEFAULT_BATCH_SIZE, capture=None, admission=None, reuse_port=False,
+                 max_queued=DEFAULT_MAX_QUEUED):
+        self.host = host
+        self.port = port
+        self.session_factory = session_factory
+        self.batch_handler = batch_handler
+        self.capture = capture
+        self.admission = admission if admission is not None else AdmissionControl()
+        self.queue_size = queue_size
+        self.max_queued = max_queued
+        self.batch_size = batch_size
+        self.reuse_port = reuse_port  # Several processes listen on the same port and the kernel spreads the connections
+        self.ready = threading.Event()  # Set once the listening socket is bound, self.port then holds the real port
+        self._loop = None
+        self._stopping = None
+        self._ring = deque()  # _ConnectionQueues with messages, in round-robin order
+        self._pending = None  # Set while the ring is not empty
+        self._queued = 0      # Messages waiting over all connections
+        self._space = None    # Set while fewer than max_queued messages are waiting
+
+    @property
+    def active_connections(self):
+        return self.admission.active_connections
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self._pending = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        # Sessions are not thread safe, so every message is processed on the same single worker thread
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port, backlog=LISTEN_BACKLOG,
+                                            reuse_port=self.reuse_port or None)
+        self.port = server.sockets[0].getsockname()[1]
+        consumer = asyncio.create_task(self._consume(executor))
+        self.ready.set()
+        async with server:
+            await self._stopping.wait()
+        consumer.cancel()
+        executor.shutdown(wait=False)
+
+    async def _handle_connection(self, reader, writer):
+        gate = self.admission.connect(writer.close)  # Called on this loop: claims happen in gate.filter() below
+        if gate is None:
+            REJECTED.inc()
+            writer.close()
+            return
+        CONNECTIONS.inc()
+        addr = writer.get_extra_info("peername")
+        session = self.session_factory(addr)
+        queue = _ConnectionQueue(session)
+        decoder = SensorStreamDecoder()
+        capture = self.capture
+        capture_id = capture.open(addr) if capture else None
+        try:
+            while True:
+                data = await reader.read(RECV_SIZE)
+                if not data:
+                    break
+                RECEIVED_BYTES.inc(len(data))
+                if capture:
+                    capture.data(capture_id, data)
+                messages, reply = decoder.feed(data)
+                if reply:
+                    writer.write(reply)
+                RECEIVED_MESSAGES.inc(len(messages))
+                for message in gate.filter(messages):
+                    # Once the connection's queue or all the queues are full, stop reading and let TCP push back on the sensor
+                    while len(queue.messages) >= self.queue_size or self._queued >= self.max_queued:
+                        space = queue.space if len(queue.messages) >= self.queue_size else self._space
+                        space.clear()
+                        await space.wait()
+                    self._enqueue(queue, message)
+                if gate.rejected:
+                    break
+        except (ConnectionError, ValueError):
+            CONNECTION_ERRORS.inc()  # ValueError covers invalid JSON and oversized frames: same as the threaded engine, the sensor is dropped
+        finally:
+            if gate.rejected:
+                DUPLICATES.inc()
+            if capture:
+                capture.close_connection(capture_id)
+            gate.close()
+            writer.close()
+            self._enqueue(queue, None)  # Queued behind the session's messages so close() runs after them
+
+    def _enqueue(self, queue, message):
+        queue.messages.append(message)
+        self._queued += 1
+        if not queue.scheduled:
+            queue.scheduled = True
+            self._ring.append(queue)
+            self._pending.set()
+
+    async def _consume(self, executor):
+        loop = asyncio.get_running_loop()
+        ring = self._ring
+        while True:
+            if not ring:
+                self._pending.clear()
+                await self._pending.wait()
+            # Round robin: one message of every connection with messages, again and again until the batch is full
+            batch = []
+            while ring and len(batch) < self.batch_size:
+                queue = ring.popleft()
+                batch.append((queue.session, queue.messages.popleft()))
+                if queue.messages:
+                    ring.append(queue)
+                else:
+                    queue.scheduled = False
+                if not queue.space.is_set() and len(queue.messages) < self.queue_size:
+                    queue.space.set()
+            self._queued -= len(batch)
+            if not self._space.is_set() and self._queued < self.max_queued:
+                self._space.set()
+            await loop.run_in_executor(executor, self._dispatch, batch)
+
+    def _dispatch(self, batch):
+        dispatch_or_split(self.batch_handler, batch)
+
+
+def create_ingest_server(engine, host, port, session_factory, batch_handler=dispatch_batch,
+                         max_connections=DEFAULT_MAX_CONNECTIONS, capture=None, admission=None):
+    if admission is None:
+        admission = AdmissionControl(max_connections)
+    if engine == "async":
+        return AsyncIngestServer(host, port, session_factory, batch_handler, capture=capture, admission=admission)
+    return ThreadedIngestServer(host, port, session_factory, batch_handler, capture=capture, admission=admission)
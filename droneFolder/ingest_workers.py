@@ -0,0 +1,232 @@
+import atexit
+import functools
+import itertools
+import multiprocessing
+import os
+import queue
+import struct
+import threading
+import time
+
+from admission import AdmissionControl
+from ingest import (CONNECTION_ERRORS, CONNECTIONS, DUPLICATES, RECEIVED_BYTES, RECEIVED_MESSAGES, REJECTED,
+                    AsyncIngestServer, dispatch_or_split)
+from readings import READING_KEYS, SENSOR_PREFIX, ms_to_timestamp, sensor_number, timestamp_to_ms
+from shmring import SharedRing
+
+# Multi-process sensor ingest for the drone (--ingest_processes). Every worker process runs an AsyncIngestServer on
+# the drone's port (SO_REUSEPORT, the kernel spreads the sensor connections over the workers), so reading the
+# sockets, framing and JSON decoding happen outside of the main process and its GIL. Decoded readings are handed to
+# the main process through one SharedRing (shmring.py) per worker as fixed-size RECORDs; the main process rebuilds
+# the messages and passes them to the usual batch handler (validation, detection, aggregation, forwarding).
+# A record only carries a reading the main process rebuilds exactly as decoded (float64 values, same timestamp
+# string), so the number of processes changes neither validation nor the forwarded data. Other messages (other
+# sensor IDs, integer values, extra keys such as latency traces, malformed readings) go through a multiprocessing
+# queue instead, with a KIND_OTHER record marking their place so the order is kept.
+# When a worker dies, the main process closes the sessions of its connections.
+# Admission control runs in every worker for its own connections: limits and duplicate sensor IDs are per worker.
+# Workers are forked, so they must be started before the main process starts any thread (Linux / macOS only).
+
+ENTRY = struct.Struct("<BI")  # kind, connection id within the worker
+FIELDS = struct.Struct("<Iddq")  # sensor number, temperature, humidity, epoch milliseconds
+RECORD = struct.Struct("<BI" + FIELDS.format[1:])  # ENTRY followed by FIELDS
+KIND_READING = 0
+KIND_OTHER = 1   # The message is the next one in the worker's overflow queue
+KIND_CLOSED = 2  # The connection was closed
+_NO_READING = bytes(FIELDS.size)
+_LOST = object()  # An overflow message that never arrived because its worker died
+
+DEFAULT_RING_CAPACITY = 65536  # Records per worker ring
+DEFAULT_BATCH_SIZE = 1024      # Records taken from one ring before the next worker's turn
+IDLE_WAIT = 0.001              # Seconds the main process sleeps when all rings are empty
+STATS_INTERVAL = 0.5           # Seconds between two updates of the worker statistics in the ring
+OVERFLOW_TIMEOUT = 0.5         # Seconds between two liveness checks of a worker while waiting for its overflow message
+LIVENESS_INTERVAL = 1.0        # Seconds between two checks for dead workers
+
+# Statistics slots of the worker rings
+STAT_CONNECTIONS = 0
+STAT_REJECTED = 1
+STAT_DUPLICATES = 2
+STAT_RATE_LIMITED = 3
+STAT_ACCEPTED = 4
+STAT_ERRORS = 5
+STAT_RECEIVED_BYTES = 6
+STAT_RECEIVED_MESSAGES = 7
+# Ingest counters published by the workers, read as the sums over all workers in the main process
+WORKER_COUNTERS = ((CONNECTIONS, STAT_ACCEPTED), (REJECTED, STAT_REJECTED), (DUPLICATES, STAT_DUPLICATES),
+                   (CONNECTION_ERRORS, STAT_ERRORS), (RECEIVED_BYTES, STAT_RECEIVED_BYTES),
+                   (RECEIVED_MESSAGES, STAT_RECEIVED_MESSAGES))
+
+
+class _WorkerSession:
+    __slots__ = ("id",)
+
+    def __init__(self, connection_id):
+        self.id = connection_id
+
+
+# Returns the FIELDS of a reading the main process can rebuild exactly, or None
+def _encode_fields(message):
+    if message.keys() != READING_KEYS:
+        return None
+    temperature, humidity, timestamp = message["temperature"], message["humidity"], message["timestamp"]
+    if type(temperature) is not float or type(humidity) is not float:
+        return None
+    number = sensor_number(message["sensor_id"])
+    ms = timestamp_to_ms(timestamp)
+    if number is None or ms is None or ms_to_timestamp(ms) != timestamp:
+        return None
+    return FIELDS.pack(number, temperature, humidity, ms)
+
+
+def _run_worker(ring, overflow, host, port, admission_args):
+    parent = os.getppid()
+    admission = AdmissionControl(*admission_args)
+    connection_ids = itertools.count(1)
+
+    # Runs on the server's single processing thread, which is therefore the only producer of the ring
+    def handle_batch(batch):
+        records = []
+        for session, message in batch:
+            if message is None:
+                records.append(ENTRY.pack(KIND_CLOSED, session.id) + _NO_READING)
+                continue
+            reading = _encode_fields(message) if isinstance(message, dict) else None
+            if reading is None:
+                overflow.put(message)
+                records.append(ENTRY.pack(KIND_OTHER, session.id) + _NO_READING)
+            else:
+                records.append(ENTRY.pack(KIND_READING, session.id) + reading)
+        ring.put_many(records)
+
+    def publish_stats():
+        while os.getppid() == parent:  # The main process is gone (e.g. killed), do not keep its port
+            ring.set_stat(STAT_CONNECTIONS, admission.active_connections)
+            ring.set_stat(STAT_RATE_LIMITED, admission.shed_rate_limited())
+            for counter, slot in WORKER_COUNTERS:
+                ring.set_stat(slot, int(counter.value))
+            time.sleep(STATS_INTERVAL)
+        os._exit(0)
+
+    threading.Thread(target=publish_stats, daemon=True).start()
+    server = AsyncIngestServer(host, port, lambda addr: _WorkerSession(next(connection_ids)), handle_batch,
+                               admission=admission, reuse_port=True)
+    server.serve_forever()
+
+
+# Admission statistics summed over the workers, read like the AdmissionControl of a single-process ingest server
+class WorkerAdmissionStats:
+    def __init__(self, rings):
+        self._rings = rings
+
+    def total(self, slot):
+        return sum(ring.stat(slot) for ring in self._rings)
+
+    @property
+    def active_connections(self):
+        return self.total(STAT_CONNECTIONS)
+
+    @property
+    def rejected_connections(self):
+        return self.total(STAT_REJECTED)
+
+    @property
+    def duplicate_connections(self):
+        return self.total(STAT_DUPLICATES)
+
+    def shed_rate_limited(self):
+        return self.total(STAT_RATE_LIMITED)
+
+
+class IngestWorkers:
+    def __init__(self, processes, host, port, session_factory, batch_handler, admission_args=(),
+                 ring_capacity=DEFAULT_RING_CAPACITY, batch_size=DEFAULT_BATCH_SIZE):
+        self.session_factory = session_factory
+        self.batch_handler = batch_handler
+        self.batch_size = batch_size
+        self.records = 0     # Records taken from the rings
+        self.overflowed = 0  # Messages taken from the overflow queues
+        self.rings = []
+        self.processes = []
+        self._overflows = []
+        context = multiprocessing.get_context("fork")
+        for index in range(processes):
+            ring = SharedRing(RECORD.size, ring_capacity)
+            overflow = context.Queue()
+            self.rings.append(ring)
+            self._overflows.append(overflow)
+            self.processes.append(context.Process(target=_run_worker, args=(ring, overflow, host, port, admission_args),
+                                                  name=f"drone-ingest-{index}", daemon=True))
+        self.admission = WorkerAdmissionStats(self.rings)
+
+    @property
+    def active_connections(self):
+        return self.admission.active_connections
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+        for counter, slot in WORKER_COUNTERS:  # Only in this process, the workers keep counting themselves
+            counter.func = functools.partial(self.admission.total, slot)
+        atexit.register(self._cleanup)
+
+    def _cleanup(self):
+        # Only removes the names: serve_forever may still be reading the rings while the interpreter exits
+        for ring in self.rings:
+            ring.unlink()
+
+    # Takes the records of every worker in turn and hands them to batch_handler like an ingest engine would
+    def serve_forever(self):
+        sessions = {}  # (worker index, connection id) -> session
+        dead = set()
+        next_check = time.monotonic() + LIVENESS_INTERVAL
+        while True:
+            idle = True
+            for index, ring in enumerate(self.rings):
+                data = ring.get_many(self.batch_size)
+                if not data:
+                    continue
+                idle = False
+                self.records += len(data) // RECORD.size
+                batch = []
+                for kind, connection_id, number, temperature, humidity, ms in RECORD.iter_unpack(data):
+                    key = (index, connection_id)
+                    session = sessions.get(key)
+                    if session is None:
+                        session = sessions[key] = self.session_factory(key)
+                    if kind == KIND_READING:
+                        batch.append((session, {"sensor_id": f"{SENSOR_PREFIX}{number}", "temperature": temperature,
+                                                "humidity": humidity, "timestamp": ms_to_timestamp(ms)}))
+                    elif kind == KIND_OTHER:
+                        message = self._overflow_message(index)
+                        self.overflowed += 1
+                        if message is not _LOST:
+                            batch.append((session, message))
+                    else:
+                        batch.append((session, None))
+                        del sessions[key]
+                if batch:
+                    dispatch_or_split(self.batch_handler, batch)
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + LIVENESS_INTERVAL
+                for index, process in enumerate(self.processes):
+                    # Checked in this order, an empty ring of a dead worker holds no more records
+                    if index not in dead and not process.is_alive() and not self.rings[index].pending():
+                        dead.add(index)
+                        self.rings[index].set_stat(STAT_CONNECTIONS, 0)
+                        print(f"Ingest worker {index} exited (code {process.exitcode}), closing its connections")
+                        closed = [(sessions.pop(key), None) for key in list(sessions) if key[0] == index]
+                        if closed:
+                            dispatch_or_split(self.batch_handler, closed)
+            if idle:
+                time.sleep(IDLE_WAIT)
+
+    # The worker puts the message in its queue before the record in its ring, but the queue's feeder thread may
+    # deliver it a bit later, or never if the worker died in between
+    def _overflow_message(self, index):
+        while True:
+            try:
+                return self._overflows[index].get(timeout=OVERFLOW_TIMEOUT)
+            except queue.Empty:
+                if not self.processes[index].is_alive():
+                    return _LOST
@@ -0,0 +1,241 @@
+import json
+import os
+import threading
+import time
+
+# Disk-backed store-and-forward outbox for the messages the drone cannot forward while it is not active.
+# Records are appended as "<enqueue time ms> <json>\n" lines to append-only segment files in `directory`.
+# A cursor file remembers how far replay got, so both the pending records and the replay position survive a restart.
+# Fully replayed segments are deleted. Limits:
+#   max_bytes - total size of the segment files; what happens when it is reached depends on `policy`:
+#               "drop_oldest" deletes the oldest segments, "drop_new" refuses new records,
+#               "summarize" refuses normal readings (the aggregates already summarize them) but still stores
+#               aggregates and anomalies, deleting the oldest segments for them
+#   max_age   - records older than this many seconds are dropped instead of being replayed (None: no limit)
+# A corrupt record (e.g. garbage written into a segment) is dropped when replay reaches it.
+
+POLICIES = ("drop_oldest", "drop_new", "summarize")
+SEGMENT_SUFFIX = ".seg"
+CURSOR_FILE = "cursor"
+
+
+class Outbox:
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024, max_age=None, policy="drop_oldest",
+                 segment_bytes=4 * 1024 * 1024):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown outbox policy: {policy}")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.policy = policy
+        self.segment_bytes = min(segment_bytes, max_bytes)
+        self.dropped = 0       # Records lost to the size or age limits
+        self.summarized = 0    # Normal readings not stored because of the "summarize" policy
+        self.replayed = 0
+        self.last_replay_rate = 0.0  # Records per second of the last replay
+        self._lock = threading.Lock()
+        self._segments = []    # Segment ids, oldest first; the last one is the one being appended to
+        self._sizes = {}       # Segment id -> bytes
+        self._counts = {}      # Segment id -> records
+        self._active = None    # Open file of the last segment
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # --- Startup ---
+    def _load(self):
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(SEGMENT_SUFFIX):
+                seg = int(name[:-len(SEGMENT_SUFFIX)])
+                with open(self._path(seg), "rb") as f:
+                    data = f.read()
+                complete = data.rfind(b"\n") + 1
+                if complete < len(data):  # Drop a record that was cut off by a crash in the middle of a write
+                    with open(self._path(seg), "r+b") as f:
+                        f.truncate(complete)
+                self._segments.append(seg)
+                self._sizes[seg] = complete
+                self._counts[seg] = data.count(b"\n", 0, complete)
+        self._cursor_seg, self._cursor_offset, self._cursor_records = 0, 0, 0
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE)) as f:
+                self._cursor_seg, self._cursor_offset, self._cursor_records = map(int, f.read().split())
+        except (OSError, ValueError):
+            pass
+        for seg in list(self._segments):  # Segments entirely before the cursor were replayed before the restart
+            if seg < self._cursor_seg:
+                self._delete_segment(seg)
+        if not self._segments or self._segments[0] != self._cursor_seg:
+            self._cursor_seg = self._segments[0] if self._segments else 0
+            self._cursor_offset = self._cursor_records = 0
+
+    # --- Appending ---
+    # Stores one record (a dict). Returns False if it was refused because of the size limit.
+    def put(self, record):
+        line = f"{int(time.time() * 1000)} {json.dumps(record)}\n".encode()
+        with self._lock:
+            if len(line) > self.max_bytes:
+                self.dropped += 1
+                return False
+            if self._total_bytes() + len(line) > self.max_bytes:
+                if self.policy == "drop_new":
+                    self.dropped += 1
+                    return False
+                if self.policy == "summarize" and "meanTemperature" not in record and not record.get("anomaly"):
+                    self.summarized += 1
+                    return False
+                while self._segments and self._total_bytes() + len(line) > self.max_bytes:
+                    if self._segments[0] == self._segments[-1] and self._active is not None:
+                        self._rotate()  # Never delete the segment being appended to while it is open
+                    self._evict_oldest()
+            if self._active is None or self._sizes[self._segments[-1]] >= self.segment_bytes:
+                self._rotate()
+            seg = self._segments[-1]
+            self._active.write(line)
+            self._active.flush()  # Hand the record to the OS right away so it survives a drone process crash
+            self._sizes[seg] += len(line)
+            self._counts[seg] += 1
+            return True
+
+    def _rotate(self):
+        if self._active is not None:
+            self._active.close()
+        seg = self._segments[-1] + 1 if self._segments else self._cursor_seg + 1
+        if not self._segments:  # Replay starts with the first segment written after the outbox was emptied
+            self._cursor_seg, self._cursor_offset, self._cursor_records = seg, 0, 0
+        self._segments.append(seg)
+        self._sizes[seg] = 0
+        self._counts[seg] = 0
+        self._active = open(self._path(seg), "ab")
+        self._expire_segments()
+
+    # Deletes whole segments whose newest record is older than max_age
+    def _expire_segments(self):
+        if self.max_age is None:
+            return
+        limit = time.time() - self.max_age
+        while len(self._segments) > 1 and os.path.getmtime(self._path(self._segments[0])) < limit:
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        seg = self._segments[0]
+        lost = self._counts[seg] - (self._cursor_records if seg == self._cursor_seg else 0)
+        self.dropped += lost
+        self._delete_segment(seg)
+        self._cursor_seg = self._segments[0] if self._segments else seg + 1
+        self._cursor_offset = self._cursor_records = 0
+        self._save_cursor()
+
+    def _delete_segment(self, seg):
+        if self._active is not None and seg == self._segments[-1]:
+            self._active.close()
+            self._active = None
+        self._segments.remove(seg)
+        del self._sizes[seg], self._counts[seg]
+        try:
+            os.remove(self._path(seg))
+        except OSError:
+            pass
+
+    # --- Replaying ---
+    # Replays the pending records in order, passing lists of up to batch_size records to send_batch(records).
+    # send_batch returns True once a batch has been delivered; on False replay stops and resumes from that batch
+    # next time (so a batch may be delivered twice). With limit, replay also stops once that many records were
+    # delivered, so a caller can spread a large backlog over time. Returns the number of records delivered.
+    def replay(self, send_batch, batch_size=500, limit=None):
+        start = time.perf_counter()
+        delivered = 0
+        while limit is None or delivered < limit:
+            with self._lock:
+                size = batch_size if limit is None else min(batch_size, limit - delivered)
+                batch, end_offset, lines, skipped = self._read_batch(size)
+                seg = self._cursor_seg
+            if end_offset is None:
+                break
+            if batch and not send_batch(batch):
+                break
+            delivered += len(batch)
+            with self._lock:
+                if seg == self._cursor_seg:  # The segment may have been evicted while the batch was being sent
+                    self.dropped += skipped
+                    self._cursor_offset = end_offset
+                    self._cursor_records += lines
+                    if self._cursor_records >= self._counts[seg] and seg != self._segments[-1]:
+                        self._delete_segment(seg)
+                        self._cursor_seg = self._segments[0]
+                        self._cursor_offset = self._cursor_records = 0
+                    self._save_cursor()
+        elapsed = time.perf_counter() - start
+        self.replayed += delivered
+        if delivered:
+            self.last_replay_rate = delivered / elapsed if elapsed > 0 else float(delivered)
+        return delivered
+
+    # Reads up to batch_size records from the cursor. Returns (records, offset after them, lines consumed, skipped),
+    # offset being None when nothing is left. Expired and corrupt records are consumed and counted but not returned.
+    def _read_batch(self, batch_size):
+        while self._segments:
+            seg = self._cursor_seg
+            if self._cursor_records < self._counts[seg]:
+                break
+            if seg == self._segments[-1]:
+                return [], None, 0, 0  # All caught up with the segment being appended to
+            self._delete_segment(seg)
+            self._cursor_seg = self._segments[0]
+            self._cursor_offset = self._cursor_records = 0
+        else:
+            return [], None, 0, 0
+        if self._active is not None:
+            self._active.flush()
+        records = []
+        lines = skipped = 0
+        oldest = (time.time() - self.max_age) * 1000 if self.max_age is not None else None
+        with open(self._path(seg), "rb") as f:
+            f.seek(self._cursor_offset)
+            while lines < batch_size and self._cursor_records + lines < self._counts[seg]:
+                line = f.readline()
+                lines += 1
+                stamp, _, payload = line.partition(b" ")
+                try:
+                    if oldest is not None and int(stamp) < oldest:
+                        skipped += 1
+                        continue
+                    records.append(json.loads(payload))
+                except ValueError:  # Corrupt record: skip it, or replay would stop at it for good
+                    skipped += 1
+            return records, f.tell(), lines, skipped
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, CURSOR_FILE)
+        with open(path + ".tmp", "w") as f:
+            f.write(f"{self._cursor_seg} {self._cursor_offset} {self._cursor_records}")
+        os.replace(path + ".tmp", path)  # Atomic, a crash leaves either the old or the new cursor
+
+    # --- Reporting ---
+    @property
+    def depth(self):
+        with self._lock:
+            return sum(self._counts.values()) - self._cursor_records
+
+    def _total_bytes(self):
+        return sum(self._sizes.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "depth": sum(self._counts.values()) - self._cursor_records,
+                "bytes": self._total_bytes(),
+                "segments": len(self._segments),
+                "dropped": self.dropped,
+                "summarized": self.summarized,
+                "replayed": self.replayed,
+                "replay_rate": round(self.last_replay_rate, 1),
+            }
+
+    def close(self):
+        with self._lock:
+            if self._active is not None:
+                self._active.close()
+                self._active = None
+
+    def _path(self, seg):
+        return os.path.join(self.directory, f"{seg:08d}{SEGMENT_SUFFIX}")
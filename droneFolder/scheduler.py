@@ -0,0 +1,102 @@
+import heapq
+import itertools
+import threading
+import time
+
+# Heap-based timer scheduler: jobs are kept in a heap ordered by their due time and run one after the other by a
+# single thread, which sleeps until the next job is due (or a new, earlier job is added) instead of polling.
+#   speed - simulated seconds per real second. Delays and intervals given with simulated=True are in simulated time,
+#           so e.g. speed=100 runs a 10 minute charge cycle in 6 seconds; simulated=False keeps them in real seconds.
+# Jobs must be short: a job that takes long delays every job after it, long running work belongs on its own scheduler.
+
+
+class Job:
+    __slots__ = ("due", "interval", "func", "args", "cancelled")
+
+    def __init__(self, due, interval, func, args):
+        self.due = due            # time.monotonic() at which the job runs next
+        self.interval = interval  # Real seconds between two runs of a repeating job, None for a one-shot job
+        self.func = func
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    def __init__(self, speed=1.0, name="scheduler"):
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        self.speed = speed
+        self.name = name
+        self.errors = 0  # Jobs that raised, the scheduler keeps running
+        self.last_error = None
+        self._heap = []  # (due, seq, job), seq keeps jobs due at the same time in the order they were added
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread = None
+        self._start = time.monotonic()
+
+    # Simulated seconds since the scheduler was created
+    def now(self):
+        return (time.monotonic() - self._start) * self.speed
+
+    def _real(self, seconds, simulated):
+        return seconds / self.speed if simulated else seconds
+
+    def call_later(self, delay, func, *args, simulated=True):
+        return self._push(Job(time.monotonic() + self._real(delay, simulated), None, func, args))
+
+    # Runs func every interval seconds, the first time after one interval. Runs are on a fixed rate; runs missed
+    # because the scheduler was busy are skipped rather than run back to back.
+    def every(self, interval, func, *args, simulated=True):
+        interval = self._real(interval, simulated)
+        return self._push(Job(time.monotonic() + interval, interval, func, args))
+
+    def _push(self, job):
+        with self._cond:
+            heapq.heappush(self._heap, (job.due, next(self._seq), job))
+            if self._heap[0][2] is job:
+                self._cond.notify()  # Due before the job the thread is waiting for
+        return job
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    if self._heap:
+                        wait = self._heap[0][0] - time.monotonic()
+                        if wait <= 0:
+                            job = heapq.heappop(self._heap)[2]
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+            if job.cancelled:
+                continue
+            try:
+                job.func(*job.args)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+            if job.interval is not None and not job.cancelled:
+                job.due += job.interval
+                now = time.monotonic()
+                if job.due <= now:  # Skip the missed runs: next run at the first slot of the fixed rate still ahead
+                    job.due += ((now - job.due) // job.interval + 1) * job.interval
+                self._push(job)
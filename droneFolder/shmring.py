@@ -0,0 +1,84 @@
+import struct
+import time
+from multiprocessing import shared_memory
+
+# Single-producer / single-consumer ring buffer of fixed-size records in shared memory, used to hand decoded readings
+# from an ingest worker process to the drone's main process without pickling them (see ingest_workers.py).
+# Layout: the producer's write count at offset 0 and the consumer's read count at offset 64 (own cache lines),
+# STATS_SLOTS uint64 statistics the producer publishes for the consumer to read at offset 128, then the records.
+# Each side only ever writes its own count, after the records it covers were written / read, so no lock is needed:
+# the counts are aligned 8-byte values, which are written and read whole.
+# A full ring makes put_many() wait, which stops the worker reading its sockets and lets TCP push back on the sensors.
+
+COUNT = struct.Struct("<Q")
+HEAD_OFFSET = 0
+TAIL_OFFSET = 64
+STATS_OFFSET = 128
+STATS_SLOTS = 8
+DATA_OFFSET = STATS_OFFSET + STATS_SLOTS * COUNT.size
+FULL_WAIT = 0.0005  # Seconds the producer sleeps while the ring is full
+
+
+class SharedRing:
+    def __init__(self, record_size, capacity=65536, name=None):
+        # Creates the ring with name None, attaches to an existing one (in another process) by its name otherwise
+        self.record_size = record_size
+        self.capacity = capacity
+        self.full_waits = 0
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=DATA_OFFSET + capacity * record_size)
+            self._shm.buf[:DATA_OFFSET] = bytes(DATA_OFFSET)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self.name = self._shm.name
+        self._buf = self._shm.buf
+
+    def _count(self, offset):
+        return COUNT.unpack_from(self._buf, offset)[0]
+
+    # --- Producer ---
+    def put_many(self, records):
+        # records: bytes objects of record_size each
+        head = self._count(HEAD_OFFSET)
+        size = self.record_size
+        for record in records:
+            while head - self._count(TAIL_OFFSET) >= self.capacity:
+                COUNT.pack_into(self._buf, HEAD_OFFSET, head)  # Publish what is written so far while waiting
+                self.full_waits += 1
+                time.sleep(FULL_WAIT)
+            offset = DATA_OFFSET + (head % self.capacity) * size
+            self._buf[offset:offset + size] = record
+            head += 1
+        COUNT.pack_into(self._buf, HEAD_OFFSET, head)
+
+    def set_stat(self, slot, value):
+        COUNT.pack_into(self._buf, STATS_OFFSET + slot * COUNT.size, value)
+
+    # --- Consumer ---
+    def get_many(self, limit=4096):
+        # Returns up to limit records, oldest first, copied into one bytes object (e.g. for Struct.iter_unpack)
+        tail = self._count(TAIL_OFFSET)
+        available = min(self._count(HEAD_OFFSET) - tail, limit)
+        if available <= 0:
+            return b""
+        size = self.record_size
+        start = tail % self.capacity
+        first = min(available, self.capacity - start)  # Records up to the end of the ring, the rest wrap around
+        data = bytes(self._buf[DATA_OFFSET + start * size:DATA_OFFSET + (start + first) * size])
+        if first < available:
+            data += bytes(self._buf[DATA_OFFSET:DATA_OFFSET + (available - first) * size])
+        COUNT.pack_into(self._buf, TAIL_OFFSET, tail + available)
+        return data
+
+    def stat(self, slot):
+        return self._count(STATS_OFFSET + slot * COUNT.size)
+
+    def pending(self):
+        return self._count(HEAD_OFFSET) - self._count(TAIL_OFFSET)
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+
+    def unlink(self):
+        self._shm.unlink()
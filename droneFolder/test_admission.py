@@ -0,0 +1,117 @@
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "commonFolder"))
+
+from admission import MAX_SENSORS_PER_CONNECTION, AdmissionControl
+from ingest import AsyncIngestServer, ThreadedIngestServer
+
+
+def reading(sensor_id, number=0):
+    return {"sensor_id": sensor_id, "temperature": 20.0, "humidity": 50.0, "n": number}
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def start_server(engine, batch_handler, **kwargs):
+    server = engine("127.0.0.1", 0, lambda addr: addr, batch_handler, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    assert server.ready.wait(5)
+    return server
+
+
+def send(sock, *messages):
+    sock.sendall(b"".join(json.dumps(message).encode() + b"\n" for message in messages))
+
+
+@pytest.mark.parametrize("engine", [ThreadedIngestServer, AsyncIngestServer])
+def test_newest_connection_takes_over_a_sensor(engine):
+    received = []
+    server = start_server(engine, lambda batch: received.extend(message for _, message in batch if message))
+    old = socket.create_connection(("127.0.0.1", server.port))
+    send(old, reading("sensor1", 1))
+    wait_until(lambda: len(received) == 1)
+    new = socket.create_connection(("127.0.0.1", server.port))  # The sensor reconnected, the old connection is half-open
+    send(new, reading("sensor1", 2))
+    wait_until(lambda: len(received) == 2)
+    old.settimeout(5)
+    assert old.recv(1) == b""  # Closed by the drone
+    send(new, reading("sensor1", 3))
+    wait_until(lambda: len(received) == 3)
+    assert server.admission.duplicate_connections == 1
+    old.close()
+    new.close()
+    server.stop()
+
+
+def test_reject_policy_refuses_the_newer_connection():
+    admission = AdmissionControl(duplicates="reject")
+    first, second = admission.connect(), admission.connect()
+    assert first.filter([reading("sensor1")])
+    assert second.filter([reading("sensor1")]) == [] and second.rejected and not first.rejected
+    first.close()
+    third = admission.connect()
+    assert third.filter([reading("sensor1")]) and not third.rejected
+
+
+def test_rotating_sensor_ids_are_bounded_per_connection():
+    admission = AdmissionControl(rate=1, burst=1)
+    gate = admission.connect()
+    admitted = gate.filter([reading(f"sensor{n}") for n in range(100)])
+    assert len(admitted) == MAX_SENSORS_PER_CONNECTION
+    assert gate.rate_limited == 100 - MAX_SENSORS_PER_CONNECTION
+    assert len(gate.sensor_ids) == MAX_SENSORS_PER_CONNECTION
+    assert admission.stats()["buckets"] == MAX_SENSORS_PER_CONNECTION
+    assert gate.filter([reading("sensor0")]) == []  # Switching back reuses the claimed, empty bucket
+
+
+def test_refilled_buckets_of_released_sensors_are_forgotten():
+    admission = AdmissionControl(rate=1000, burst=1)
+    gate = admission.connect()
+    gate.filter([reading(f"sensor{n}") for n in range(10)])
+    gate.close()
+    slow = AdmissionControl(rate=0.001, burst=1)
+    slow_gate = slow.connect()
+    assert slow_gate.filter([reading("sensor1")])
+    slow_gate.close()
+    time.sleep(0.01)  # Enough for the fast buckets to refill, not the slow one
+    admission._next_sweep = slow._next_sweep = 0
+    admission.connect().filter([reading("sensor99")])
+    slow.connect().filter([reading("sensor2")])
+    assert admission.stats()["buckets"] == 1
+    assert slow.stats()["buckets"] == 2
+    assert slow.connect().filter([reading("sensor1")]) == []  # Reconnecting does not refill the tokens
+
+
+def test_async_engine_bounds_the_messages_queued_over_all_connections():
+    received = []
+    release = threading.Event()
+
+    def batch_handler(batch):
+        release.wait()
+        received.extend(message for _, message in batch if message)
+
+    server = start_server(AsyncIngestServer, batch_handler, max_queued=50)
+    sockets = [socket.create_connection(("127.0.0.1", server.port)) for _ in range(5)]
+    for index, sock in enumerate(sockets):
+        send(sock, *(reading(f"sensor{index}", n) for n in range(100)))
+    wait_until(lambda: server._queued >= 40)
+    time.sleep(0.2)
+    assert server._queued <= 50
+    release.set()
+    wait_until(lambda: len(received) == 500)
+    for sock in sockets:
+        sock.close()
+    server.stop()
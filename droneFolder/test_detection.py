@@ -0,0 +1,62 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "commonFolder"))
+
+from detection import AnomalyDetector
+from readings import STAT_RATE, STAT_SPIKE, STAT_STUCK
+
+
+# Readings alternating around 20 degrees / 50 %, one per second: the detector learns a small level and rate noise
+def feed_normal(detector, sensor_id, count, start=0):
+    results = []
+    for i in range(start, start + count):
+        wobble = 0.1 if i % 2 else -0.1
+        results.append(detector.score(sensor_id, 20.0 + wobble, 50.0 - wobble, float(i)))
+    return results
+
+
+def test_no_flags_during_warmup():
+    detector = AnomalyDetector(warmup=20)
+    feed_normal(detector, "sensor1", 5)
+    score, reasons = detector.score("sensor1", 80.0, 50.0, 5.0)  # Huge jump, but only the 6th reading
+    assert (score, reasons) == (0.0, 0)
+
+
+def test_spike_after_warmup():
+    detector = AnomalyDetector(warmup=20)
+    assert all(reasons == 0 for _, reasons in feed_normal(detector, "sensor1", 40))
+    score, reasons = detector.score("sensor1", 25.0, 50.0, 60.0)  # Far from the level, but slowly reached
+    assert reasons & STAT_SPIKE
+    assert not reasons & STAT_RATE  # 5 degrees over 20 seconds is no faster than the usual wobble
+    assert score >= detector.z_threshold
+
+
+def test_rate_flag_for_a_fast_change():
+    detector = AnomalyDetector(warmup=20)
+    feed_normal(detector, "sensor1", 40)
+    score, reasons = detector.score("sensor1", 22.0, 50.0, 40.0)
+    assert reasons & STAT_RATE
+
+
+def test_stuck_after_stuck_count_identical_readings():
+    detector = AnomalyDetector(warmup=1000, stuck_count=5)
+    feed_normal(detector, "sensor1", 10)
+    flags = [detector.score("sensor1", 21.0, 49.0, 10.0 + i)[1] for i in range(6)]
+    assert flags == [0, 0, 0, 0, STAT_STUCK, STAT_STUCK]  # Flagged at the 5th identical reading in a row, even in warmup
+    assert detector.score("sensor1", 21.5, 49.0, 16.0)[1] == 0
+
+
+def test_the_sensor_table_is_bounded_and_idle_sensors_are_reused():
+    detector = AnomalyDetector(max_sensors=3, idle_after=3600)
+    for n in range(3):
+        feed_normal(detector, f"sensor{n}", 2)
+    assert detector.score("sensor3", 20.0, 50.0, 0.0) == (0.0, 0)
+    assert len(detector) == 3 and detector.unscored == 1
+    for slot in range(3):  # Everyone went idle
+        detector.seen[slot] -= 7200
+    detector._next_sweep = 0
+    detector.score("sensor4", 20.0, 50.0, 0.0)
+    assert len(detector) == 1 and len(detector.count) == 3
+    assert detector.count[detector._slots["sensor4"]] == 1  # Starts over in a reused slot
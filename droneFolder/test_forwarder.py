@@ -0,0 +1,149 @@
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "commonFolder"))
+
+from forwarder import ForwardPipeline
+from protocol import Batch, ForwardDecoder, encode_ack
+
+
+# Central server stand-in: the first connection takes `window` batches without acknowledging any and then drops the
+# connection, later connections acknowledge everything. Returns the ids of the messages received, without resends.
+# With drain, the first connection is only dropped once nothing arrived for a moment: "lines" frames are not
+# acknowledged, so what the server has not read when it drops the connection is lost by design.
+def flaky_server(listener, window, received, stop, drain=False):
+    seen = set()
+    first = True
+    while not stop.is_set():
+        try:
+            conn, _ = listener.accept()
+        except socket.timeout:
+            continue
+        decoder = ForwardDecoder()
+        batches = 0
+        with conn:
+            conn.settimeout(0.5)
+            while not stop.is_set():
+                try:
+                    data = conn.recv(65536)
+                except socket.timeout:
+                    if first and batches >= window:
+                        break
+                    continue
+                if not data:
+                    break
+                for frame in decoder.feed(data):
+                    lines = frame.lines if isinstance(frame, Batch) else [frame]
+                    if isinstance(frame, Batch) and (frame.session, frame.seq) not in seen:
+                        seen.add((frame.session, frame.seq))
+                        received.extend(json.loads(line)["id"] for line in lines)
+                    elif not isinstance(frame, Batch):
+                        received.extend(json.loads(line)["id"] for line in lines)
+                    batches += 1
+                    if not first and isinstance(frame, Batch):
+                        conn.sendall(encode_ack(frame.seq))
+                if first and batches >= window and not drain:
+                    break
+        first = False
+
+
+def run_flaky(fmt, count=2000, window=4):
+    listener = socket.create_server(("127.0.0.1", 0))
+    listener.settimeout(0.2)
+    received = []
+    stop = threading.Event()
+    server = threading.Thread(target=flaky_server, args=(listener, window, received, stop, fmt == "lines"), daemon=True)
+    server.start()
+    pipeline = ForwardPipeline("127.0.0.1", listener.getsockname()[1], fmt, batch_size=10, max_delay=0.001,
+                               max_unacked=window, log=lambda line: None)
+    assert pipeline.send_many([{"id": i} for i in range(count // 2)], timeout=5)
+    pipeline.start()
+    deadline = time.monotonic() + 20
+    while pipeline.reconnects == 0 and time.monotonic() < deadline:  # The rest is sent over the second connection
+        time.sleep(0.05)
+    assert pipeline.send_many([{"id": i} for i in range(count // 2, count)], timeout=5)
+    while len(set(received)) < count and time.monotonic() < deadline:
+        time.sleep(0.05)
+    stop.set()
+    server.join()
+    listener.close()
+    return pipeline, received
+
+
+@pytest.mark.parametrize("fmt", ["batch", "lines"])
+def test_messages_survive_a_dropped_connection(fmt):
+    pipeline, received = run_flaky(fmt)
+    assert pipeline.reconnects >= 1
+    assert sorted(set(received)) == list(range(2000))
+    if fmt == "batch":
+        assert pipeline.resent_batches >= 1  # The open window was sent again
+
+
+# Socket whose writes start failing after `fail_after` of them, as when the server went away
+class FailingSocket:
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.sent = []
+        self._pair = socket.socketpair()  # Never readable: select() in _read_acks sees no acknowledgement
+
+    def fileno(self):
+        return self._pair[0].fileno()
+
+    def sendall(self, data):
+        if self.fail_after is not None and len(self.sent) >= self.fail_after:
+            raise BrokenPipeError("server went away")
+        self.sent.append(data)
+
+
+def test_lines_batch_whose_write_failed_is_written_after_the_reconnect():
+    pipeline = ForwardPipeline("127.0.0.1", 0, "lines", batch_size=10, max_delay=0.001, log=lambda line: None)
+    assert pipeline.send_many([{"id": i} for i in range(100)], timeout=5)
+    first = FailingSocket(fail_after=3)
+    with pytest.raises(BrokenPipeError):
+        pipeline._pump(first)
+    assert pipeline.pending() == 70  # The failed batch is still counted
+    second = FailingSocket()
+    threading.Thread(target=pipeline._pump, args=(second,), daemon=True).start()
+    deadline = time.monotonic() + 5
+    while pipeline.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    lines = b"".join(first.sent + second.sent).splitlines()
+    assert [json.loads(line)["id"] for line in lines] == list(range(100))
+    assert pipeline.resent_batches == 1
+
+
+
+def test_garbled_acknowledgement_makes_the_pipeline_reconnect():
+    listener = socket.create_server(("127.0.0.1", 0))
+    listener.settimeout(5)
+    pipeline = ForwardPipeline("127.0.0.1", listener.getsockname()[1], batch_size=1, log=lambda line: None)
+    pipeline.start()
+    conn, _ = listener.accept()
+    pipeline.send({"id": 1})
+    decoder = ForwardDecoder()
+    conn.settimeout(5)
+    while not decoder.feed(conn.recv(65536)):
+        pass
+    conn.sendall(b"ACK 1x\n")  # Truncated or corrupted on the way
+    second, _ = listener.accept()  # The sender thread survived and reconnects
+    decoder = ForwardDecoder()
+    second.settimeout(5)
+    frames = []
+    while not frames:
+        frames = decoder.feed(second.recv(65536))
+    assert frames[0].seq == 1  # The unacknowledged batch is sent again
+    second.sendall(encode_ack(1))
+    deadline = time.monotonic() + 5
+    while pipeline.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pipeline.pending() == 0
+    conn.close()
+    second.close()
+    listener.close()
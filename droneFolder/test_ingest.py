@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "commonFolder"))
+
+from ingest import HANDLER_ERRORS, dispatch_or_split
+
+
+# All-or-nothing like the drone's handler: checks the whole batch before processing any message
+def make_handler(processed):
+    def batch_handler(batch):
+        for _, message in batch:
+            if message == "bad":
+                raise ValueError(message)
+        processed.extend(message for _, message in batch)
+    return batch_handler
+
+
+def test_a_bad_message_only_loses_itself_and_is_counted():
+    processed = []
+    errors = HANDLER_ERRORS.value
+    batch = [("session", n) for n in range(5)] + [("session", "bad")] + [("session", n) for n in range(5, 10)]
+    dispatch_or_split(make_handler(processed), batch)
+    assert processed == list(range(10))  # Each message exactly once, in order
+    assert HANDLER_ERRORS.value == errors + 1
+
+
+def test_a_failing_single_message_batch_is_counted_once():
+    processed = []
+    errors = HANDLER_ERRORS.value
+    dispatch_or_split(make_handler(processed), [("session", "bad")])
+    dispatch_or_split(make_handler(processed), [("session", 1)])
+    assert processed == [1]
+    assert HANDLER_ERRORS.value == errors + 1
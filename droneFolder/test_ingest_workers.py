@@ -0,0 +1,85 @@
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "commonFolder"))
+
+from ingest_workers import IngestWorkers
+
+# Readings carried by the rings, values that would not survive float32 or rounding to 2 decimals included
+READINGS = [
+    {"sensor_id": "sensor1", "temperature": 100.004, "humidity": 49.995, "timestamp": "2026-01-02T03:04:05Z"},
+    {"sensor_id": "sensor1", "temperature": 21.5, "humidity": 40.0, "timestamp": "2026-01-02T03:04:06Z"},
+    {"sensor_id": "sensor42", "temperature": 0.1, "humidity": 1e300, "timestamp": "2026-01-02T03:04:07Z"},
+    {"sensor_id": "sensor4294967295", "temperature": -40.123456789, "humidity": 0.0, "timestamp": "1999-12-31T23:59:59Z"},
+    {"sensor_id": "sensor7", "temperature": float("nan"), "humidity": 50.0, "timestamp": "2026-01-02T03:04:08Z"},
+]
+# Messages the main process could not rebuild exactly from a record: they go through the overflow queues
+OTHERS = [
+    {"sensor_id": "sensor1", "temperature": 20, "humidity": 40.0, "timestamp": "2026-01-02T03:04:09Z"},
+    {"sensor_id": "sensor1", "temperature": 21.5, "humidity": 40.0, "timestamp": "2026-01-02 03:04:10"},
+    {"sensor_id": "sensor01", "temperature": 21.5, "humidity": 40.0, "timestamp": "2026-01-02T03:04:11Z"},
+    {"sensor_id": "sensor1", "temperature": True, "humidity": 40.0, "timestamp": "2026-01-02T03:04:12Z"},
+    {"sensor_id": "sensor1", "temperature": 21.5, "humidity": 40.0, "timestamp": "2026-01-02T03:04:13Z", "trace": {"sensor": 1.5}},
+]
+MESSAGES = READINGS * 3 + OTHERS + READINGS * 3
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def connect(port):
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            return socket.create_connection(("127.0.0.1", port))
+        except ConnectionRefusedError:  # The workers are still starting
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+
+
+def test_messages_cross_the_processes_unchanged_and_dead_workers_close_their_sessions():
+    received = []
+    lock = threading.Lock()
+
+    def batch_handler(batch):
+        with lock:
+            received.extend(batch)
+
+    port = free_port()
+    workers = IngestWorkers(2, "127.0.0.1", port, lambda key: key, batch_handler, ring_capacity=64)
+    workers.start()
+    try:
+        threading.Thread(target=workers.serve_forever, daemon=True).start()
+        sock = connect(port)
+        sent = MESSAGES * 20
+        sock.sendall(b"".join(json.dumps(message).encode() + b"\n" for message in sent))
+        wait_until(lambda: len(received) == len(sent))
+        sessions = {session for session, _ in received}
+        assert len(sessions) == 1
+        for (_, message), expected in zip(received, sent):  # Same values, types and order as sent
+            assert json.dumps(message) == json.dumps(expected)
+        assert workers.overflowed == len(OTHERS) * 20
+        assert workers.records == len(sent)  # One record per message, readings or placeholders of the others
+
+        session = sessions.pop()
+        workers.processes[session[0]].kill()
+        wait_until(lambda: received[-1] == (session, None))
+        sock.close()
+    finally:
+        for process in workers.processes:  # The rings are unlinked at exit
+            process.kill()
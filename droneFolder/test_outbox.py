@@ -0,0 +1,58 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from outbox import Outbox
+
+
+def test_replay_with_a_limit_resumes_where_it_stopped(tmp_path):
+    outbox = Outbox(str(tmp_path), segment_bytes=2000)  # Many small segments
+    for n in range(1000):
+        assert outbox.put({"n": n})
+    assert outbox.stats()["segments"] > 10
+    delivered = []
+
+    def send_batch(batch):
+        assert len(batch) <= 64
+        delivered.extend(record["n"] for record in batch)
+        return True
+
+    assert outbox.replay(send_batch, batch_size=64, limit=250) == 250
+    assert delivered == list(range(250))
+    assert outbox.depth == 750
+    assert outbox.replay(lambda batch: False, batch_size=64, limit=100) == 0  # A failed send keeps the records
+    assert outbox.depth == 750
+    assert outbox.replay(send_batch, batch_size=64, limit=1) == 1
+    outbox.close()
+
+    outbox = Outbox(str(tmp_path), segment_bytes=2000)  # The cursor survives a restart
+    assert outbox.depth == 749
+    assert outbox.replay(send_batch, batch_size=64) == 749
+    assert delivered == list(range(1000))
+    assert outbox.depth == 0
+    outbox.close()
+
+
+def test_a_corrupt_record_is_dropped_and_replay_moves_past_it(tmp_path):
+    outbox = Outbox(str(tmp_path))
+    for n in range(3):
+        outbox.put({"n": n})
+    outbox.close()
+    segment = next(name for name in os.listdir(tmp_path) if name.endswith(".seg"))
+    with open(tmp_path / segment, "ab") as f:
+        f.write(b"123 {\"n\": 3, garbage\n\xff\xfe not a record\n")
+    outbox = Outbox(str(tmp_path))
+    for n in range(4, 6):
+        outbox.put({"n": n})
+    delivered = []
+
+    def send_batch(batch):
+        delivered.extend(record["n"] for record in batch)
+        return True
+
+    assert outbox.replay(send_batch, batch_size=2) == 5
+    assert delivered == [0, 1, 2, 4, 5]
+    assert outbox.dropped == 2
+    assert outbox.depth == 0
+    outbox.close()
@@ -0,0 +1,82 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from battery import ACTIVE, CHARGING, RETURNING, BatteryStateMachine
+from scheduler import Scheduler
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_charge_cycle_at_100x_speed():
+    scheduler = Scheduler(speed=100)
+    transitions = []
+    battery = BatteryStateMachine(scheduler, threshold=90, tick=1.0, return_time=10.0,
+                                  on_transition=lambda old, new: transitions.append((old, new, battery.battery)))
+    scheduler.start()
+    start = time.monotonic()
+    battery.start()
+    wait_until(lambda: len(transitions) == 3)  # 10 ticks down, 10 s back to base, 10 ticks up: 30 simulated seconds
+    elapsed = time.monotonic() - start
+    battery.stop()
+    scheduler.stop()
+    assert transitions == [(ACTIVE, RETURNING, 90), (RETURNING, CHARGING, 90), (CHARGING, ACTIVE, 100)]
+    assert battery.status == ACTIVE and battery.transitions == 3
+    assert 0.25 < elapsed < 2.0
+
+
+def test_missed_runs_of_a_fixed_rate_job_are_skipped():
+    scheduler = Scheduler()
+    runs = []
+    scheduler.call_later(0.0, time.sleep, 0.35, simulated=False)  # Keeps the scheduler busy for 7 intervals
+    scheduler.every(0.05, lambda: runs.append(time.monotonic()), simulated=False)
+    scheduler.start()
+    wait_until(lambda: len(runs) >= 3)
+    scheduler.stop()
+    assert runs[1] - runs[0] > 0.03  # Not run again back to back to catch up
+    assert runs[2] - runs[1] > 0.03
+
+
+def test_call_later_wakes_a_scheduler_sleeping_until_a_later_job():
+    scheduler = Scheduler()
+    done = threading.Event()
+    scheduler.call_later(60, done.set, simulated=False)
+    scheduler.start()
+    time.sleep(0.05)  # The thread now waits for the job in 60 seconds
+    start = time.monotonic()
+    scheduler.call_later(0.05, done.set, simulated=False)
+    assert done.wait(2)
+    assert time.monotonic() - start < 1.0
+    scheduler.stop()
+
+
+def test_cancelled_jobs_do_not_run():
+    scheduler = Scheduler()
+    runs = []
+    scheduler.call_later(0.05, runs.append, "one-shot", simulated=False).cancel()
+    repeating = scheduler.every(0.02, runs.append, "repeating", simulated=False)
+    scheduler.call_later(0.11, repeating.cancel, simulated=False)
+    scheduler.start()
+    time.sleep(0.3)
+    scheduler.stop()
+    assert "one-shot" not in runs
+    assert 3 <= runs.count("repeating") <= 6
+
+
+def test_a_failing_job_is_counted_and_the_scheduler_goes_on():
+    scheduler = Scheduler()
+    done = threading.Event()
+    scheduler.call_later(0.0, lambda: 1 / 0, simulated=False)
+    scheduler.call_later(0.01, done.set, simulated=False)
+    scheduler.start()
+    assert done.wait(2)
+    scheduler.stop()
+    assert scheduler.errors == 1 and isinstance(scheduler.last_error, ZeroDivisionError)
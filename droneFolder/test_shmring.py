@@ -0,0 +1,55 @@
+import os
+import random
+import struct
+import sys
+import threading
+from collections import deque
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from shmring import SharedRing
+
+RECORD = struct.Struct("<Q")
+
+
+def numbers(data):
+    return [n for n, in RECORD.iter_unpack(data)]
+
+
+def test_put_many_and_get_many_wrap_around():
+    rng = random.Random(408)
+    ring = SharedRing(RECORD.size, capacity=8)
+    reference = deque()
+    written = 0
+    try:
+        for _ in range(2000):  # Batches start and end all over the ring
+            count = rng.randint(0, 8 - len(reference))
+            ring.put_many([RECORD.pack(n) for n in range(written, written + count)])
+            reference.extend(range(written, written + count))
+            written += count
+            assert ring.pending() == len(reference)
+            limit = rng.randint(1, 9)
+            expected = [reference.popleft() for _ in range(min(limit, len(reference)))]
+            assert numbers(ring.get_many(limit)) == expected
+        assert written > 100 * 8
+    finally:
+        ring.close()
+        ring.unlink()
+
+
+def test_full_ring_makes_the_producer_wait():
+    ring = SharedRing(RECORD.size, capacity=16)
+    total = 5000
+    try:
+        producer = threading.Thread(target=lambda: [ring.put_many([RECORD.pack(n) for n in range(first, first + 10)])
+                                                    for first in range(0, total, 10)])
+        producer.start()
+        received = []
+        while len(received) < total:
+            received.extend(numbers(ring.get_many(7)))
+            assert ring.pending() <= 16
+        producer.join()
+        assert received == list(range(total))
+    finally:
+        ring.close()
+        ring.unlink()
@@ -0,0 +1,121 @@
+import re
+from datetime import datetime
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, the range checks fall back to plain Python
+    np = None
+
+# Validation of sensor readings. validate_batch() checks a whole list of readings at once and returns, for every
+# reading, whether it is an anomaly and a reason code telling which fields are invalid (a bitmask of the REASON_* flags).
+
+REASON_TEMPERATURE = 1
+REASON_HUMIDITY = 2
+REASON_ID = 4
+REASON_TIMESTAMP = 8
+
+REASON_NAMES = {
+    REASON_TEMPERATURE: "temperature",
+    REASON_HUMIDITY: "humidity",
+    REASON_ID: "id",
+    REASON_TIMESTAMP: "timestamp",
+}
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+NUMPY_MIN_BATCH = 64  # Below this size building the NumPy columns costs more than it saves
+
+_SENSOR_ID_PATTERN = re.compile(r"sensor\d+")
+_TIMESTAMP_PATTERN = re.compile(r"([0-9]{4})-([0-9]{2})-([0-9]{2})T([0-9]{2}):([0-9]{2}):([0-9]{2})Z")
+_NAN = float("nan")
+
+
+# Sensors keep their ID for the whole connection, so the result of the regex check is cached per ID
+@lru_cache(maxsize=65536)
+def is_valid_sensor_id(s):
+    return _SENSOR_ID_PATTERN.fullmatch(s) is not None
+
+
+# Readings sent within the same second share their timestamp string, so parsed timestamps are cached as well.
+# Returns the timestamp as a datetime, or None if it is not in TIMESTAMP_FORMAT.
+@lru_cache(maxsize=4096)
+def parse_timestamp(s):
+    match = _TIMESTAMP_PATTERN.fullmatch(s)
+    try:
+        if match:  # Fast path for the zero-padded form every sensor sends
+            return datetime(*map(int, match.groups()))
+        return datetime.strptime(s, TIMESTAMP_FORMAT)  # strptime also accepts e.g. non-padded fields
+    except ValueError:
+        return None
+
+
+def is_valid_time(s): return parse_timestamp(s) is not None
+def is_valid_humidity(n): return 0 <= n <= 100
+def is_valid_temperature(n): return -100 <= n <= 100
+
+
+# JSON integers have no size limit: one too large for a float would make the NumPy columns raise, so it becomes NaN
+def _to_float(n):
+    try:
+        return float(n)
+    except OverflowError:
+        return _NAN
+
+
+def describe_reasons(reason):
+    return [name for flag, name in REASON_NAMES.items() if reason & flag]
+
+
+# Validates a list of readings (dicts). Returns three lists with one entry per reading:
+#   anomalies  - True if the reading has at least one invalid field
+#   reasons    - bitmask of REASON_* flags, 0 for a valid reading
+#   timestamps - the parsed timestamp as a datetime, or None if it is missing or invalid
+# use_numpy=None picks NumPy for the range checks when it is installed and the batch is large enough.
+def validate_batch(messages, use_numpy=None):
+    count = len(messages)
+    reasons = [0] * count
+    timestamps = [None] * count
+    temperatures = [_NAN] * count  # Non-numeric values stay NaN, which fails every range comparison
+    humidities = [_NAN] * count
+
+    for i, message in enumerate(messages):
+        reason = 0
+        sensor_id = message.get("sensor_id")
+        if not (isinstance(sensor_id, str) and is_valid_sensor_id(sensor_id)):
+            reason |= REASON_ID
+        timestamp = message.get("timestamp")
+        if isinstance(timestamp, str):
+            timestamps[i] = parse_timestamp(timestamp)
+        if timestamps[i] is None:
+            reason |= REASON_TIMESTAMP
+        reasons[i] = reason
+        temperature = message.get("temperature")
+        if isinstance(temperature, (int, float)):
+            temperatures[i] = _to_float(temperature)
+        humidity = message.get("humidity")
+        if isinstance(humidity, (int, float)):
+            humidities[i] = _to_float(humidity)
+
+    if use_numpy is None:
+        use_numpy = np is not None and count >= NUMPY_MIN_BATCH
+    if use_numpy:
+        t = np.array(temperatures, dtype=np.float64)
+        h = np.array(humidities, dtype=np.float64)
+        range_reasons = (np.where((t >= -100) & (t <= 100), 0, REASON_TEMPERATURE) |
+                         np.where((h >= 0) & (h <= 100), 0, REASON_HUMIDITY))
+        for i in np.flatnonzero(range_reasons).tolist():
+            reasons[i] |= int(range_reasons[i])
+    else:
+        for i in range(count):
+            if not -100 <= temperatures[i] <= 100:
+                reasons[i] |= REASON_TEMPERATURE
+            if not 0 <= humidities[i] <= 100:
+                reasons[i] |= REASON_HUMIDITY
+
+    anomalies = [reason != 0 for reason in reasons]
+    return anomalies, reasons, timestamps
+
+
+# This function returns true if there are no anomalies in the sensor data, and false otherwise.
+def processData(message):
+    return validate_batch([message], use_numpy=False)[1][0] == 0
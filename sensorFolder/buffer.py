@@ -0,0 +1,69 @@
+import threading
+import time
+from collections import deque
+
+# Bounded buffer of the readings a sensor has sampled but not sent yet. The sensor keeps sampling into it while the
+# drone is unreachable, and the sender takes the readings out in batches once the connection is back.
+#   capacity - readings kept at most; when it is full the oldest reading is dropped to make room (dropped_full)
+#   max_age  - readings older than this many seconds are dropped instead of sent (dropped_expired, None: no limit)
+# Readings are kept as (time.monotonic() when sampled, reading) pairs, so their age survives a failed send.
+
+
+class ReadingBuffer:
+    def __init__(self, capacity=1000, max_age=None):
+        self.capacity = capacity
+        self.max_age = max_age
+        self.dropped_full = 0
+        self.dropped_expired = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, reading):
+        with self._cond:
+            if len(self._items) >= self.capacity:
+                self._items.popleft()
+                self.dropped_full += 1
+            self._items.append((time.monotonic(), reading))
+            self._cond.notify()
+
+    # Waits until at least count readings are buffered or the oldest one waited max_wait seconds (None: no limit),
+    # then removes and returns up to limit of them (oldest first). A backlog is therefore returned in large batches.
+    def take(self, count=1, max_wait=None, limit=500):
+        count = min(count, self.capacity)
+        with self._cond:
+            while True:
+                self._expire()
+                if self._items:
+                    if len(self._items) >= count:
+                        break
+                    if max_wait is None:
+                        self._cond.wait()
+                        continue
+                    wait = self._items[0][0] + max_wait - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+            return [self._items.popleft() for _ in range(min(limit, len(self._items)))]
+
+    # Puts readings returned by take() back in front of the buffer, e.g. after a failed send
+    def unget(self, items):
+        with self._cond:
+            space = self.capacity - len(self._items)
+            if len(items) > space:  # Readings sampled since then take precedence over the oldest ones
+                self.dropped_full += len(items) - space
+                items = items[len(items) - space:] if space > 0 else []
+            self._items.extendleft(reversed(items))
+            self._cond.notify()
+
+    def _expire(self):
+        if self.max_age is None:
+            return
+        oldest = time.monotonic() - self.max_age
+        while self._items and self._items[0][0] < oldest:
+            self._items.popleft()
+            self.dropped_expired += 1
@@ -0,0 +1,250 @@
+# load_generator.py
+# Load generation mode of sensor.py: simulates many sensors from one process on a single asyncio event loop.
+# Every simulated sensor keeps its own connection to the drone and sends readings at an open loop target rate
+# (a slow drone does not lower the schedule, late readings are sent as soon as possible to catch up).
+# Latency is the time from a reading's scheduled send time until the socket accepted it (writer.drain()),
+# so it grows with both event loop lag and backpressure from the drone.
+# With --trace_ratio a share of the JSON readings carry {"trace": {"sent": <epoch seconds>}}, which the drone and the
+# central server benchmark (benchmarkFolder/e2e_bench.py) use to measure latency per hop. Binary records cannot.
+#   python sensor.py --drone_ip 127.0.0.1 --drone_port 5647 --load_sensors 2000 --rate 5 --ramp_up 10 --duration 60
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+
+from fdlimit import raise_fd_limit
+from readings import HELLO, HELLO_REPLY, encode_reading
+from sensor import generate_sensor_data
+
+RAMP_PROFILES = ("linear", "step", "none")
+RAMP_STEPS = 4  # Groups of sensors started by the "step" profile
+HANDSHAKE_TIMEOUT = 2.0
+# Latencies are counted in fixed log-spaced buckets from HISTOGRAM_MIN to HISTOGRAM_MAX seconds, BUCKETS_PER_DECADE
+# per factor of 10: memory stays the same however long the run, percentiles are off by at most ~1.2%
+HISTOGRAM_MIN = 1e-6
+HISTOGRAM_MAX = 1e3
+BUCKETS_PER_DECADE = 100
+_BUCKETS = int(math.log10(HISTOGRAM_MAX / HISTOGRAM_MIN) * BUCKETS_PER_DECADE) + 1
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, value):
+        index = int(math.log10(value / HISTOGRAM_MIN) * BUCKETS_PER_DECADE) if value > HISTOGRAM_MIN else 0
+        self.counts[min(index, _BUCKETS - 1)] += 1
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def _value(self, index):
+        # Geometric middle of the bucket, never above the largest value seen
+        return min(HISTOGRAM_MIN * 10 ** ((index + 0.5) / BUCKETS_PER_DECADE), self.max)
+
+    # Same result format as percentiles()
+    def percentiles(self):
+        if not self.count:
+            return {}
+        last = self.count - 1
+        targets = [(p, min(last, int(last * p / 100))) for p in (50, 90, 99)]
+        result = {}
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            while targets and targets[0][1] < seen:
+                p, _ = targets.pop(0)
+                result[f"p{p}_ms"] = round(self._value(index) * 1000, 2)
+            if not targets:
+                break
+        result["max_ms"] = round(self.max * 1000, 2)
+        return result
+
+
+class LoadStats:
+    def __init__(self):
+        self.sent = 0
+        self.sent_bytes = 0
+        self.connects = 0
+        self.connect_failures = 0
+        self.disconnects = 0
+        self.crashes = 0
+        self.active = 0
+        self.latencies = LatencyHistogram()      # Seconds, since the last report
+        self.all_latencies = LatencyHistogram()
+
+    def take_latencies(self):
+        latencies = self.latencies
+        self.latencies = LatencyHistogram()
+        self.all_latencies.merge(latencies)
+        return latencies
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = sorted(values)
+    last = len(values) - 1
+    result = {f"p{p}_ms": round(values[min(last, int(last * p / 100))] * 1000, 2) for p in (50, 90, 99)}
+    result["max_ms"] = round(values[-1] * 1000, 2)
+    return result
+
+
+_timestamp_cache = [None, None]
+
+# generate_sensor_data formats the current time for every reading, which costs more than the rest of the reading
+# at thousands of readings per second; all simulated sensors share one string per second instead
+def current_timestamp():
+    second = int(time.time())
+    if _timestamp_cache[0] != second:
+        _timestamp_cache[0] = second
+        _timestamp_cache[1] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(second))
+    return _timestamp_cache[1]
+
+
+def start_delay(index, args):
+    if args.ramp_profile == "none" or not args.ramp_up:
+        return 0.0
+    if args.ramp_profile == "step":
+        return args.ramp_up * (index * RAMP_STEPS // args.load_sensors) / RAMP_STEPS
+    return args.ramp_up * index / args.load_sensors
+
+
+async def open_sensor_connection(args, binary):
+    reader, writer = await asyncio.open_connection(args.drone_ip, args.drone_port)
+    if not binary:
+        return reader, writer, False
+    try:
+        writer.write(HELLO)
+        reply = await asyncio.wait_for(reader.readexactly(len(HELLO_REPLY)), HANDSHAKE_TIMEOUT)
+        if reply == HELLO_REPLY:
+            return reader, writer, True
+    except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+        pass
+    writer.close()  # Same as open_connection in sensor.py: start over with JSON on a clean connection
+    reader, writer = await asyncio.open_connection(args.drone_ip, args.drone_port)
+    return reader, writer, False
+
+
+async def simulated_sensor(index, args, stats, deadline):
+    sensor_id = f"sensor{args.first_id + index}"
+    loop = asyncio.get_running_loop()
+    binary = args.wire_format == "binary"
+    interval = 1.0 / args.rate
+    await asyncio.sleep(start_delay(index, args))
+    while loop.time() < deadline:
+        try:
+            reader, writer, binary = await open_sensor_connection(args, binary)
+        except OSError:
+            stats.connect_failures += 1
+            await asyncio.sleep(args.reconnect_interval)
+            continue
+        stats.connects += 1
+        stats.active += 1
+        crash_at = None
+        if args.simulate_crash_after is not None:  # Spread the crashes so the sensors do not all reconnect at once
+            crash_at = loop.time() + args.simulate_crash_after * random.uniform(0.5, 1.5)
+        next_send = loop.time() + random.uniform(0, interval)
+        try:
+            while True:
+                delay = next_send - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                now = loop.time()
+                if now >= deadline:
+                    return
+                if crash_at is not None and now >= crash_at:
+                    break
+                data = generate_sensor_data(sensor_id, args.temp_anomaly_ratio, args.humidity_anomaly_ratio,
+                                            current_timestamp())
+                if binary:
+                    payload = encode_reading(data)
+                else:
+                    if args.trace_ratio and random.random() < args.trace_ratio:
+                        data["trace"] = {"sent": time.time()}  # Stamped by the drone and read by the central server
+                    payload = (json.dumps(data) + "\n").encode()
+                writer.write(payload)
+                await writer.drain()
+                stats.latencies.add(loop.time() - next_send)
+                stats.sent += 1
+                stats.sent_bytes += len(payload)
+                next_send += interval
+        except OSError:
+            stats.disconnects += 1
+            await asyncio.sleep(args.reconnect_interval)
+            continue
+        finally:
+            stats.active -= 1
+            writer.close()
+        # simulated crash
+        stats.crashes += 1
+        if args.restart_delay is None:
+            return
+        await asyncio.sleep(args.restart_delay)
+
+
+async def report_loop(args, stats):
+    last_sent = stats.sent
+    last_time = time.monotonic()
+    while True:
+        await asyncio.sleep(args.report_interval)
+        now = time.monotonic()
+        rate = (stats.sent - last_sent) / (now - last_time)
+        last_sent, last_time = stats.sent, now
+        latency = stats.take_latencies().percentiles()
+        logging.info(f"Load: {stats.active} sensors connected, {rate:.0f} readings/s, latency {latency}")
+
+
+async def generate_load(args, stats):
+    loop = asyncio.get_running_loop()
+    duration = args.duration if args.duration is not None else float("inf")
+    deadline = loop.time() + args.ramp_up + duration
+    reporter = asyncio.create_task(report_loop(args, stats))
+    try:
+        await asyncio.gather(*(simulated_sensor(i, args, stats, deadline) for i in range(args.load_sensors)))
+    finally:
+        reporter.cancel()
+
+
+# Runs the load described by the sensor.py arguments, then prints a JSON report of what was achieved
+def run_load(args):
+    if args.rate <= 0:
+        raise SystemExit("--rate must be positive")
+    fd_limit = raise_fd_limit()
+    if args.load_sensors + 64 > fd_limit:
+        logging.warning(f"{args.load_sensors} sensors need more file descriptors than the limit of {fd_limit}.")
+    logging.info(f"Simulating {args.load_sensors} sensors at {args.rate} readings/s each "
+                 f"({args.load_sensors * args.rate:.0f} readings/s target).")
+    stats = LoadStats()
+    start = time.monotonic()
+    try:
+        asyncio.run(generate_load(args, stats))
+    except KeyboardInterrupt:
+        pass
+    elapsed = time.monotonic() - start
+    stats.take_latencies()
+    report = {
+        "sensors": args.load_sensors,
+        "wire_format": args.wire_format,
+        "target_rate": args.load_sensors * args.rate,
+        "elapsed_s": round(elapsed, 2),
+        "sent": stats.sent,
+        "sent_bytes": stats.sent_bytes,
+        "achieved_rate": round(stats.sent / elapsed, 1) if elapsed > 0 else 0.0,
+        "connects": stats.connects,
+        "connect_failures": stats.connect_failures,
+        "disconnects": stats.disconnects,
+        "crashes": stats.crashes,
+        "latency": stats.all_latencies.percentiles(),
+    }
+    print(json.dumps(report))
+    return report
@@ -6,27 +6,34 @@ import logging
 import random
 import sys
 import os
+import threading
 from datetime import datetime, timezone
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "commonFolder"))
+
+from readings import WIRE_FORMATS, HELLO, HELLO_REPLY, encode_reading, sensor_number
+from buffer import ReadingBuffer
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s [%(levelname)s] %(message)s'
 )
 
 # generates data in order to send to drone
-def generate_sensor_data(sensor_id):
-    # 5% chance of temperature anomaly
-    if random.random() < 0.05:
+def generate_sensor_data(sensor_id, temp_anomaly_ratio=0.05, humidity_anomaly_ratio=0.05, timestamp=None):
+    # 5% chance of temperature anomaly by default
+    if random.random() < temp_anomaly_ratio:
         temperature = round(random.uniform(150.0, 1000.0), 2)
     else: # normal data
         temperature = round(random.uniform(-100.0, 100.0), 2)
 
-    # 5% chance of humidity anomaly
-    if random.random() < 0.05:
+    # 5% chance of humidity anomaly by default
+    if random.random() < humidity_anomaly_ratio:
         humidity = round(random.uniform(-150.0, -1000.0), 2)
     else: # normal data
         humidity = round(random.uniform(0.0, 100.0), 2)
-    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    if timestamp is None:
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
     return {
         "sensor_id": sensor_id,
         "temperature": temperature,
@@ -45,50 +52,131 @@ def connect_to_drone(ip, port, retry_interval):
             logging.warning(f"Connection failed: {e}. Retrying in {retry_interval} seconds...")
             time.sleep(retry_interval)
 
+# asks the drone to switch this connection to binary readings, returns True if it agreed
+def negotiate_binary(sock, timeout=2.0):
+    reply = b""
+    sock.settimeout(timeout)
+    try:
+        sock.sendall(HELLO)
+        while len(reply) < len(HELLO_REPLY):
+            chunk = sock.recv(len(HELLO_REPLY) - len(reply))
+            if not chunk:
+                break
+            reply += chunk
+    except socket.error:  # includes the timeout
+        pass
+    finally:
+        sock.settimeout(None)
+    return reply == HELLO_REPLY
+
+# connects to the drone and negotiates the wire format, returns the socket and whether readings are sent as binary
+def open_connection(args):
+    sock = connect_to_drone(args.drone_ip, args.drone_port, args.reconnect_interval)
+    if args.wire_format != "binary":
+        return sock, False
+    if sensor_number(args.sensor_id) is None:
+        logging.warning(f"Sensor ID {args.sensor_id} cannot be sent in binary (expected sensor<N>). Using JSON.")
+        return sock, False
+    if negotiate_binary(sock):
+        logging.info("Drone accepted binary readings.")
+        return sock, True
+    logging.warning("Drone does not support binary readings. Reconnecting with JSON...")
+    sock.close()  # The drone may have read the handshake as a reading, start over on a clean connection
+    return connect_to_drone(args.drone_ip, args.drone_port, args.reconnect_interval), False
+
+# encodes buffered (sampled time, reading) pairs into one write, using the same newline framing as single readings.
+# Once binary is negotiated the drone only reads records: a reading that has no record (e.g. a value out of the
+# float32 range) cannot be sent and is logged as dropped.
+def encode_batch(items, binary):
+    if binary:
+        records = []
+        for _, data in items:
+            record = encode_reading(data)
+            if record is None:
+                logging.warning(f"Dropped a reading that cannot be sent in binary: {data}")
+            else:
+                records.append(record)
+        return b"".join(records)
+    return "".join(json.dumps(data) + "\n" for _, data in items).encode("utf-8")
+
+# sends the readings sampled into buffer to the drone, reconnecting whenever the connection is lost.
+# A batch that could not be sent goes back into the buffer and is sent again after the reconnect (the drone may
+# then receive part of it twice), so readings sampled during an outage are only lost to the buffer's limits.
+def send_loop(args, buffer):
+    sock, binary = open_connection(args)
+    while True:
+        items = buffer.take(args.batch_size, args.batch_ms / 1000 if args.batch_ms is not None else None)
+        try:
+            sock.sendall(encode_batch(items, binary))
+        except (BrokenPipeError, ConnectionResetError, socket.error): # connection could not be established
+            buffer.unget(items)
+            logging.warning(f"Lost connection to Drone, buffering readings ({len(buffer)} waiting). Attempting to reconnect...")
+            try:
+                sock.close()
+            except Exception:
+                pass
+            sock, binary = open_connection(args)
+            if len(buffer):
+                logging.info(f"Sending {len(buffer)} buffered readings ({buffer.dropped_full} dropped because the buffer was full, "
+                             f"{buffer.dropped_expired} too old).")
+            continue
+        if len(items) == 1:
+            logging.info(f"Sent data: {items[0][1]}")
+        else:
+            logging.info(f"Sent {len(items)} readings, latest: {items[-1][1]}")
+
 def main():
+    from load_generator import RAMP_PROFILES, run_load  # imported here because load_generator uses this module
+
     parser = argparse.ArgumentParser(description="Sensor Node Client")
     parser.add_argument("--drone_ip", type=str, required=True, help="Drone server IP address")                       # required IP adress of drone
     parser.add_argument("--drone_port", type=int, required=True, help="Drone server port")                           # required port of drone
-    parser.add_argument("--interval", type=int, default=2, help="Interval between sensor data sends (seconds)")      # default is 2 secs
+    parser.add_argument("--interval", type=float, default=2, help="Interval between sensor data sends (seconds)")    # default is 2 secs, fractions allowed
     parser.add_argument("--sensor_id", type=str, default="sensor1", help="Unique Sensor ID")                         # default is sensor1
     parser.add_argument("--reconnect_interval", type=int, default=5, help="Reconnect interval on failure (seconds)") # default is 5 secs
     parser.add_argument("--simulate_crash_after", type=int, default=None, help="(Optional) Seconds before simulating crash")
     parser.add_argument("--restart_delay", type=int, default=None, help="(Optional) Seconds to wait before restart")
-    
+    parser.add_argument("--wire_format", choices=WIRE_FORMATS, default="json", help="Send readings as JSON text or as compact binary records")
+    parser.add_argument("--temp_anomaly_ratio", type=float, default=0.05, help="Share of readings with an out of range temperature")
+    parser.add_argument("--humidity_anomaly_ratio", type=float, default=0.05, help="Share of readings with an out of range humidity")
+    parser.add_argument("--buffer_size", type=int, default=1000, help="Readings kept while the drone is unreachable, the oldest are dropped beyond that")
+    parser.add_argument("--buffer_max_age", type=float, default=None, help="(Optional) Seconds after which a buffered reading is dropped instead of sent")
+    parser.add_argument("--batch_size", type=int, default=1, help="Readings sent together in one write")
+    parser.add_argument("--batch_ms", type=float, default=None, help="(Optional) Maximum milliseconds a reading waits for its batch to fill up")
+    # load generation mode: many simulated sensors from this one process (see load_generator.py)
+    parser.add_argument("--load_sensors", type=int, default=None, help="(Optional) Simulate this many sensors, named sensor<first_id>...")
+    parser.add_argument("--first_id", type=int, default=1, help="Number of the first simulated sensor")
+    parser.add_argument("--rate", type=float, default=1.0, help="Readings per second per simulated sensor (open loop target)")
+    parser.add_argument("--duration", type=float, default=None, help="(Optional) Seconds to run the load after ramp-up")
+    parser.add_argument("--ramp_up", type=float, default=0.0, help="Seconds over which the simulated sensors are started")
+    parser.add_argument("--ramp_profile", choices=RAMP_PROFILES, default="linear", help="How the simulated sensors are started during ramp-up")
+    parser.add_argument("--report_interval", type=float, default=5.0, help="Seconds between load reports")
+    parser.add_argument("--trace_ratio", type=float, default=0.0, help="Share of simulated readings carrying a latency trace (JSON wire format only)")
+
     args = parser.parse_args()
+    if args.trace_ratio and args.wire_format == "binary":
+        parser.error("--trace_ratio needs --wire_format json (binary records carry no trace)")
+    if args.load_sensors:
+        run_load(args)  # simulate_crash_after / restart_delay then apply to every simulated sensor
+        return
     start_time = time.time()
-    sock = connect_to_drone(args.drone_ip, args.drone_port, args.reconnect_interval)
+    buffer = ReadingBuffer(args.buffer_size, args.buffer_max_age)
+    threading.Thread(target=send_loop, args=(args, buffer), daemon=True).start()  # sampling goes on while it reconnects
 
-    
     while True:
-        try: # connection is established
-            # simulate crash if parameters are set
-            if args.simulate_crash_after is not None and (time.time() - start_time) > args.simulate_crash_after:
-                logging.warning("A crash occurring now. Shutting down sensor...")
-                try:
-                    sock.close()
-                except Exception:
-                    pass
-                if args.restart_delay is not None:
-                    time.sleep(args.restart_delay)
-                    logging.info("Restarting sensor after crash.")
-                    os.execv(sys.executable, ['python'] + sys.argv)
-                else:
-                    logging.warning("Restart delay after crash is not specified. Exiting.")
-                    sys.exit(0)
-                
-            data = generate_sensor_data(args.sensor_id)
-            message = json.dumps(data)
-            sock.sendall((message + '\n').encode('utf-8'))
-            logging.info(f"Sent data: {message}")
-            time.sleep(args.interval)
-        except (BrokenPipeError, ConnectionResetError, socket.error): # connection could not be established
-            logging.warning("Lost connection to Drone. Attempting to reconnect...")
-            try:
-                sock.close()
-            except Exception:
-                pass
-            sock = connect_to_drone(args.drone_ip, args.drone_port, args.reconnect_interval)
-                
+        # simulate crash if parameters are set
+        if args.simulate_crash_after is not None and (time.time() - start_time) > args.simulate_crash_after:
+            logging.warning("A crash occurring now. Shutting down sensor...")
+            if args.restart_delay is not None:
+                time.sleep(args.restart_delay)
+                logging.info("Restarting sensor after crash.")
+                os.execv(sys.executable, ['python'] + sys.argv)
+            else:
+                logging.warning("Restart delay after crash is not specified. Exiting.")
+                sys.exit(0)
+
+        buffer.put(generate_sensor_data(args.sensor_id, args.temp_anomaly_ratio, args.humidity_anomaly_ratio))
+        time.sleep(args.interval)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
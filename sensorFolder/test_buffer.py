@@ -0,0 +1,55 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from buffer import ReadingBuffer
+
+
+def readings(items):
+    return [reading for _, reading in items]
+
+
+def test_take_returns_a_backlog_in_batches_and_unget_puts_it_back_in_front():
+    buffer = ReadingBuffer(capacity=10)
+    for n in range(8):
+        buffer.put(n)
+    taken = buffer.take(count=5, limit=6)
+    assert readings(taken) == [0, 1, 2, 3, 4, 5]
+    buffer.put(8)
+    buffer.unget(taken)  # The send failed
+    assert readings(buffer.take(count=1, limit=100)) == list(range(9))
+    assert buffer.dropped_full == 0
+
+
+def test_unget_into_a_full_buffer_drops_the_oldest_readings():
+    buffer = ReadingBuffer(capacity=5)
+    for n in range(5):
+        buffer.put(n)
+    taken = buffer.take(limit=5)
+    for n in range(5, 8):  # Sampled while the send was failing
+        buffer.put(n)
+    buffer.unget(taken)
+    assert buffer.dropped_full == 3
+    assert readings(buffer.take(limit=100)) == [3, 4, 5, 6, 7]
+
+
+def test_take_waits_for_count_or_max_wait():
+    buffer = ReadingBuffer()
+    buffer.put("a")
+    start = time.monotonic()
+    assert readings(buffer.take(count=3, max_wait=0.1)) == ["a"]  # The oldest reading waited long enough
+    assert time.monotonic() - start >= 0.09
+    threading.Timer(0.05, lambda: [buffer.put(n) for n in range(3)]).start()
+    assert readings(buffer.take(count=3)) == [0, 1, 2]
+
+
+def test_expired_readings_are_not_taken():
+    buffer = ReadingBuffer(max_age=0.05)
+    buffer.put("old")
+    time.sleep(0.1)
+    buffer.put("new")
+    assert readings(buffer.take()) == ["new"]
+    assert buffer.dropped_expired == 1